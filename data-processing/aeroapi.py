@@ -0,0 +1,245 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from streaming import iter_array_items
+
+AEROAPI_BASE_URL = "https://aeroapi.flightaware.com/aeroapi"
+RETRY_STATUSES = {429, 502, 503, 504}
+# AeroAPI only serves the last 10 days
+AVAILABLE_DAYS = 10
+
+
+class RateLimiter:
+    """
+    Token bucket for one AeroAPI request budget.
+
+    Share one limiter between every client and thread drawing on the same
+    account: each request takes a token, tokens refill at
+    `requests_per_minute`, and up to `burst` can be spent back to back.
+    When any caller is rate limited, `defer` holds everyone back until the
+    server's Retry-After has passed.
+    """
+
+    def __init__(self, requests_per_minute, burst=1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent, then spend one token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._resume_at and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._resume_at - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def defer(self, seconds):
+        """Hold every caller back for `seconds`, e.g. after a 429."""
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+class AeroAPIClient:
+    """
+    Pooled AeroAPI client that follows `links.next` cursors itself.
+
+    One `requests.Session` is shared by every call so connections are reused,
+    and a bounded semaphore caps how many requests are in flight at once no
+    matter how many threads use the client. An optional shared RateLimiter
+    keeps several clients (or airports) inside one request budget.
+    """
+
+    def __init__(self, api_key, base_url=AEROAPI_BASE_URL, max_concurrency=4,
+                 max_retries=5, pages_per_request=10, backoff_base=1.0, timeout=60,
+                 rate_limiter=None):
+        self.base_url = base_url.rstrip('/')
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.pages_per_request = pages_per_request
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.retry_count = 0
+        self.request_count = 0
+        self.page_count = 0
+        self.bytes_received = 0
+        self.wait_seconds = 0.0
+        self.decode_seconds = 0.0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "x-apikey": api_key,
+            "Accept": "application/json"
+        })
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _retry_delay(self, response, attempt):
+        """Seconds to wait before retrying, honouring Retry-After when present."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+                except (TypeError, ValueError):
+                    pass
+        return self.backoff_base * (2 ** attempt)
+
+    def get(self, url, params=None, stream=False):
+        """
+        GET a single AeroAPI resource, retrying rate-limited and transient failures.
+
+        429 and gateway errors are retried after their Retry-After (or an
+        exponential backoff), and so are dropped connections and timeouts.
+        Failed responses are read and closed before the retry so their
+        pooled connection is released for reuse.
+        """
+        if not url.startswith("http"):
+            url = self.base_url + url
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                with self._slots:
+                    response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise Exception(f"API call failed after {attempt + 1} attempts: {e}")
+                with self._stats_lock:
+                    self.retry_count += 1
+                time.sleep(self.backoff_base * (2 ** attempt))
+                continue
+            finally:
+                with self._stats_lock:
+                    self.request_count += 1
+                    self.wait_seconds += time.perf_counter() - start
+            if response.status_code == 200:
+                return response
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                break
+            with self._stats_lock:
+                self.retry_count += 1
+            delay = self._retry_delay(response, attempt)
+            # Reading the short error body first returns the connection to the pool instead of dropping it
+            response.content
+            response.close()
+            if self.rate_limiter and response.status_code == 429:
+                self.rate_limiter.defer(delay)
+            time.sleep(delay)
+        message = f"API call failed with status {response.status_code}: {response.text}"
+        response.close()
+        raise Exception(message)
+
+    def iter_pages(self, path, params=None, on_page=None):
+        """
+        Yield each decoded response for `path`, following `links.next` until exhausted.
+
+        `on_page(url, body)` is called with the request URL and raw body bytes
+        of every page before it is decoded.
+        """
+        params = dict(params or {})
+        params.setdefault("max_pages", self.pages_per_request)
+        url = path
+        while url:
+            response = self.get(url, params=params)
+            if on_page:
+                on_page(response.url, response.content)
+            start = time.perf_counter()
+            page = response.json()
+            self._count_page(len(response.content), time.perf_counter() - start)
+            yield page
+            next_link = (page.get("links") or {}).get("next")
+            if not next_link:
+                break
+            # The next link already carries the cursor and the original query
+            url = urljoin(self.base_url + "/", next_link.lstrip("/"))
+            params = None
+
+    def fetch_all(self, path, key, params=None, on_page=None):
+        """Fetch every page for `path` and merge the `key` lists into a single response."""
+        flights = []
+        num_pages = 0
+        for page in self.iter_pages(path, params, on_page):
+            flights.extend(page.get(key, []))
+            num_pages += page.get("num_pages", 1)
+        return {key: flights, "links": None, "num_pages": num_pages}
+
+    def iter_flights(self, path, key, params=None, on_page=None, chunk_size=64 * 1024):
+        """
+        Yield flights one at a time across every page for `path`.
+
+        Each response body is parsed incrementally as it arrives, so only the
+        flight being handed out (plus the raw bytes of the current response,
+        when `on_page` wants them) is held in memory.
+        """
+        params = dict(params or {})
+        params.setdefault("max_pages", self.pages_per_request)
+        url = path
+        while url:
+            response = self.get(url, params=params, stream=True)
+            raw = bytearray() if on_page else None
+            received = [0]
+
+            def chunks():
+                for chunk in response.iter_content(chunk_size):
+                    received[0] += len(chunk)
+                    if raw is not None:
+                        raw.extend(chunk)
+                    yield chunk
+
+            meta = {}
+            try:
+                yield from iter_array_items(chunks(), key, meta)
+            finally:
+                response.close()
+            # Decoding is interleaved with the download here, so it is not timed separately
+            self._count_page(received[0], 0.0)
+            if on_page:
+                on_page(response.url, bytes(raw))
+
+            next_link = (meta.get("links") or {}).get("next")
+            if not next_link:
+                break
+            url = urljoin(self.base_url + "/", next_link.lstrip("/"))
+            params = None
+
+    def _count_page(self, size, decode_seconds):
+        with self._stats_lock:
+            self.page_count += 1
+            self.bytes_received += size
+            self.decode_seconds += decode_seconds
+
+    def stats(self):
+        """Snapshot of the cumulative request, retry, page, byte and timing counters."""
+        with self._stats_lock:
+            return {
+                "requests": self.request_count,
+                "retries": self.retry_count,
+                "pages": self.page_count,
+                "bytes": self.bytes_received,
+                "wait_seconds": self.wait_seconds,
+                "decode_seconds": self.decode_seconds
+            }
+
+    def close(self):
+        self.session.close()
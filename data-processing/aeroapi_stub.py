@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlparse
+
+PAGE_SIZE = 15
+
+
+class AeroAPIStub:
+    """
+    Local stand-in for the AeroAPI airport flights and single-flight endpoints.
+
+    Serves `flights[direction]` in AeroAPI-shaped pages with `links.next`
+    cursors and answers `/flights/{fa_flight_id}` from the same lists. It
+    can add latency per new connection (standing in for the TLS handshake),
+    per request and per page served (AeroAPI takes longer the more pages
+    one request asks for), and answer a number of 429s
+    before the first real answer, so the fetch layer can be exercised
+    without a network or an API key. With `days` ({YYYY-MM-DD: flights})
+    the airport endpoints serve the day named by the request's `start`
+    instead, so several days can be fetched at once.
+
+    Usage:
+        with AeroAPIStub({'arrivals': [...], 'departures': [...]}) as stub:
+            client = AeroAPIClient("key", base_url=stub.base_url)
+    """
+
+    def __init__(self, flights, page_size=PAGE_SIZE, latency=0.0, rate_limit_hits=0,
+                 retry_after="0", host="127.0.0.1", port=0, page_latency=0.0, connect_latency=0.0, days=None):
+        self.flights = flights
+        self.days = days
+        self.page_size = page_size
+        self.latency = latency
+        self.page_latency = page_latency
+        self.connect_latency = connect_latency
+        self.connection_count = 0
+        self.retry_after = retry_after
+        self.request_count = 0
+        self._rate_limit_hits = rate_limit_hits
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/aeroapi"
+
+    def _page(self, path, query):
+        """Build one AeroAPI response for `path`; returns None when the path is unknown."""
+        parts = path.strip('/').split('/')
+        # aeroapi/flights/{fa_flight_id}
+        if len(parts) == 3 and parts[1] == 'flights':
+            matches = [flight for flights in self.flights.values() for flight in flights
+                       if flight.get('fa_flight_id') == unquote(parts[2])]
+            return {"flights": matches, "links": None, "num_pages": 1} if matches else None
+        # aeroapi/airports/{code}/flights/{direction}
+        if self.days is not None:
+            day = self.days.get(query.get('start', [''])[0][:10], {'arrivals': [], 'departures': []})
+        else:
+            day = self.flights
+        if len(parts) != 5 or parts[1] != 'airports' or parts[4] not in day:
+            return None
+        direction = parts[4]
+        flights = day[direction]
+        start = int(query.get('cursor', ['0'])[0])
+        max_pages = int(query.get('max_pages', ['1'])[0])
+        end = min(start + self.page_size * max_pages, len(flights))
+        next_link = None
+        if end < len(flights):
+            next_query = {k: v[0] for k, v in query.items() if k != 'cursor'}
+            next_query['cursor'] = str(end)
+            next_link = f"/airports/{parts[2]}/flights/{direction}?{urlencode(next_query)}"
+        return {
+            direction: flights[start:end],
+            "links": {"next": next_link} if next_link else None,
+            "num_pages": max(1, -(-(end - start) // self.page_size))
+        }
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connection_count += 1
+                if stub.connect_latency:
+                    time.sleep(stub.connect_latency)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.request_count += 1
+                    rate_limited = stub._rate_limit_hits > 0
+                    if rate_limited:
+                        stub._rate_limit_hits -= 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                if rate_limited:
+                    self._send(429, {"title": "Too Many Requests"},
+                               {"Retry-After": stub.retry_after})
+                    return
+
+                url = urlparse(self.path)
+                page = stub._page(url.path, parse_qs(url.query))
+                if page is not None and stub.page_latency:
+                    time.sleep(stub.page_latency * page["num_pages"])
+                if page is None:
+                    self._send(404, {"title": "Not Found"})
+                else:
+                    self._send(200, page)
+
+            def _send(self, status, body, headers=None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
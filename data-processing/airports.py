@@ -0,0 +1,138 @@
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+
+# Packaged dimension table: one row per airport, ids are stable and only ever appended
+AIRPORTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "airports.csv")
+# Id of an airport that is not in the table
+UNKNOWN_AIRPORT = 0
+# First day each member country's airports were inside the Schengen area (air borders)
+SCHENGEN_SINCE = {
+    'AT': '1997-12-01', 'BE': '1995-03-26', 'BG': '2024-03-31', 'CH': '2009-03-29', 'CZ': '2008-03-30',
+    'DE': '1995-03-26', 'DK': '2001-03-25', 'EE': '2008-03-30', 'ES': '1995-03-26', 'FI': '2001-03-25',
+    'FR': '1995-03-26', 'GR': '2000-03-26', 'HR': '2023-03-26', 'HU': '2008-03-30', 'IS': '2001-03-25',
+    'IT': '1997-10-26', 'LI': '2011-12-19', 'LT': '2008-03-30', 'LU': '1995-03-26', 'LV': '2008-03-30',
+    'MT': '2008-03-30', 'NL': '1995-03-26', 'NO': '2001-03-25', 'PL': '2008-03-30', 'PT': '1995-03-26',
+    'RO': '2024-03-31', 'SE': '2001-03-25', 'SI': '2008-03-30', 'SK': '2008-03-30'
+}
+# Schengen start of airports outside the area, as days since 1970-01-01
+NEVER = np.iinfo(np.int64).max
+
+
+class AirportTable:
+    """
+    Airports indexed by a small integer id, with country, Schengen membership and time zone.
+
+    Every attribute array is indexed by id, and slot UNKNOWN_AIRPORT holds
+    the values of an airport that is not in the table (no country, never
+    Schengen). Codes are resolved a batch at a time: each distinct code is
+    looked up once and the ids are broadcast back to every row.
+
+    Usage:
+        airports = load_airports()
+        ids = airports.resolve(['LEMD', 'ORY', 'XXXX'])  # -> [14, 31, 0]
+        airports.is_schengen(ids)
+    """
+
+    def __init__(self, frame):
+        ids = frame['id'].to_numpy(dtype=np.int64)
+        if (ids <= UNKNOWN_AIRPORT).any() or len(set(ids)) != len(ids):
+            raise Exception("Airport ids must be unique and positive")
+        size = int(ids.max()) + 1 if len(ids) else 1
+
+        def by_id(values, missing):
+            out = np.full(size, missing, dtype=object)
+            out[ids] = values
+            return out
+
+        self.icao = by_id(frame['icao'].to_numpy(), None)
+        self.iata = by_id(frame['iata'].where(frame['iata'] != '', None).to_numpy(), None)
+        self.city = by_id(frame['city'].to_numpy(), None)
+        self.country = by_id(frame['country'].to_numpy(), None)
+        self.timezone = by_id(frame['timezone'].to_numpy(), None)
+        since = {country: (pd.Timestamp(date) - pd.Timestamp('1970-01-01')).days
+                 for country, date in SCHENGEN_SINCE.items()}
+        self.schengen_since = np.array([since.get(country, NEVER) for country in self.country], dtype=np.int64)
+
+        codes = pd.concat([frame[['icao', 'id']].rename(columns={'icao': 'code'}),
+                           frame[['iata', 'id']].rename(columns={'iata': 'code'})])
+        codes = codes[codes['code'] != '']
+        if codes['code'].duplicated().any():
+            raise Exception(f"Duplicate airport codes: {sorted(codes['code'][codes['code'].duplicated()])}")
+        self._codes = pd.Index(codes['code'].to_numpy(dtype=object))
+        self._code_ids = codes['id'].to_numpy(dtype=np.int16)
+        # Several airports can share a city name (London); a city resolves to the first one listed
+        cities = frame.drop_duplicates('city')
+        self._cities = pd.Index(cities['city'].to_numpy(dtype=object))
+        self._city_ids = cities['id'].to_numpy(dtype=np.int16)
+
+    @staticmethod
+    def _lookup(index, index_ids, values):
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+        positions = index.get_indexer(uniques)
+        unique_ids = np.where(positions >= 0, index_ids[positions], UNKNOWN_AIRPORT).astype(np.int16)
+        # Missing values have code -1, which picks the trailing UNKNOWN_AIRPORT
+        return np.append(unique_ids, np.int16(UNKNOWN_AIRPORT))[codes]
+
+    def resolve(self, codes, cities=None):
+        """
+        Airport ids of ICAO or IATA codes, UNKNOWN_AIRPORT for codes not in the table.
+
+        Args:
+            codes (list): ICAO or IATA codes (None when unknown)
+            cities (list): City names, only used for rows whose code does not resolve
+
+        Returns:
+            np.ndarray: int16 airport ids, one per code
+        """
+        ids = self._lookup(self._codes, self._code_ids, codes)
+        if cities is not None:
+            unresolved = ids == UNKNOWN_AIRPORT
+            if unresolved.any():
+                ids[unresolved] = self.resolve_cities(np.asarray(cities, dtype=object)[unresolved])
+        return ids
+
+    def resolve_cities(self, cities):
+        """Airport ids of city names as AeroAPI spells them, for rows stored before airports had ids."""
+        return self._lookup(self._cities, self._city_ids, cities)
+
+    def is_schengen(self, ids, days=None):
+        """
+        Whether each airport is inside the Schengen area.
+
+        Args:
+            ids (array): Airport ids
+            days (array): Days since 1970-01-01 to check membership on (default: membership today)
+
+        Returns:
+            np.ndarray: bool per id
+        """
+        since = self.schengen_since[np.asarray(ids, dtype=np.int64)]
+        if days is None:
+            return since != NEVER
+        return (since != NEVER) & (since <= np.asarray(days, dtype=np.int64))
+
+    def get(self, code):
+        """IATA code, city, country and time zone of one airport, or None when it is not in the table."""
+        airport_id = int(self.resolve([code])[0])
+        if airport_id == UNKNOWN_AIRPORT:
+            return None
+        return {"id": airport_id, "icao": self.icao[airport_id], "iata": self.iata[airport_id],
+                "city": self.city[airport_id], "country": self.country[airport_id],
+                "timezone": self.timezone[airport_id]}
+
+
+@functools.lru_cache(maxsize=None)
+def load_airports(path=AIRPORTS_FILE):
+    """
+    The airport table, read and indexed once per process.
+
+    Every processor, thread and call in a process shares the same table;
+    worker processes build their own copy the first time they need it.
+    """
+    # keep_default_na=False keeps codes such as 'NA' as text; a missing IATA code is ''
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    frame['id'] = frame['id'].astype(np.int64)
+    return AirportTable(frame)
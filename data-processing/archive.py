@@ -0,0 +1,261 @@
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as fs
+import pyarrow.parquet as pq
+
+from schema import airport_ids, schengen_flags, typed_frame
+from transform import DIRECTION_FIELDS, airport_column
+
+# Columns metrics.py needs per direction; everything else stays on disk.
+# load() derives `schengen` from the airport id and the scheduled time.
+METRIC_COLUMNS = {
+    'arrivals': ['scheduled_in', 'actual_in', 'delay', 'time_of_day', 'origin_airport'],
+    'departures': ['scheduled_off', 'actual_off', 'delay', 'time_of_day', 'destination_airport']
+}
+
+def archive_schema(direction):
+    """
+    Arrow schema of an archived day. It is fixed rather than inferred, so
+    every day and every streamed batch has the same column types even when a
+    batch has no values at all for a column. Timestamps are epoch minutes,
+    the other airport an airports.py id and text columns dictionary codes,
+    as in schema.FLIGHT_DTYPES. The city is only stored for airports missing
+    from the airport table, and the stored Schengen flag is only what it was
+    at write time; load() recomputes it.
+    """
+    scheduled_key, actual_key, _, city_col = DIRECTION_FIELDS[direction]
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('operator', text),
+        ('flight_number', pa.string()),
+        ('cancelled', pa.bool_()),
+        (city_col, text),
+        (scheduled_key, pa.int32()),
+        (actual_key, pa.int32()),
+        ('delay', pa.int32()),
+        ('day_of_week', text),
+        ('time_of_day', text),
+        ('schengen', pa.bool_()),
+        (airport_column(direction), pa.int16())
+    ])
+
+def key_index(df, keys):
+    """
+    Index of the natural key columns that patches match flights on.
+
+    Every spelling of a missing value (None, NaN, pd.NA, "N/A" in the daily
+    CSVs) becomes '', so a flight with no operator or flight number matches
+    however each side stored it.
+    """
+    parts = {}
+    for col in keys:
+        values = df[col].astype(object)
+        parts[col] = values.where(values.notna() & (values != "N/A"), '')
+    return pd.MultiIndex.from_frame(pd.DataFrame(parts))
+
+class FlightArchive:
+    """
+    Append-only, date-partitioned Parquet archive of processed flights.
+
+    Layout is Hive style, one file per direction and day:
+        {root}/{direction}/date=YYYY-MM-DD/part-0.parquet
+
+    The partition date plays the role the file-name date plays for the daily
+    CSVs, so it replaces each row's own `date` column. Rewriting a day swaps
+    its partition, which keeps re-fetches from duplicating rows.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def direction_path(self, direction):
+        return os.path.join(self.root, direction)
+
+    def partition_path(self, direction, date):
+        return os.path.join(self.direction_path(direction), f"date={date}")
+
+    def dates(self, direction):
+        """Sorted YYYY-MM-DD dates present in the archive for a direction."""
+        path = self.direction_path(direction)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name.split('=', 1)[1] for name in os.listdir(path)
+                      if name.startswith('date=') and not name.endswith('.tmp'))
+
+    def day_stats(self, direction, date):
+        """
+        Row count of one archived day and how many of its flights that were
+        not cancelled still have no actual time, or None when the day is not
+        archived. Only the actual-time and cancelled columns are read.
+        """
+        path = os.path.join(self.partition_path(direction, date), "part-0.parquet")
+        if not os.path.exists(path):
+            return None
+        actual_key = DIRECTION_FIELDS[direction][1]
+        table = pq.read_table(path, columns=[actual_key, 'cancelled'])
+        missing = table.column(actual_key).is_null().to_numpy(zero_copy_only=False)
+        cancelled = table.column('cancelled').fill_null(False).to_numpy(zero_copy_only=False)
+        return {'rows': table.num_rows, 'missing_actual': int((missing & ~cancelled).sum())}
+
+    def write_day(self, direction, date, df):
+        """Write (or replace) one day of processed flights for a direction."""
+        with self.day_writer(direction, date) as writer:
+            writer.write(df)
+        return writer.path
+
+    def patch_day(self, direction, date, updates):
+        """
+        Overwrite the actual time, delay and cancelled flag of flights in one
+        archived day, matched on operator, flight number and scheduled time.
+
+        Args:
+            direction (str): 'arrivals' or 'departures'
+            date (str): YYYY-MM-DD partition to patch
+            updates (pd.DataFrame): Processed rows (as transform_flights makes them) with the new values
+
+        Returns:
+            int: Number of archived rows that were changed
+        """
+        path = os.path.join(self.partition_path(direction, date), "part-0.parquet")
+        if updates.empty or not os.path.exists(path):
+            return 0
+        scheduled_key, actual_key = DIRECTION_FIELDS[direction][:2]
+        keys = ['operator', 'flight_number', scheduled_key]
+        day = pq.read_table(path).to_pandas(types_mapper={pa.int32(): pd.Int32Dtype()}.get)
+        updates = typed_frame(updates, direction)
+
+        updates = updates.drop_duplicates(keys, keep='last')
+        positions = key_index(updates, keys).get_indexer(key_index(day, keys))
+        matched = positions >= 0
+        if not matched.any():
+            return 0
+        for col in [actual_key, 'delay', 'cancelled']:
+            day.loc[matched, col] = updates[col].array.take(positions[matched])
+        day['date'] = date
+        self.write_day(direction, date, day)
+        return int(matched.sum())
+
+    def day_writer(self, direction, date):
+        """Writer that streams batches of one day into a replacement partition."""
+        return ArchiveDayWriter(self, direction, date)
+
+    def load(self, direction, columns=None, start=None, end=None):
+        """
+        Load one direction as a DataFrame.
+
+        When the other airport's id is loaded, rows archived before airports
+        had ids get theirs from their city, and a `schengen` column is
+        derived from the ids and the scheduled day, so changes to
+        airports.csv apply to the whole history.
+
+        Args:
+            direction (str): 'arrivals' or 'departures'
+            columns (list): Columns to read (the `date` column is always included)
+            start (str): First YYYY-MM-DD date to include, inclusive
+            end (str): Last YYYY-MM-DD date to include, inclusive
+
+        Returns:
+            pd.DataFrame: Rows from the selected partitions only
+        """
+        scheduled_key, _, _, city_col = DIRECTION_FIELDS[direction]
+        airport_col = airport_column(direction)
+        dates = [date for date in self.dates(direction)
+                 if (start is None or date >= start) and (end is None or date <= end)]
+        if columns is not None and airport_col in columns and 'schengen' not in columns:
+            columns = columns + ['schengen']
+        if not dates:
+            return pd.DataFrame(columns=[col for col in columns or [] if col != 'date'] + ['date'])
+
+        # Partition pruning happens here: only the selected day files are opened,
+        # memory-mapped and scanned in parallel
+        files = [os.path.join(self.partition_path(direction, date), "part-0.parquet") for date in dates]
+        # A fixed schema, so days written before a column existed read it as nulls
+        dataset = ds.dataset(
+            files,
+            schema=archive_schema(direction).append(pa.field('date', pa.string())),
+            format='parquet',
+            partitioning=ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive'),
+            partition_base_dir=self.direction_path(direction),
+            filesystem=fs.LocalFileSystem(use_mmap=True)
+        )
+        read_columns = None
+        if columns is not None:
+            read_columns = [col for col in columns if col not in ('date', 'schengen')]
+            if 'schengen' in columns and airport_col not in read_columns:
+                read_columns.append(airport_col)
+            if airport_col in read_columns:
+                read_columns += [col for col in [city_col, scheduled_key] if col not in read_columns]
+            read_columns.append('date')
+        df = dataset.to_table(columns=read_columns).to_pandas()
+        if airport_col in df:
+            df[airport_col] = airport_ids(df, direction)
+            df['schengen'] = schengen_flags(df[airport_col], df[scheduled_key])
+        if columns is not None:
+            df = df[[col for col in columns if col != 'date' and col in df] + ['date']]
+        return df
+
+class ArchiveDayWriter:
+    """
+    Streams processed batches of one direction and day into a new partition.
+
+    Each write() appends a Parquet row group. The partition only replaces the
+    previous one when the writer is closed, and a day that received no rows
+    leaves the archive untouched.
+
+    Usage:
+        with archive.day_writer('arrivals', '2024-10-01') as writer:
+            for batch in batches:
+                writer.write(batch)
+    """
+
+    def __init__(self, archive, direction, date):
+        self.direction = direction
+        self.schema = archive_schema(direction)
+        self.final_path = archive.partition_path(direction, date)
+        self.tmp_path = self.final_path + ".tmp"
+        self.path = None
+        self.rows = 0
+        self._writer = None
+
+    def write(self, df):
+        if df.empty:
+            return
+        table = pa.Table.from_pandas(typed_frame(df, self.direction).drop(columns=['date']),
+                                     schema=self.schema, preserve_index=False)
+        if self._writer is None:
+            shutil.rmtree(self.tmp_path, ignore_errors=True)
+            os.makedirs(self.tmp_path)
+            self._writer = pq.ParquetWriter(os.path.join(self.tmp_path, "part-0.parquet"), table.schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+        # Swap the partition in as a whole so readers never see half a day
+        shutil.rmtree(self.final_path, ignore_errors=True)
+        os.replace(self.tmp_path, self.final_path)
+        self.path = self.final_path
+        return self.path
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,222 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from aeroapi import AVAILABLE_DAYS, AeroAPIClient, RateLimiter
+from archive import FlightArchive
+from flight_data_processor import FlightDataProcessor
+from instrumentation import RunReport
+from raw_cache import RawPageCache
+
+DEFAULT_WORKERS = 3
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 30
+DEFAULT_REQUESTS_PER_MINUTE = 60
+# A day is incomplete when it has less than this share of a typical day's flights...
+INCOMPLETE_ROW_FRACTION = 0.5
+# ...or when more than this share of its flights (cancellations aside) never got an actual time
+MAX_MISSING_ACTUAL_SHARE = 0.2
+CHECKPOINT_FILE = "backfill-checkpoint.json"
+
+
+def available_dates(today=None, days=AVAILABLE_DAYS):
+    """The complete days AeroAPI still serves (the `days` days before today, UTC), oldest first."""
+    today = today or datetime.now(timezone.utc).date()
+    return [(today - timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days, 0, -1)]
+
+
+def find_gaps(archive, dates):
+    """
+    Dates that are missing from the archive or look incomplete.
+
+    A day is missing when either direction has no partition. It is
+    incomplete when a direction has fewer than INCOMPLETE_ROW_FRACTION of
+    the median day's flights in `dates`, or when more than
+    MAX_MISSING_ACTUAL_SHARE of its flights that were not cancelled have no
+    actual time (which is what a day fetched before it was over looks like).
+
+    Returns:
+        dict: {date: reason}, oldest first
+    """
+    gaps = {}
+    for direction in ['arrivals', 'departures']:
+        stats = {date: archive.day_stats(direction, date) for date in dates}
+        counts = sorted(day['rows'] for day in stats.values() if day)
+        typical = counts[len(counts) // 2] if len(counts) >= 3 else None
+        for date, day in stats.items():
+            if day is None:
+                reason = f"no {direction}"
+            elif typical and day['rows'] < INCOMPLETE_ROW_FRACTION * typical:
+                reason = f"only {day['rows']} {direction} (typical day {typical})"
+            elif day['rows'] and day['missing_actual'] / day['rows'] > MAX_MISSING_ACTUAL_SHARE:
+                reason = f"{day['missing_actual']} of {day['rows']} {direction} have no actual time"
+            else:
+                continue
+            gaps.setdefault(date, reason)
+    return dict(sorted(gaps.items()))
+
+
+class BackfillCheckpoint:
+    """
+    On-disk progress of a backfill run, so a crashed run resumes where it stopped.
+
+    Records the queued dates and, per date, its status ('done', 'retrying',
+    'incomplete' or 'failed'), attempts and last error. Every update is
+    written atomically. The file is removed once a run finishes with every
+    day done; otherwise the next run picks up the dates that are not.
+
+    A day is only marked done once the archive shows it complete, and the
+    archive stays the source of truth: a day that is a gap again on the
+    next run is queued again whatever the checkpoint says.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+        else:
+            self.state = {"queued": [], "dates": {}}
+
+    def queue(self, gaps, window):
+        """
+        Queue this run's gaps and return the dates still to do, oldest first.
+
+        Dates queued by an earlier run stay queued only while they are still
+        gaps inside `window`; days filled since, or that fell out of the
+        window AeroAPI serves, are dropped together with their progress.
+        Every queued date is a gap in the archive, so one marked done by an
+        earlier run is not trusted and goes back to the queue.
+        """
+        with self._lock:
+            queued = set(gaps) & set(window)
+            self.state["queued"] = sorted(queued)
+            self.state["dates"] = {date: entry for date, entry in self.state["dates"].items()
+                                   if date in queued and entry["status"] != "done"}
+            self._save()
+            return list(self.state["queued"])
+
+    def mark(self, date, status, **fields):
+        with self._lock:
+            entry = self.state["dates"].setdefault(date, {"attempts": 0})
+            entry.update(fields, status=status, updated=datetime.now(timezone.utc).isoformat())
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def run_backfill(api_key, airport_code, output_path=None, dates=None, max_workers=DEFAULT_WORKERS,
+                 max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE,
+                 requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, client=None, report=None):
+    """
+    Find every missing or incomplete day in AeroAPI's window and fetch them unattended.
+
+    Days run concurrently over one pooled client and request budget. A day
+    that fails is retried up to `max_attempts` times with exponential
+    backoff (backoff_base, 2x, 4x, ... seconds). A fetched day only counts
+    as done when find_gaps no longer reports it; otherwise it is left
+    'incomplete' for the next run. Progress is checkpointed in the output
+    directory after every day, so a rerun after a crash resumes the days
+    that are still gaps in the archive.
+
+    Args:
+        api_key (str): AeroAPI key
+        airport_code (str): ICAO code of the airport
+        output_path (str): Where the daily CSVs, archive, raw cache and checkpoint live (~/Documents)
+        dates (list): Dates to check instead of the last AVAILABLE_DAYS days
+        max_workers (int): Days fetched at once
+        max_attempts (int): Tries per day before it is reported as failed
+        backoff_base (float): Seconds to wait before the first retry of a day
+        requests_per_minute (float): AeroAPI request budget
+        client (AeroAPIClient): Client shared by the day workers (defaults to one held to requests_per_minute)
+        report (RunReport): Records stage timings and counts
+
+    Returns:
+        dict: {'gaps': {date: reason}, 'done': [...], 'incomplete': {date: reason}, 'failed': {date: error}}
+    """
+    output_path = output_path or os.path.expanduser("~/Documents")
+    report = report or RunReport("backfill")
+    own_client = client is None
+    if own_client:
+        client = AeroAPIClient(api_key, max_concurrency=max_workers * 2,
+                               rate_limiter=RateLimiter(requests_per_minute))
+    cache = RawPageCache(os.path.join(output_path, "raw-cache"))
+    checkpoint = BackfillCheckpoint(os.path.join(output_path, CHECKPOINT_FILE))
+
+    window = dates or available_dates()
+    with report.stage("detect"):
+        archive = FlightArchive(os.path.join(output_path, "flight-archive"))
+        gaps = find_gaps(archive, window)
+    previously_queued = set(checkpoint.state["queued"])
+    todo = checkpoint.queue(gaps, window)
+    report.count("gaps", len(gaps))
+    for date, reason in gaps.items():
+        print(f"{date}: {reason}")
+    resumed = [date for date in todo if date in previously_queued]
+    if resumed:
+        print(f"Resuming unfinished day(s) {', '.join(resumed)} from {checkpoint.path}")
+    dropped = sorted(previously_queued - set(checkpoint.state["queued"]))
+    if dropped:
+        print(f"Dropping queued day(s) {', '.join(dropped)}: no longer missing or outside the window")
+
+    failed = {}
+    incomplete = {}
+    api_before = client.stats()
+
+    def backfill_day(date):
+        processor = FlightDataProcessor(api_key, airport_code, date, client=client, cache=cache,
+                                        report=report, output_path=output_path)
+        for attempt in range(max_attempts):
+            try:
+                with report.stage("fetch"):
+                    raw_by_type = processor.fetch_all_directions()
+                rows = processor.process_fetched(raw_by_type)
+            except Exception as e:
+                if attempt + 1 == max_attempts:
+                    checkpoint.mark(date, "failed", attempts=attempt + 1, error=str(e))
+                    failed[date] = str(e)
+                    report.count("failed_days")
+                    print(f"{date}: failed after {attempt + 1} attempts: {e}")
+                    return
+                delay = backoff_base * (2 ** attempt)
+                checkpoint.mark(date, "retrying", attempts=attempt + 1, error=str(e))
+                report.count("retries")
+                print(f"{date}: attempt {attempt + 1} failed ({e}), retrying in {delay:.0f}s")
+                time.sleep(delay)
+                continue
+            # Judged against the rest of the window, as when the gaps were found
+            with report.stage("verify"):
+                reason = find_gaps(archive, window).get(date)
+            if reason:
+                checkpoint.mark(date, "incomplete", attempts=attempt + 1, rows=rows, error=reason)
+                incomplete[date] = reason
+                report.count("incomplete_days")
+                print(f"{date}: still incomplete after fetching ({reason})")
+                return
+            checkpoint.mark(date, "done", attempts=attempt + 1, rows=rows)
+            report.count("days")
+            print(f"{date}: {rows['arrivals']} arrivals, {rows['departures']} departures")
+            return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(backfill_day, todo))
+
+    report.count_api(api_before, client.stats())
+    if own_client:
+        client.close()
+    if not failed and not incomplete:
+        checkpoint.clear()
+    done = sorted(set(todo) - set(failed) - set(incomplete))
+    return {"gaps": gaps, "done": done, "incomplete": incomplete, "failed": failed}
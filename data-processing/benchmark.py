@@ -0,0 +1,536 @@
+import argparse
+import contextlib
+import gzip
+import importlib.util
+import json
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from aeroapi import AeroAPIClient
+from aeroapi_stub import AeroAPIStub
+from archive import METRIC_COLUMNS, FlightArchive
+from flight_data_processor import FlightDataProcessor
+from instrumentation import process_peak_rss_mb
+from metrics import analyze_flight_data
+from raw_cache import RawPageCache
+from schema import read_flights_csv
+
+SCALES = {
+    'day': 1,
+    'week': 7,
+    'month': 30,
+    'year': 365,
+    '5y': 5 * 365
+}
+DEFAULT_SCALES = ['day', 'month', 'year']
+FLIGHTS_PER_DAY = 300
+# AeroAPI only serves the last 10 days, so fetching is never benchmarked past that
+FETCH_WINDOW_DAYS = 10
+# Simulated AeroAPI time per page served (a request for more pages takes longer)
+# and per new connection (TCP and TLS setup)
+FETCH_PAGE_LATENCY = 0.005
+FETCH_CONNECT_LATENCY = 0.05
+DEFAULT_THRESHOLD = 0.25
+# Below these floors a stage's timing or memory growth is mostly noise and is not compared
+MIN_COMPARED_SECONDS = 0.1
+MIN_COMPARED_MB = 16
+# Flights per direction of the one large day the ingest stages fetch (50k flights in all)
+INGEST_FLIGHTS = 25000
+START_DATE = '2024-01-01'
+HOME_AIRPORT = {'code': 'LPPT', 'code_icao': 'LPPT', 'code_iata': 'LIS', 'city': 'Lisbon'}
+
+OPERATORS = ['TAP', 'RYR', 'EZY', 'IBE', 'AFR', 'KLM', 'DLH', 'BAW', 'VLG', 'TRA', 'SAT', 'UAE']
+ROUTES = [
+    ('LEMD', 'MAD', 'Madrid'), ('LEBL', 'BCN', 'Barcelona'), ('LFPG', 'CDG', 'Paris'),
+    ('LFPO', 'ORY', 'Orly (near Paris)'), ('EGLL', 'LHR', 'London'), ('EGKK', 'LGW', 'London'),
+    ('EHAM', 'AMS', 'Amsterdam'), ('EDDF', 'FRA', 'Frankfurt am Main'), ('EDDM', 'MUC', 'Munich'),
+    ('LIRF', 'FCO', 'Rome'), ('LIMC', 'MXP', 'Milan'), ('LSZH', 'ZRH', 'Zurich'),
+    ('EBBR', 'BRU', 'Brussels'), ('LPPR', 'OPO', 'Francisco Sa Carneiro Int.'),
+    ('LPFR', 'FAO', 'Faro / Algarve Int. Faro'), ('LPPD', 'PDL', 'Ponta Delgada'),
+    ('LPMA', 'FNC', 'Santa Catarina'), ('EIDW', 'DUB', 'Dublin'), ('GMMN', 'CMN', 'Casablanca'),
+    ('FNLU', 'LAD', 'Luanda'), ('SBGR', 'GRU', 'Sao Paulo'), ('SBGL', 'GIG', 'Rio de Janeiro'),
+    ('KEWR', 'EWR', 'Newark'), ('KJFK', 'JFK', 'New York'), ('OMDB', 'DXB', 'Dubai'),
+    ('OTHH', 'DOH', 'Doha'), ('LTFM', 'IST', 'Istanbul'), ('GVAC', 'SID', 'Sal'),
+    ('LGAV', 'ATH', 'Athens'), ('BIKF', 'KEF', 'Keflavik'), ('XXXX', None, 'Nowhere Intl')
+]
+DIRECTIONS = {
+    # direction: (scheduled, estimated, actual, field the other airport goes in)
+    'arrivals': ('scheduled_in', 'estimated_in', 'actual_in', 'origin'),
+    'departures': ('scheduled_off', 'estimated_off', 'actual_off', 'destination')
+}
+
+
+def _iso(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def generate_day(date_str, flights_per_day=FLIGHTS_PER_DAY, seed=0):
+    """
+    Seeded, AeroAPI-shaped arrivals and departures for one day at LPPT.
+
+    The same (date, flights_per_day, seed) always yields the same payload,
+    independent of which other days are generated. About 2% of flights are
+    cancelled, about 1% of the rest never get an actual time, and a few have
+    no operator or an unknown city, matching what the real feed throws at the
+    processor.
+
+    Args:
+        date_str (str): Day in YYYY-MM-DD format
+        flights_per_day (int): Flights per direction
+        seed (int): Generator seed
+
+    Returns:
+        dict: {'arrivals': [...], 'departures': [...]}
+    """
+    rng = random.Random(f"{seed}:{date_str}:{flights_per_day}")
+    day = datetime.strptime(date_str, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    payload = {}
+    for direction, (scheduled_key, estimated_key, actual_key, place_key) in DIRECTIONS.items():
+        flights = []
+        for _ in range(flights_per_day):
+            operator = rng.choice(OPERATORS)
+            number = str(rng.randrange(1, 9999))
+            icao, iata, city = rng.choice(ROUTES)
+            scheduled = day + timedelta(minutes=rng.randrange(5, 24 * 60, 5))
+            # Mostly small delays with a long tail, and some early flights
+            delay = int(rng.expovariate(1 / 14)) - rng.randrange(0, 15)
+            cancelled = rng.random() < 0.02
+            actual = None
+            if not cancelled and rng.random() >= 0.01:
+                actual = _iso(scheduled + timedelta(minutes=delay, seconds=rng.randrange(60)))
+            other = {'code': icao, 'code_icao': icao, 'code_iata': iata, 'city': city}
+            flights.append({
+                'ident': f"{operator}{number}",
+                'fa_flight_id': f"{operator}{number}-{int(scheduled.timestamp())}-schedule-{rng.randrange(10 ** 4):04d}",
+                'operator': operator if rng.random() >= 0.005 else None,
+                'flight_number': number,
+                'cancelled': cancelled,
+                'origin': other if place_key == 'origin' else HOME_AIRPORT,
+                'destination': other if place_key == 'destination' else HOME_AIRPORT,
+                scheduled_key: _iso(scheduled),
+                estimated_key: actual or _iso(scheduled),
+                actual_key: actual
+            })
+        payload[direction] = flights
+    return payload
+
+
+def benchmark_dates(days, start=START_DATE):
+    first = datetime.strptime(start, '%Y-%m-%d')
+    return [(first + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+
+
+def write_raw_days(dates, flights_per_day, seed, raw_dir):
+    """Generate each day once and keep it as gzipped JSON, so stage runs only pay for reading it back."""
+    os.makedirs(raw_dir, exist_ok=True)
+    for date_str in dates:
+        with gzip.open(os.path.join(raw_dir, f"{date_str}.json.gz"), 'wt') as f:
+            json.dump(generate_day(date_str, flights_per_day, seed), f)
+
+
+def load_raw_day(raw_dir, date_str):
+    with gzip.open(os.path.join(raw_dir, f"{date_str}.json.gz"), 'rt') as f:
+        return json.load(f)
+
+
+def load_merge_module():
+    """merge-csv.py is not importable by name, so load it from its path."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'merge-csv.py')
+    spec = importlib.util.spec_from_file_location('merge_csv', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_metrics_reference():
+    """The groupby analysis metrics.py replaced, kept in tests/metrics_reference.py."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'metrics_reference.py')
+    spec = importlib.util.spec_from_file_location('metrics_reference', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Stage:
+    """Accumulates wall time over one or more timed sections of a stage run."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.rows = 0
+
+    @contextlib.contextmanager
+    def timed(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+def fetch_legacy_stage(ctx, stage):
+    """
+    The fetch as it was before the pooled client, for comparison with the
+    fetch stage: one max_pages=1000 request per direction, one direction
+    after the other, each on a new connection.
+    """
+    with AeroAPIStub({'arrivals': [], 'departures': []}, page_latency=FETCH_PAGE_LATENCY,
+                     connect_latency=FETCH_CONNECT_LATENCY) as stub:
+        for date_str in ctx['dates'][-FETCH_WINDOW_DAYS:]:
+            stub.flights = load_raw_day(ctx['raw_dir'], date_str)
+            params = {'start': f"{date_str}T00:00:00Z", 'end': f"{date_str}T23:59:59Z", 'max_pages': 1000}
+            with stage.timed():
+                for direction in DIRECTIONS:
+                    response = requests.get(f"{stub.base_url}/airports/{HOME_AIRPORT['code']}/flights/{direction}",
+                                            headers={'x-apikey': 'benchmark', 'Accept': 'application/json'},
+                                            params=params)
+                    stage.rows += len(response.json()[direction])
+
+
+def fetch_stage(ctx, stage):
+    """FlightDataProcessor.fetch_all_directions against a local AeroAPI stub, for the fetchable window."""
+    with AeroAPIStub({'arrivals': [], 'departures': []}, page_latency=FETCH_PAGE_LATENCY,
+                     connect_latency=FETCH_CONNECT_LATENCY) as stub:
+        client = AeroAPIClient('benchmark', base_url=stub.base_url, backoff_base=0)
+        cache = RawPageCache(os.path.join(ctx['work_dir'], 'raw-cache'))
+        for date_str in ctx['dates'][-FETCH_WINDOW_DAYS:]:
+            stub.flights = load_raw_day(ctx['raw_dir'], date_str)
+            processor = FlightDataProcessor('benchmark', HOME_AIRPORT['code'], date_str,
+                                            client=client, cache=cache)
+            with stage.timed():
+                raw = processor.fetch_all_directions()
+            stage.rows += sum(len(raw[direction][direction]) for direction in raw)
+        client.close()
+
+
+def _serve_day(raw_path, connection):
+    """Serve one raw day from a stub until told to stop; runs in its own process."""
+    with gzip.open(raw_path, 'rt') as f:
+        flights = json.load(f)
+    with AeroAPIStub(flights) as stub:
+        connection.send(stub.base_url)
+        connection.recv()
+
+
+@contextlib.contextmanager
+def stub_process(raw_path):
+    """
+    Stub serving `raw_path` from a separate process, so the payload it holds
+    does not count towards the peak memory of the stage fetching from it.
+    """
+    connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.get_context('spawn').Process(target=_serve_day, args=(raw_path, child_connection))
+    process.start()
+    try:
+        yield connection.recv()
+    finally:
+        connection.send(None)
+        process.join()
+
+
+def _ingest(ctx, stage, streaming):
+    date_str = ctx['dates'][-1]
+    output_path = os.path.join(ctx['work_dir'], 'ingest-stream' if streaming else 'ingest-batch')
+    shutil.rmtree(output_path, ignore_errors=True)
+    with stub_process(ctx['ingest_day']) as base_url:
+        client = AeroAPIClient('benchmark', base_url=base_url, backoff_base=0)
+        processor = FlightDataProcessor('benchmark', HOME_AIRPORT['code'], date_str, client=client,
+                                        output_path=output_path)
+        with stage.timed():
+            if streaming:
+                processor.process_all_streaming()
+            else:
+                processor.process_all()
+        client.close()
+    stage.rows = sum(processor.report.counters.get(f"{flight_type}_rows", 0) for flight_type in DIRECTIONS)
+
+
+def ingest_batch_stage(ctx, stage):
+    """process_all on one day of INGEST_FLIGHTS flights per direction from a stub, whole days in memory."""
+    _ingest(ctx, stage, streaming=False)
+
+
+def ingest_stream_stage(ctx, stage):
+    """The ingest_batch day through process_all_streaming, which keeps one batch of flights at a time."""
+    _ingest(ctx, stage, streaming=True)
+
+
+def process_stage(ctx, stage):
+    """process_flights and save_csv for every day."""
+    for date_str in ctx['dates']:
+        raw = load_raw_day(ctx['raw_dir'], date_str)
+        processor = FlightDataProcessor('benchmark', HOME_AIRPORT['code'], date_str)
+        processor.output_path = ctx['daily_dir']
+        with stage.timed():
+            for flight_type in DIRECTIONS:
+                processed = processor.process_flights(raw, flight_type)
+                processor.save_csv(processed, f"{flight_type}.csv")
+                stage.rows += len(processed)
+
+
+def archive_write_stage(ctx, stage):
+    """Transform every day and write it to the Parquet archive; only the writes are timed."""
+    archive = FlightArchive(ctx['archive_dir'])
+    for date_str in ctx['dates']:
+        raw = load_raw_day(ctx['raw_dir'], date_str)
+        processor = FlightDataProcessor('benchmark', HOME_AIRPORT['code'], date_str)
+        for flight_type in DIRECTIONS:
+            processed = processor.process_flights_frame(raw, flight_type)
+            with stage.timed():
+                archive.write_day(flight_type, date_str, processed)
+            stage.rows += len(processed)
+
+
+def archive_load_stage(ctx, stage):
+    """Load the columns metrics.py needs for every archived day, as metrics.py --archive does."""
+    archive = FlightArchive(ctx['archive_dir'])
+    with stage.timed():
+        frames = [archive.load(flight_type, METRIC_COLUMNS[flight_type]) for flight_type in DIRECTIONS]
+    stage.rows = sum(len(df) for df in frames)
+
+
+def merge_stage(ctx, stage):
+    """merge_csv_files over every daily CSV, per direction."""
+    merge_csv = load_merge_module()
+    with stage.timed():
+        for flight_type, output in ctx['merged'].items():
+            merge_csv.merge_csv_files(ctx['daily_dir'], f"*_{flight_type}.csv", output)
+    for output in ctx['merged'].values():
+        with open(output) as f:
+            stage.rows += sum(1 for _ in f) - 1
+
+
+def metrics_stage(ctx, stage):
+    """Read the merged CSVs and run analyze_flight_data."""
+    with stage.timed():
+        arrivals_df = read_flights_csv(ctx['merged']['arrivals'])
+        departures_df = read_flights_csv(ctx['merged']['departures'])
+        analyze_flight_data(arrivals_df, departures_df)
+    stage.rows = len(arrivals_df) + len(departures_df)
+
+
+def metrics_legacy_stage(ctx, stage):
+    """The metrics stage with the groupby analysis it replaced, for comparison."""
+    reference = load_metrics_reference()
+    with stage.timed():
+        arrivals_df = read_flights_csv(ctx['merged']['arrivals'])
+        departures_df = read_flights_csv(ctx['merged']['departures'])
+        reference.analyze_flight_data(arrivals_df, departures_df)
+    stage.rows = len(arrivals_df) + len(departures_df)
+
+
+# Stages that keep an older implementation around, to report the speedup over it
+REFERENCE_STAGES = {
+    'fetch': 'fetch_legacy',
+    'metrics': 'metrics_legacy'
+}
+
+# Stages that do the same work as another one in less memory, to report how much less
+MEMORY_REFERENCE_STAGES = {
+    'ingest_stream': 'ingest_batch'
+}
+
+STAGES = {
+    'fetch_legacy': fetch_legacy_stage,
+    'fetch': fetch_stage,
+    'ingest_batch': ingest_batch_stage,
+    'ingest_stream': ingest_stream_stage,
+    'process': process_stage,
+    'archive_write': archive_write_stage,
+    'archive_load': archive_load_stage,
+    'merge': merge_stage,
+    'metrics_legacy': metrics_legacy_stage,
+    'metrics': metrics_stage
+}
+
+
+def _peak_memory_run(name, ctx):
+    """Run one stage in a fresh process and return how far it raised the peak RSS."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        before = process_peak_rss_mb()
+        STAGES[name](ctx, Stage())
+        return process_peak_rss_mb() - before
+
+
+def measure(name, ctx, repeat):
+    """
+    Time one stage and measure its peak memory.
+
+    The time is the best of `repeat` runs in this process. Peak memory is
+    measured in a separate run in a process forked from the fork server, as
+    the growth of its peak resident set size, so it covers NumPy and Arrow
+    buffers as well as Python objects and is not skewed by earlier stages.
+    """
+    timings = []
+    for _ in range(repeat):
+        stage = Stage()
+        STAGES[name](ctx, stage)
+        timings.append(stage.seconds)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('forkserver')) as executor:
+        peak_mb = executor.submit(_peak_memory_run, name, ctx).result()
+    return {
+        'seconds': round(min(timings), 4),
+        'peak_mb': round(peak_mb, 2),
+        'rows': stage.rows
+    }
+
+
+def run_scale(days, flights_per_day, seed, work_dir, repeat=1):
+    """
+    Measure every stage, in order, for `days` days of synthetic data.
+
+    Generating and loading the payloads is not counted in any stage's time.
+    """
+    ctx = {
+        'work_dir': work_dir,
+        'raw_dir': os.path.join(work_dir, 'raw'),
+        'daily_dir': os.path.join(work_dir, 'daily'),
+        'archive_dir': os.path.join(work_dir, 'flight-archive'),
+        'dates': benchmark_dates(days),
+        'ingest_day': os.path.join(work_dir, 'ingest-day.json.gz'),
+        'merged': {flight_type: os.path.join(work_dir, f"merged_{flight_type}.csv") for flight_type in DIRECTIONS}
+    }
+    os.makedirs(ctx['daily_dir'], exist_ok=True)
+    write_raw_days(ctx['dates'], flights_per_day, seed, ctx['raw_dir'])
+    with gzip.open(ctx['ingest_day'], 'wt') as f:
+        json.dump(generate_day(ctx['dates'][-1], INGEST_FLIGHTS, seed), f)
+    return {name: measure(name, ctx, repeat) for name in STAGES}
+
+
+def speedups(stages):
+    """Speedup of each stage over its REFERENCE_STAGES entry, where both were run and timed."""
+    return {name: round(stages[reference]['seconds'] / stages[name]['seconds'], 2)
+            for name, reference in REFERENCE_STAGES.items()
+            if name in stages and reference in stages and stages[name]['seconds'] > 0}
+
+
+def memory_ratios(stages):
+    """How many times less peak memory each stage needs than its MEMORY_REFERENCE_STAGES entry."""
+    return {name: round(stages[reference]['peak_mb'] / stages[name]['peak_mb'], 2)
+            for name, reference in MEMORY_REFERENCE_STAGES.items()
+            if name in stages and reference in stages and stages[name]['peak_mb'] > 0}
+
+
+def find_regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results against a baseline of the same shape.
+
+    A stage regresses when its time or peak memory is more than
+    `threshold` (a fraction) above the baseline. Scales and stages missing
+    from the baseline are not compared.
+
+    Returns:
+        list: Human-readable descriptions of each regression
+    """
+    regressions = []
+    for scale, run in results['scales'].items():
+        base_run = baseline.get('scales', {}).get(scale)
+        if not base_run or base_run.get('flights_per_day') != run['flights_per_day']:
+            continue
+        for stage, measured in run['stages'].items():
+            base = base_run['stages'].get(stage)
+            if not base:
+                continue
+            checks = []
+            if base['seconds'] >= MIN_COMPARED_SECONDS:
+                checks.append(('seconds', 'time'))
+            if base['peak_mb'] >= MIN_COMPARED_MB:
+                checks.append(('peak_mb', 'peak memory'))
+            for key, label in checks:
+                limit = base[key] * (1 + threshold)
+                if measured[key] > limit:
+                    regressions.append(
+                        f"{scale}/{stage}: {label} {measured[key]} vs baseline {base[key]} "
+                        f"(+{(measured[key] / base[key] - 1) * 100:.0f}%, limit +{threshold * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fetch, process, merge and metrics on seeded synthetic data")
+    parser.add_argument('--scales', nargs='+', default=DEFAULT_SCALES, choices=list(SCALES),
+                        help="Amounts of history to run (day, week, month, year, 5y)")
+    parser.add_argument('--flights-per-day', type=int, default=FLIGHTS_PER_DAY,
+                        help="Flights per direction per day")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Timed runs per stage; the fastest one is recorded")
+    parser.add_argument('--output', default='benchmark-results.json',
+                        help="Where to write the results")
+    parser.add_argument('--baseline',
+                        help="Baseline results to compare against; exits non-zero on a regression")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown or memory growth per stage, as a fraction")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="Write these results to --baseline instead of comparing")
+    parser.add_argument('--keep', action='store_true',
+                        help="Keep the generated files instead of deleting them")
+    args = parser.parse_args()
+
+    # Peak RSS carries over into forked and exec'd children, so start the fork
+    # server while this process is still small
+    multiprocessing.forkserver.ensure_running()
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'scales': {}
+    }
+    for scale in args.scales:
+        work_dir = tempfile.mkdtemp(prefix=f"lis-benchmark-{scale}-")
+        print(f"Running {scale} ({SCALES[scale]} days x {args.flights_per_day} flights/direction) in {work_dir}")
+        try:
+            # The pipeline prints a line per file; keep the benchmark output readable
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                stages = run_scale(SCALES[scale], args.flights_per_day, args.seed, work_dir, args.repeat)
+        finally:
+            if not args.keep:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        results['scales'][scale] = {
+            'days': SCALES[scale],
+            'flights_per_day': args.flights_per_day,
+            'repeat': args.repeat,
+            'stages': stages,
+            'speedups': speedups(stages),
+            'memory_ratios': memory_ratios(stages)
+        }
+        for stage, measured in stages.items():
+            print(f"  {stage:<14} {measured['seconds']:>9.3f}s {measured['peak_mb']:>9.1f} MB {measured['rows']:>10} rows")
+        for stage, speedup in results['scales'][scale]['speedups'].items():
+            print(f"  {stage} is {speedup}x as fast as {REFERENCE_STAGES[stage]}")
+        for stage, ratio in results['scales'][scale]['memory_ratios'].items():
+            print(f"  {stage} needs {ratio}x less peak memory than {MEMORY_REFERENCE_STAGES[stage]}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import hashlib
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from metrics import (DEFAULT_AIRPORT, DEFAULT_TIMEZONE, DELAY_BUCKETS, PARTIAL_COUNTS, TIME_PERIODS,
+                     analysis_metadata, compute_cells, round_breakdowns, save_analysis)
+from schema import city_labels
+from transform import DIRECTION_FIELDS, airport_column
+
+CUBE_KEYS = ['operator', 'city', 'direction', 'time_of_day', 'week']
+# Carriers and routes with fewer valid flights than this are left out of the rankings
+MIN_RANKED_FLIGHTS = 20
+TOP_K = 10
+UNKNOWN = "Unknown"
+INDEX_FILE = "index.json"
+OPERATOR_DIR = "operators"
+CELL_COLUMNS = ['city', 'direction', 'timeOfDay', 'week', 'flights', 'averageDelay'] + DELAY_BUCKETS
+
+
+def cube_columns(direction):
+    """Columns the cube reads per direction (the archive adds `date`)."""
+    scheduled_key, actual_key, _, city_col = DIRECTION_FIELDS[direction]
+    return ['operator', city_col, airport_column(direction), scheduled_key, actual_key, 'delay', 'time_of_day']
+
+
+def compute_cube(df, direction):
+    """
+    Aggregate one direction's flights into (operator, city, direction, time_of_day, week) cells.
+
+    Weeks are ISO years and weeks such as '2024-W05', so the same week
+    number of different years stays apart (flights without a date are in
+    week UNKNOWN). Cities are the airport table's, so every airport keeps one
+    label; airports missing from the table keep the city AeroAPI sent.
+    Each cell carries the same mergeable counts as the metrics
+    partials, so any roll-up is a sum.
+
+    Parameters:
+    df (pd.DataFrame): Flight rows with a `date` column
+    direction (str): 'arrivals' or 'departures'
+
+    Returns:
+    pd.DataFrame: Columns CUBE_KEYS + PARTIAL_COUNTS
+    """
+    scheduled_key, actual_key = DIRECTION_FIELDS[direction][:2]
+    dates = df['date'].astype('category')
+    iso = pd.to_datetime(dates.cat.categories).isocalendar()
+    week_of_date = np.array([f"{year}-W{week:02d}" for year, week in zip(iso.year, iso.week)] + [UNKNOWN],
+                            dtype=object)
+    # Code -1 (no date) picks the trailing UNKNOWN
+    codes = dates.cat.codes.to_numpy()
+    rows = pd.DataFrame({
+        'operator': df['operator'].astype(object).fillna(UNKNOWN),
+        'city': pd.Series(city_labels(df, direction), index=df.index, dtype=object).fillna(UNKNOWN),
+        'direction': direction,
+        'time_of_day': df['time_of_day'],
+        # Flights without a date have no scheduled time either, so they never count as valid
+        'week': week_of_date[codes],
+        scheduled_key: df[scheduled_key],
+        actual_key: df[actual_key],
+        'delay': df['delay']
+    })
+    return compute_cells(rows, CUBE_KEYS, scheduled_key, actual_key)
+
+
+def build_cube(arrivals_df, departures_df):
+    """Both directions' cube cells in one table (see compute_cube)."""
+    return pd.concat([compute_cube(arrivals_df, 'arrivals'), compute_cube(departures_df, 'departures')],
+                     ignore_index=True)
+
+
+def summarize(cells, keys):
+    """
+    Roll cube cells up to `keys` with the dashboard's figures: valid flights,
+    average delay (as in averageDelay) and the on-time breakdown (as in delays).
+    """
+    if keys:
+        totals = cells.groupby(keys, sort=True)[PARTIAL_COUNTS].sum().reset_index()
+    else:
+        totals = cells[PARTIAL_COUNTS].sum().to_frame().T
+    valid = totals['valid'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average = np.where(valid > 0, totals['delay_sum'].to_numpy(dtype=float) / valid, 0.0)
+    summary = totals[keys].copy()
+    summary['flights'] = valid.astype(np.int64)
+    summary['mean_delay'] = average
+    summary['averageDelay'] = np.round(average).astype(np.int64)
+    summary[DELAY_BUCKETS] = round_breakdowns(totals[DELAY_BUCKETS].to_numpy())
+    return summary
+
+
+def describe(row):
+    """Dashboard figures of one summarize() row."""
+    return {
+        "flights": int(row['flights']),
+        "averageDelay": int(row['averageDelay']),
+        "delays": {bucket: int(row[bucket]) for bucket in DELAY_BUCKETS}
+    }
+
+
+def rank(summary, keys, top_k, worst):
+    """The top_k rows by average delay (worst or best first) among those with enough flights."""
+    eligible = summary[summary['flights'] >= MIN_RANKED_FLIGHTS]
+    ordered = eligible.sort_values(['mean_delay', 'flights'], ascending=[not worst, False], kind='stable')
+    return [{**{key: row[key] for key in keys}, **describe(row)}
+            for _, row in ordered.head(top_k).iterrows()]
+
+
+def code_hash(operator):
+    """Short hash of an operator code, appended to shard names that would otherwise clash."""
+    return hashlib.sha256(str(operator).encode()).hexdigest()[:8]
+
+
+def operator_shard_name(operator):
+    """
+    File (and KV key) safe name of an operator's shard. Codes that need
+    escaping get a hash of the original code appended, so 'A/B' and 'A_B'
+    never share a shard.
+    """
+    name = re.sub(r'[^A-Za-z0-9_-]', '_', str(operator))
+    if name != str(operator):
+        name = f"{name}-{code_hash(operator)}"
+    return name
+
+
+def shard_names(operators):
+    """
+    {operator: shard name}. Case-insensitive file systems would merge names
+    that only differ in case, so operators whose names clash that way
+    ('EZY' and 'ezy') also get a hash of their code appended.
+    """
+    names = {operator: operator_shard_name(operator) for operator in operators}
+    clashes = {}
+    for operator, name in names.items():
+        clashes.setdefault(name.lower(), []).append(operator)
+    for group in clashes.values():
+        if len(group) > 1:
+            for operator in group:
+                if names[operator] == str(operator):
+                    names[operator] = f"{operator}-{code_hash(operator)}"
+    return names
+
+
+def cube_index(cube, top_k=TOP_K, airport=DEFAULT_AIRPORT, timezone=DEFAULT_TIMEZONE):
+    """Every operator's totals plus the best and worst carriers and routes."""
+    carriers = summarize(cube, ['operator'])
+    routes = summarize(cube, ['operator', 'city', 'direction'])
+    shards = shard_names(carriers['operator'])
+    return {
+        "operators": [
+            {"operator": row['operator'], "shard": shards[row['operator']], **describe(row)}
+            for _, row in carriers.sort_values('flights', ascending=False, kind='stable').iterrows()
+        ],
+        "rankings": {
+            "worstCarriers": rank(carriers, ['operator'], top_k, worst=True),
+            "bestCarriers": rank(carriers, ['operator'], top_k, worst=False),
+            "worstRoutes": rank(routes, ['operator', 'city', 'direction'], top_k, worst=True),
+            "bestRoutes": rank(routes, ['operator', 'city', 'direction'], top_k, worst=False)
+        },
+        "minFlights": MIN_RANKED_FLIGHTS,
+        "metadata": analysis_metadata(airport, timezone)
+    }
+
+
+def operator_drilldown(cells, operator):
+    """
+    One operator's drill-down: totals, each route with its time-of-day split,
+    and every (city, direction, time of day, week) cell as compact rows.
+    """
+    routes = summarize(cells, ['city', 'direction'])
+    by_period = summarize(cells, ['city', 'direction', 'time_of_day'])
+    periods = {(row['city'], row['direction'], row['time_of_day']): describe(row)
+               for _, row in by_period.iterrows()}
+    finest = summarize(cells, ['city', 'direction', 'time_of_day', 'week'])
+    finest['time_of_day'] = finest['time_of_day'].astype(str).str.lower()
+    return {
+        "operator": operator,
+        "summary": describe(summarize(cells, []).iloc[0]),
+        "routes": [
+            {"city": row['city'], "direction": row['direction'], **describe(row),
+             "timeOfDay": {period.lower(): periods[(row['city'], row['direction'], period)]
+                           for period in TIME_PERIODS if (row['city'], row['direction'], period) in periods}}
+            for _, row in routes.sort_values('flights', ascending=False, kind='stable').iterrows()
+        ],
+        "cells": {
+            "columns": CELL_COLUMNS,
+            "rows": finest[['city', 'direction', 'time_of_day', 'week', 'flights', 'averageDelay'] + DELAY_BUCKETS]
+                .astype(object).values.tolist()
+        }
+    }
+
+
+def write_cube(cube, output_dir, top_k=TOP_K, airport=DEFAULT_AIRPORT, timezone=DEFAULT_TIMEZONE):
+    """
+    Write the cube as small minified JSON shards: index.json with the
+    operator totals and rankings, and operators/<operator>.json per carrier.
+    The directory is replaced as a whole, so carriers that disappeared
+    leave no stale shard behind.
+
+    Returns:
+        str: Path of index.json
+    """
+    tmp_dir = output_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, OPERATOR_DIR))
+    index = cube_index(cube, top_k, airport, timezone)
+    save_analysis(index, os.path.join(tmp_dir, INDEX_FILE))
+    shards = {entry["operator"]: entry["shard"] for entry in index["operators"]}
+    for operator, cells in cube.groupby('operator', sort=True):
+        save_analysis(operator_drilldown(cells, operator),
+                      os.path.join(tmp_dir, OPERATOR_DIR, f"{shards[operator]}.json"))
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    return os.path.join(output_dir, INDEX_FILE)
+
+
+def main():
+    from archive import FlightArchive
+    from instrumentation import RunReport
+    from schema import read_flights_csv
+
+    parser = argparse.ArgumentParser(description="Build the operator and route drill-down cube")
+    parser.add_argument('--archive',
+                        help="Read flights from this Parquet archive instead of the merged CSV files")
+    parser.add_argument('--output-dir', default='cube',
+                        help="Directory the index and per-operator shards are written to")
+    parser.add_argument('--top-k', type=int, default=TOP_K,
+                        help="Carriers and routes listed in each ranking")
+    parser.add_argument('--airport', default=DEFAULT_AIRPORT,
+                        help="IATA code reported in the output metadata")
+    parser.add_argument('--timezone', default=DEFAULT_TIMEZONE,
+                        help="IANA time zone reported in the output metadata")
+    args = parser.parse_args()
+
+    report = RunReport('cube').start()
+    with report.stage('load'):
+        if args.archive:
+            archive = FlightArchive(args.archive)
+            arrivals_df = archive.load('arrivals', cube_columns('arrivals'))
+            departures_df = archive.load('departures', cube_columns('departures'))
+        else:
+            arrivals_df = read_flights_csv('merged_arrivals.csv')
+            departures_df = read_flights_csv('merged_departures.csv')
+    report.count('rows', len(arrivals_df) + len(departures_df), stage='load')
+    with report.stage('aggregate'):
+        cube = build_cube(arrivals_df, departures_df)
+    report.count('cells', len(cube), stage='aggregate')
+    with report.stage('save'):
+        index_path = write_cube(cube, args.output_dir, args.top_k, args.airport, args.timezone)
+    print(f"Cube of {len(cube)} cells for {cube['operator'].nunique()} operators written to {index_path}")
+    print(f"Run report saved to {report.save(os.path.dirname(os.path.abspath(args.output_dir)))}")
+
+
+if __name__ == "__main__":
+    main()
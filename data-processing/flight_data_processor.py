@@ -1,178 +1,119 @@
+import argparse
 import json
 import csv
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import islice
 import os
 
+from aeroapi import AeroAPIClient
+from airports import UNKNOWN_AIRPORT, load_airports
+from archive import FlightArchive
+from instrumentation import RunReport, add_report_arguments
+from partials import DEFAULT_PARTIALS_DIR
+from raw_cache import RawPageCache, page_cursor
+from repair import INDEX_DIR, IncompleteFlightIndex, incomplete_flights, repair_incomplete
+from transform import DIRECTION_FIELDS, airport_column, csv_records, output_columns, transform_flights
+
+STREAM_BATCH_SIZE = 1000
+
 class FlightDataProcessor:
-    def __init__(self, api_key, airport_code, date_str):
+    def __init__(self, api_key, airport_code, date_str, client=None, cache=None, replay=False, report=None,
+                 output_path=None):
         self.api_key = api_key
         self.airport_code = airport_code
-        self.headers = {
-            "x-apikey": api_key,
-            "Accept": "application/json"
-        }
+        # Shared, pooled client; pass one in to reuse connections across processors
+        self._client = client
+        # Raw pages are kept in the cache; replay reads them back instead of calling the API
+        self.cache = cache
+        self.replay = replay
+        # Stage timings and counters; share one report across processors to cover a whole run
+        self.report = report or RunReport("process")
         self.date_str = date_str.replace('-', '')  # Convert YYYY-MM-DD to YYYYMMDD
         self.target_date = datetime.strptime(date_str, '%Y-%m-%d')
-        self.output_path = os.path.expanduser("~/Documents")  # Changed to direct path
+        self.output_path = output_path or os.path.expanduser("~/Documents")  # Changed to direct path
+        self.archive_path = os.path.join(self.output_path, "flight-archive")
+        self.cache_path = os.path.join(self.output_path, "raw-cache")
+        self.incomplete_path = os.path.join(self.output_path, INDEX_DIR)
 
-        self.schengen_lookup = {
-            'Santa Lucía': False, 'Santa Catarina': False, 'Sao Paulo': False, 'Tanger': False,
-            'Rio de Janeiro': False, 'Luanda': False, 'Cairo': False, 'Faro / Algarve Int. Faro': True,
-            'Malaga': True, 'Ankara': False, 'Barcelona': True, 'Algiers': False, 'Dublin': False,
-            'Ponta Delgada': True, 'Sevilla': True, 'Madrid': True, 'Doha': False, 'London': False,
-            'Luqa': True, 'Francisco Sa Carneiro Int.': True, 'Nice': True, 'Casablanca': False,
-            'Palma de Mallorca': True, 'Dubai': False, 'Milan': True, 'Saint Exupery': True,
-            'Stockholm': True, 'Diass': False, 'Bergamo': True, 'Sal': False, 'Santiago': True,
-            'Budapest': True, 'Manises': True, 'Marseille': True, 'Blagnac': True, 'Amsterdam': True,
-            'Rome': True, 'Brussels': True, 'Mediterranee': True, 'Paris': True, 'Geneva': True,
-            'Marrakech': False, 'Nantes': True, 'Charleroi': True, 'Vitoria': True, 'Orly (near Paris)': True,
-            'Agadir': False, 'Munich': True, 'Beauvais': True, 'Warsaw': True, 'Toronto': False,
-            'Edinburgh': False, 'Zurich': True, 'Rotterdam': True, 'Sofia': False, 'Montreal': False,
-            'Newark': False, 'Bristol': False, 'Eindhoven': True, 'Manchester': False, 'Frankfurt am Main': True,
-            'Berlin': True, 'Salvador': False, 'Hamburg': True, 'Bologna': True, 'Jasionka': True,
-            'Dusseldorf': True, 'Fortaleza': False, 'Belem': False, 'Boston': False, 'Recife': False,
-            'New York': False, 'Washington': False, 'Vienna': True, 'Istanbul': False, 'Venice (Venezia)': True,
-            'Vantaa': True, 'Nowy Dwor Mazowiecki': True, 'Sao Vicente': False, 'EuroAirport (Basel)': True,
-            'Bilbao / Bilbo': True, 'Florence (Firenze)': True, 'Bordeaux/Merignac': True, 'Prague': True,
-            'Florianopolis': False, 'Stuttgart': True, 'Bissau': False, 'Natal': False,
-            'Santa Maria Island / Vila do Porto': True, 'Copenhagen': True, 'Luxembourg': True, 'Athens': True,
-            'Hangzhou': False, 'Campinas': False, 'Miami': False, 'Philadelphia': False, 'Belo Horizonte': False,
-            'Gran Canaria': True, 'Brasilia': False, 'San Francisco': False, 'Cologne/Bonn': True,
-            'Balice': True, 'Tenerife': True, 'Birmingham': False, 'Abu Dhabi': False, 'Horta': True,
-            'Oslo': True, 'Alicante / Benidorm / Costa Blanca': True, 'Seoul (Incheon)': False,
-            'İzmir': False, 'Aviles / Gijon / Oviedo (Asturias)': True, 
-            'Porto Santo Island / Vila Baleira {Porto Santo Island}': True, 'Bucharest': False,
-            'Ibiza Island / Eivisa': True, 'Chicago': False, 'Menorca': True, 'Farnborough': False,
-            'Palmeira': False, 'Accra': False, 'Pico Island': True, 'Naples': True, 'Tel Aviv': False,
-            'Belgrade': False, 'Maputo': False, 'Pisa': True, 'Vilnius': True, 'Montijo': True,
-            'Ostend': True, 'Aalborg': True, 'Bratislava': True, 'Boa Vista': False, 'Glasgow': False,
-            'Split': True, 'Tunis': False, 'Keflavik': True, 'RIGA': True, 'Punta Cana': False,
-            'Maiquetia': False, 'Beja': True, 'Poznan': True, 'Cancun': False, 'Cardiff': False,
-            'Leipzig/Halle': True, 'Teterboro': False, 'Varadero': False, 'Girona': True,
-            'Sao Tome': False, 'Lisbon': True, 'Port Gentil': False, 'Abidjan': False,
-            'Cascais / Estoril': True, 'Nouadhibou': False, 'Liege': True, 'Kaunas': True,
-            'Graz': True, 'Wrocław': True, 'Terceira Island /Praia da Vitoria /Angra area': True
-        }
+        # Airport table shared by every processor in the process; it decides the Schengen flag
+        self.airports = load_airports()
+
+    @property
+    def client(self):
+        """The AeroAPI client, only created once something is fetched."""
+        if self._client is None:
+            self._client = AeroAPIClient(self.api_key)
+        return self._client
 
     def get_date_range(self):
         start = self.target_date.replace(hour=0, minute=0, second=0, microsecond=0)
         end = self.target_date.replace(hour=23, minute=59, second=59, microsecond=999999)
         return start.strftime('%Y-%m-%dT%H:%M:%SZ'), end.strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    def fetch_data(self, flight_type):
+    def get_cache(self):
+        if self.cache is None:
+            self.cache = RawPageCache(self.cache_path)
+        return self.cache
+
+    def day_request(self, flight_type):
+        """AeroAPI path and query of one direction for the day, and the hook that keeps its raw pages."""
+        cache = self.get_cache()
+        date = self.target_date.strftime('%Y-%m-%d')
         start_date, end_date = self.get_date_range()
-        url = f"https://aeroapi.flightaware.com/aeroapi/airports/{self.airport_code}/flights/{flight_type}"
+        path = f"/airports/{self.airport_code}/flights/{flight_type}"
         params = {
             "start": start_date,
-            "end": end_date,
-            "max_pages": 1000
+            "end": end_date
         }
         
-        response = requests.get(url, headers=self.headers, params=params)
-        if response.status_code != 200:
-            raise Exception(f"API call failed with status {response.status_code}: {response.text}")
+        def store_page(url, body):
+            cache.put(self.airport_code, flight_type, date, page_cursor(url), body)
         
-        return response.json()
+        return path, params, store_page
 
-    def format_datetime(self, dt_str):
-        if not dt_str:
-            return "N/A"
-        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-        return dt.strftime('%Y-%m-%d %H:%M')
+    def fetch_data(self, flight_type):
+        if self.replay:
+            return self.get_cache().load_day(self.airport_code, flight_type, self.target_date.strftime('%Y-%m-%d'))
+        path, params, store_page = self.day_request(flight_type)
+        # Follows links.next page by page instead of one huge max_pages request
+        return self.client.fetch_all(path, flight_type, params, on_page=store_page)
 
-    def get_time_of_day(self, datetime_str):
-        if datetime_str == "N/A":
-            return "N/A"
-        try:
-            dt = datetime.strptime(datetime_str, '%Y-%m-%d %H:%M')
-            hour = dt.hour
-            
-            if 0 <= hour < 6:
-                return "Early"
-            elif 6 <= hour < 12:
-                return "Morning"
-            elif 12 <= hour < 18:
-                return "Afternoon"
-            else:  # 18 <= hour < 24
-                return "Evening"
-        except:
-            return "N/A"
+    def iter_flights(self, flight_type):
+        """Stream one direction's flights from the API, or from the raw cache when replaying."""
+        if self.replay:
+            return self.get_cache().iter_day_flights(self.airport_code, flight_type,
+                                                     self.target_date.strftime('%Y-%m-%d'))
+        path, params, store_page = self.day_request(flight_type)
+        return self.client.iter_flights(path, flight_type, params, on_page=store_page)
 
-    def calculate_delay(self, scheduled_str, actual_str):
-        if scheduled_str == "N/A" or actual_str == "N/A":
-            return "N/A"
-        try:
-            scheduled = datetime.strptime(scheduled_str, '%Y-%m-%d %H:%M')
-            actual = datetime.strptime(actual_str, '%Y-%m-%d %H:%M')
-            delay = (actual - scheduled).total_seconds() / 60
-            return round(delay)
-        except:
-            return "N/A"
+    def fetch_all_directions(self):
+        """Fetch arrivals and departures concurrently over the shared client."""
+        flight_types = ['arrivals', 'departures']
+        self.get_cache()  # create it once, before the fetch threads share it
+        with ThreadPoolExecutor(max_workers=len(flight_types)) as executor:
+            results = dict(zip(flight_types, executor.map(self.fetch_data, flight_types)))
+        # The cache index is written once per day, not once per page
+        self.cache.flush()
+        return results
 
-    def is_schengen(self, city):
-        """Determine if a city is in the Schengen area"""
-        return self.schengen_lookup.get(city, False)  # Default to False if city not found
-        
-    def extract_date(self, datetime_str):
-        if datetime_str == "N/A":
-            return "N/A"
-        try:
-            dt = datetime.strptime(datetime_str, '%Y-%m-%d %H:%M')
-            return dt.strftime('%Y-%m-%d')
-        except:
-            return "N/A"
+    def process_flights_frame(self, data, flight_type):
+        """Transform one direction's flights in a single vectorized batch."""
+        flights = data.get(flight_type, [])
+        df = transform_flights(flights, flight_type, self.airports)
+        self.count_unknown_airports(df, flight_type)
+        return df
 
-    def get_day_of_week(self, datetime_str):
-        if datetime_str == "N/A":
-            return "N/A"
-        try:
-            dt = datetime.strptime(datetime_str, '%Y-%m-%d %H:%M')
-            return dt.strftime('%A')
-        except:
-            return "N/A"
+    def count_unknown_airports(self, df, flight_type):
+        """Report flights whose other airport is missing from the airport table (they count as non-Schengen)."""
+        unknown = df[airport_column(flight_type)] == UNKNOWN_AIRPORT
+        if unknown.any():
+            self.report.count("unknown_airports", int(unknown.sum()))
+            print(f"Warning: {int(unknown.sum())} {flight_type} to or from airports not in airports.csv: "
+                  f"{', '.join(sorted(df[DIRECTION_FIELDS[flight_type][3]][unknown].astype(str).unique()))}")
 
     def process_flights(self, data, flight_type):
-        processed = []
-        flights = data.get(flight_type, [])
-        
-        for flight in flights:
-            if flight_type == 'arrivals':
-                scheduled = self.format_datetime(flight.get('scheduled_in'))
-                actual = self.format_datetime(flight.get('actual_in'))
-                city = flight.get('origin', {}).get('city', 'N/A')
-                processed.append({
-                    'operator': flight.get('operator', 'N/A'),
-                    'flight_number': flight.get('flight_number', 'N/A'),
-                    'cancelled': flight.get('cancelled', False),
-                    'origin_city': city,
-                    'scheduled_in': scheduled,
-                    'actual_in': actual,
-                    'delay': self.calculate_delay(scheduled, actual),
-                    'date': self.extract_date(scheduled),
-                    'day_of_week': self.get_day_of_week(scheduled),
-                    'time_of_day': self.get_time_of_day(scheduled),
-                    'schengen': self.is_schengen(city)                    
-                })
-            else:  # departures
-                scheduled = self.format_datetime(flight.get('scheduled_off'))
-                actual = self.format_datetime(flight.get('actual_off'))
-                city = flight.get('destination', {}).get('city', 'N/A')
-                processed.append({
-                    'operator': flight.get('operator', 'N/A'),
-                    'flight_number': flight.get('flight_number', 'N/A'),
-                    'cancelled': flight.get('cancelled', False),
-                    'destination_city': city,
-                    'scheduled_off': scheduled,
-                    'actual_off': actual,
-                    'delay': self.calculate_delay(scheduled, actual),
-                    'date': self.extract_date(scheduled),
-                    'day_of_week': self.get_day_of_week(scheduled),
-                    'time_of_day': self.get_time_of_day(scheduled),
-                    'schengen': self.is_schengen(city)
-                })
-        
-        return processed
+        return csv_records(self.process_flights_frame(data, flight_type), flight_type)
 
     def save_json(self, data, filename):
         dated_filename = f"{self.date_str}_{filename}"
@@ -192,8 +133,126 @@ class FlightDataProcessor:
             writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
             writer.writeheader()
             writer.writerows(data)
+        self.report.count("bytes_written", os.path.getsize(filepath), stage="csv_write")
         return filepath
 
+    def save_archive(self, df, flight_type):
+        if df.empty:
+            return None
+        archive = FlightArchive(self.archive_path)
+        return archive.write_day(flight_type, self.target_date.strftime('%Y-%m-%d'), df)
+
+    def save_incomplete(self, entries, flight_type):
+        """Record the day's flights that have no actual time yet, for repair.py to re-fetch."""
+        index = IncompleteFlightIndex(self.incomplete_path)
+        index.replace_day(flight_type, self.target_date.strftime('%Y-%m-%d'), entries)
+        self.report.count("incomplete_flights", len(entries))
+
+    def transform_direction(self, raw_data, flight_type):
+        """Transform one fetched direction and count its rows."""
+        with self.report.stage("transform"):
+            processed_df = self.process_flights_frame(raw_data, flight_type)
+        self.report.count(f"{flight_type}_rows", len(processed_df))
+        return processed_df
+
+    def write_direction(self, raw_data, processed_df, flight_type):
+        """
+        Write one transformed direction to its daily CSV, the archive and the
+        incomplete-flight index.
+        
+        Returns:
+            tuple: Paths of the CSV file and the archive partition
+        """
+        with self.report.stage("csv_write"):
+            csv_path = self.save_csv(csv_records(processed_df, flight_type), f"{flight_type}.csv")
+        with self.report.stage("archive_write"):
+            archive_path = self.save_archive(processed_df, flight_type)
+            self.save_incomplete(incomplete_flights(raw_data.get(flight_type, []), processed_df, flight_type),
+                                 flight_type)
+        return csv_path, archive_path
+
+    def process_fetched(self, raw_by_type):
+        """
+        Transform already fetched arrivals and departures and write their
+        daily CSVs and archive partitions, without the intermediate JSON files.
+        
+        Returns:
+            dict: Number of processed flights per direction
+        """
+        rows = {}
+        for flight_type in ['arrivals', 'departures']:
+            processed_df = self.transform_direction(raw_by_type[flight_type], flight_type)
+            self.write_direction(raw_by_type[flight_type], processed_df, flight_type)
+            rows[flight_type] = len(processed_df)
+        return rows
+
+    def process_streaming(self, flight_type, batch_size=STREAM_BATCH_SIZE):
+        """
+        Fetch, transform and write one direction batch by batch.
+        
+        Flights are parsed one at a time off the response stream, transformed
+        in batches of `batch_size` and appended to the daily CSV and the archive
+        partition, so memory use does not grow with the number of flights.
+        Both outputs are only moved into place once the whole day succeeded.
+        """
+        archive = FlightArchive(self.archive_path)
+        csv_path = os.path.join(self.output_path, f"{self.date_str}_{flight_type}.csv")
+        tmp_csv_path = csv_path + ".tmp"
+        flights = self.iter_flights(flight_type)
+        report = self.report
+        rows = 0
+        incomplete = {}
+        
+        try:
+            with archive.day_writer(flight_type, self.target_date.strftime('%Y-%m-%d')) as archive_writer:
+                with open(tmp_csv_path, 'w', newline='') as csv_file:
+                    writer = csv.writer(csv_file)
+                    while True:
+                        # Download and incremental JSON decoding happen as the batch is pulled
+                        with report.stage("fetch_decode"):
+                            batch = list(islice(flights, batch_size))
+                        if not batch:
+                            break
+                        with report.stage("transform"):
+                            df = transform_flights(batch, flight_type, self.airports)
+                            self.count_unknown_airports(df, flight_type)
+                        with report.stage("csv_write"):
+                            columns = output_columns(flight_type)
+                            if rows == 0:
+                                writer.writerow(columns)
+                            writer.writerows(zip(*(df[col].tolist() for col in columns)))
+                        with report.stage("archive_write"):
+                            archive_writer.write(df)
+                            incomplete.update(incomplete_flights(batch, df, flight_type))
+                        rows += len(df)
+        except BaseException:
+            # A failed day leaves no partial CSV behind; the archive writer discards its own part
+            if os.path.exists(tmp_csv_path):
+                os.remove(tmp_csv_path)
+            raise
+        
+        if rows == 0:
+            os.remove(tmp_csv_path)
+            return None
+        os.replace(tmp_csv_path, csv_path)
+        self.save_incomplete(incomplete, flight_type)
+        report.count(f"{flight_type}_rows", rows)
+        report.count("bytes_written", os.path.getsize(csv_path), stage="csv_write")
+        print(f"Streamed {rows} {flight_type} to {csv_path} and {archive_writer.path}")
+        return csv_path
+
+    def process_all_streaming(self):
+        """Stream arrivals and departures concurrently instead of loading whole days."""
+        print(f"Files will be saved to: {self.output_path}")
+        flight_types = ['arrivals', 'departures']
+        self.get_cache()  # create it once, before the worker threads share it
+        api_before = self.client.stats()
+        with ThreadPoolExecutor(max_workers=len(flight_types)) as executor:
+            results = dict(zip(flight_types, executor.map(self.process_streaming, flight_types)))
+        self.cache.flush()
+        self.report.count_api(api_before, self.client.stats())
+        return results
+
     def cleanup_json_files(self, files):
         for file in files:
             try:
@@ -206,26 +265,37 @@ class FlightDataProcessor:
         print(f"Files will be saved to: {self.output_path}")
         json_files_to_cleanup = []
         
+        report = self.report
+        
+        print("\nFetching arrivals and departures data...")
+        api_before = self.client.stats()
+        with report.stage("fetch"):
+            raw_by_type = self.fetch_all_directions()
+        report.count_api(api_before, self.client.stats())
+        
         for flight_type in ['arrivals', 'departures']:
-            print(f"\nFetching {flight_type} data...")
-            raw_data = self.fetch_data(flight_type)
-            
-            print(f"Processing {flight_type} data...")
-            processed_data = self.process_flights(raw_data, flight_type)
+            raw_data = raw_by_type[flight_type]
             
-            raw_json_path = self.save_json(raw_data, f"{flight_type}.json")
-            json_files_to_cleanup.append(raw_json_path)
-            print(f"Saved raw {flight_type} data to {raw_json_path}")
+            print(f"\nProcessing {flight_type} data...")
+            processed_df = self.transform_direction(raw_data, flight_type)
             
-            processed_json_path = self.save_json(processed_data, f"{flight_type}_processed.json")
-            json_files_to_cleanup.append(processed_json_path)
-            print(f"Saved processed {flight_type} data to {processed_json_path}")
+            with report.stage("json_write"):
+                raw_json_path = self.save_json(raw_data, f"{flight_type}.json")
+                json_files_to_cleanup.append(raw_json_path)
+                print(f"Saved raw {flight_type} data to {raw_json_path}")
+                
+                processed_json_path = self.save_json(csv_records(processed_df, flight_type),
+                                                     f"{flight_type}_processed.json")
+                json_files_to_cleanup.append(processed_json_path)
+                print(f"Saved processed {flight_type} data to {processed_json_path}")
             
-            csv_path = self.save_csv(processed_data, f"{flight_type}.csv")
+            csv_path, archive_path = self.write_direction(raw_data, processed_df, flight_type)
             print(f"Saved {flight_type} CSV to {csv_path}")
+            print(f"Archived {flight_type} to {archive_path}")
         
         print("\nCleaning up temporary JSON files...")
-        self.cleanup_json_files(json_files_to_cleanup)
+        with report.stage("cleanup"):
+            self.cleanup_json_files(json_files_to_cleanup)
 
 def validate_date(date_str):
     try:
@@ -239,19 +309,89 @@ def main():
     API_KEY = "123"
     AIRPORT_CODE = "LPPT"
     
-    # Get date input from user
-    while True:
-        date_input = input("Enter the date (YYYY-MM-DD format): ")
-        if validate_date(date_input):
-            break
-        print("Invalid date format. Please use YYYY-MM-DD format.")
+    parser = argparse.ArgumentParser(
+        description="Fetch and process flight data. With no dates, every missing or incomplete "
+                    "day in AeroAPI's 10-day window is backfilled unattended.")
+    parser.add_argument('--date', nargs='+', metavar='YYYY-MM-DD',
+                        help="Fetch and process these days, whether or not they are already archived")
+    parser.add_argument('--workers', type=int, default=3,
+                        help="Days backfilled at once")
+    parser.add_argument('--replay', nargs='*', metavar='YYYY-MM-DD',
+                        help="Reprocess days from the raw page cache without calling the API "
+                             "(all cached days when no date is given)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Parse and write flights incrementally so memory stays flat on busy days")
+    parser.add_argument('--partials-dir', default=DEFAULT_PARTIALS_DIR,
+                        help="Partials store of metrics.py --incremental that repairs after a backfill refresh")
+    add_report_arguments(parser)
+    args = parser.parse_args()
     
-    try:
-        processor = FlightDataProcessor(API_KEY, AIRPORT_CODE, date_input)
-        processor.process_all()
-        print("\nProcessing completed successfully!")
-    except Exception as e:
-        print(f"An error occurred: {str(e)}")
+    output_path = os.path.expanduser("~/Documents")
+    report = RunReport.from_args("process", args)
+    
+    if args.replay is not None:
+        cache = RawPageCache(os.path.join(output_path, "raw-cache"))
+        replay_dates = args.replay
+        if not replay_dates:
+            replay_dates = sorted(set(cache.dates(AIRPORT_CODE, 'arrivals')) &
+                                  set(cache.dates(AIRPORT_CODE, 'departures')))
+        report.start()
+        for date_input in replay_dates:
+            if not validate_date(date_input):
+                print(f"Skipping invalid date {date_input}. Please use YYYY-MM-DD format.")
+                continue
+            try:
+                print(f"\nReplaying {date_input} from the raw cache...")
+                processor = FlightDataProcessor(API_KEY, AIRPORT_CODE, date_input, cache=cache, replay=True,
+                                                report=report)
+                if args.stream:
+                    processor.process_all_streaming()
+                else:
+                    processor.process_all()
+                report.count("days")
+            except Exception as e:
+                report.count("failed_days")
+                print(f"An error occurred: {str(e)}")
+        print(f"Run report saved to {report.save(output_path)}")
+        return
+    
+    if not args.date:
+        from backfill import run_backfill
+        
+        report.start()
+        result = run_backfill(API_KEY, AIRPORT_CODE, output_path, max_workers=args.workers, report=report)
+        if not result["gaps"] and not result["done"]:
+            print("\nNothing to backfill, every available day is archived.")
+        elif result["failed"]:
+            print(f"\nBackfill finished with failures: {', '.join(sorted(result['failed']))}")
+        elif result["incomplete"]:
+            print(f"\nBackfill left day(s) still incomplete: {', '.join(sorted(result['incomplete']))}")
+        else:
+            print(f"\nBackfilled {len(result['done'])} day(s) successfully!")
+        
+        # Days that were complete enough to keep may still have a few flights without an actual time
+        repaired = repair_incomplete(API_KEY, output_path, partials_path=args.partials_dir, report=report)
+        print(f"Repaired {repaired['repaired']} of {repaired['checked']} incomplete flight(s)")
+        print(f"Run report saved to {report.save(output_path)}")
+        return
+    
+    report.start()
+    for date_input in args.date:
+        if not validate_date(date_input):
+            print(f"Skipping invalid date {date_input}. Please use YYYY-MM-DD format.")
+            continue
+        try:
+            processor = FlightDataProcessor(API_KEY, AIRPORT_CODE, date_input, report=report)
+            if args.stream:
+                processor.process_all_streaming()
+            else:
+                processor.process_all()
+            report.count("days")
+            print("\nProcessing completed successfully!")
+        except Exception as e:
+            report.count("failed_days")
+            print(f"An error occurred: {str(e)}")
+    print(f"Run report saved to {report.save(output_path)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
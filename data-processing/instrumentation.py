@@ -0,0 +1,225 @@
+import cProfile
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+HISTORY_FILE = "run-history.jsonl"
+TOP_ALLOCATIONS = 10
+
+
+def process_peak_rss_mb():
+    """Peak resident set size of the whole process so far, in MB (it never goes down)."""
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round((max_rss if sys.platform == 'darwin' else max_rss * 1024) / 1024 ** 2, 1)
+
+
+def process_rss_mb():
+    """Current resident set size of the process in MB, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(resident_pages * resource.getpagesize() / 1024 ** 2, 1)
+
+
+def add_report_arguments(parser):
+    """Add the --profile and --trace-memory options every pipeline script takes for its run report."""
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile the run with cProfile and save the stats next to the run report")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Record per-stage traced memory peaks and top allocation sites (slower)")
+
+
+class RunReport:
+    """
+    Stage timers and counters for one pipeline run, saved as a JSON report.
+
+    Wrap each stage in `with report.stage('name'):` and record sizes with
+    `report.count(...)`. A stage entered more than once (per direction, per
+    batch) accumulates its time and call count. Safe to use from several
+    threads at once; concurrent stages each get their own wall time.
+
+    Every stage records process_peak_rss_mb_so_far, the process-wide RSS
+    high-water mark when it last ended: it shows which stage first pushed
+    the peak up, not how much each stage used. Where /proc is available
+    (Linux) each stage also records how the current RSS changed across it:
+    rss_change_mb summed over its calls (memory it kept) and
+    rss_max_growth_mb, the largest growth of a single call. Memory a stage
+    allocated and freed again before it ended does not show up there, and
+    concurrent stages see each other's allocations.
+
+    With `profile=True` the whole run is profiled with cProfile and the
+    stats are written next to the report. With `trace_memory=True`
+    tracemalloc records each stage's traced peak and, at the end of the
+    call that held the most memory, the stage's top allocation sites, at a
+    noticeable cost in speed. tracemalloc has one process-wide peak, which
+    every stage resets on entry, so traced peaks are only meaningful for
+    stages that run one at a time; with concurrent or nested stages a
+    peak can belong to another stage, or be cut short by one starting.
+
+    Usage:
+        with RunReport('metrics') as report:
+            with report.stage('load'):
+                ...
+            report.count('rows', len(df), stage='load')
+        report.save(output_dir)
+    """
+
+    def __init__(self, name, profile=False, trace_memory=False):
+        self.name = name
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.counters = {}
+        self.started = None
+        self.finished = None
+        self._start_time = None
+        self._seconds = None
+        self._profiler = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, name, args):
+        """A report configured by the options add_report_arguments added."""
+        return cls(name, profile=args.profile, trace_memory=args.trace_memory)
+
+    def start(self):
+        self.started = datetime.now(timezone.utc).isoformat()
+        self._start_time = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def finish(self):
+        if self._start_time is None or self.finished is not None:
+            return self
+        if self._profiler:
+            self._profiler.disable()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._seconds = time.perf_counter() - self._start_time
+        self.finished = datetime.now(timezone.utc).isoformat()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.finish()
+
+    def _stage_entry(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time one stage; nested and concurrent stages are each timed in full.
+
+        Entering a stage resets tracemalloc's global peak, so traced peaks
+        only hold for stages that do not overlap (see the class docstring).
+        """
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        rss_before = process_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            rss_after = process_rss_mb()
+            rss_change = None
+            if rss_before is not None and rss_after is not None:
+                rss_change = round(rss_after - rss_before, 1)
+            self.record(name, time.perf_counter() - start, rss_change)
+
+    def record(self, name, seconds, rss_change_mb=None):
+        """Add one call of a stage timed elsewhere, e.g. in a worker process."""
+        with self._lock:
+            entry = self._stage_entry(name)
+            entry["seconds"] += seconds
+            entry["calls"] += 1
+            if rss_change_mb is not None:
+                entry["rss_change_mb"] = round(entry.get("rss_change_mb", 0) + rss_change_mb, 1)
+                entry["rss_max_growth_mb"] = max(entry.get("rss_max_growth_mb", 0), rss_change_mb)
+            # The process high-water mark when this stage last ended, not the stage's own use
+            entry["process_peak_rss_mb_so_far"] = process_peak_rss_mb()
+            if self.trace_memory and tracemalloc.is_tracing():
+                self._trace_stage(entry)
+
+    def _trace_stage(self, entry):
+        current, peak = tracemalloc.get_traced_memory()
+        entry["traced_peak_mb"] = max(entry.get("traced_peak_mb", 0), round(peak / 1024 ** 2, 2))
+        # Snapshots are slow, so only take one when this call holds more than any before it
+        if current > entry.get("_traced_current", -1):
+            entry["_traced_current"] = current
+            stats = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+            entry["top_allocations"] = [
+                {"site": str(stat.traceback), "mb": round(stat.size / 1024 ** 2, 2), "blocks": stat.count}
+                for stat in stats
+            ]
+
+    def count(self, key, value=1, stage=None):
+        """Add `value` to a run-wide counter, or to a counter on `stage`."""
+        with self._lock:
+            counters = self._stage_entry(stage) if stage else self.counters
+            counters[key] = counters.get(key, 0) + value
+
+    def count_api(self, before, after):
+        """Record the API client activity between two `AeroAPIClient.stats()` snapshots."""
+        for key, value in after.items():
+            self.count(f"api_{key}", value - before.get(key, 0))
+
+    def to_dict(self):
+        with self._lock:
+            stages = {
+                name: {**{key: value for key, value in entry.items() if not key.startswith("_")},
+                       "seconds": round(entry["seconds"], 4)}
+                for name, entry in self.stages.items()
+            }
+            counters = {key: round(value, 4) if isinstance(value, float) else value
+                        for key, value in self.counters.items()}
+        report = {
+            "run": self.name,
+            "started": self.started,
+            "finished": self.finished,
+            "seconds": round(self._seconds, 4) if self._seconds is not None else None,
+            "process_peak_rss_mb": process_peak_rss_mb(),
+            "python": platform.python_version(),
+            "stages": stages,
+            "counters": counters
+        }
+        return report
+
+    def save(self, directory):
+        """
+        Write `{name}-report.json` into `directory` and append the same
+        report as one line to run-history.jsonl there, so cost can be tracked
+        across runs.
+
+        Returns:
+            str: Path of the report file
+        """
+        self.finish()
+        os.makedirs(directory or '.', exist_ok=True)
+        report = self.to_dict()
+        if self._profiler:
+            profile_path = os.path.join(directory, f"{self.name}-profile.prof")
+            self._profiler.dump_stats(profile_path)
+            report["profile"] = profile_path
+        path = os.path.join(directory, f"{self.name}-report.json")
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        with open(os.path.join(directory, HISTORY_FILE), 'a') as f:
+            f.write(json.dumps(report) + "\n")
+        return path
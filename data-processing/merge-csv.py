@@ -1,9 +1,20 @@
 import pandas as pd
+import argparse
 import glob
+import hashlib
+import io
+import json
 import os
 from datetime import datetime
 
-def merge_csv_files(data_dir, file_pattern, output_filename):
+from instrumentation import RunReport, add_report_arguments
+
+SCHEDULED_COLUMNS = ['scheduled_in', 'scheduled_off']
+# Bumped whenever merged rows are written differently; an older output is rebuilt once
+MANIFEST_FORMAT_KEY = '_format'
+MANIFEST_FORMAT = 2
+
+def merge_csv_files(data_dir, file_pattern, output_filename, report=None):
     """
     Merge all CSV files matching the given pattern into a single CSV file.
     
@@ -11,7 +22,12 @@ def merge_csv_files(data_dir, file_pattern, output_filename):
         data_dir (str): Directory containing the CSV files
         file_pattern (str): Pattern to match CSV files (e.g., '*_arrivals.csv')
         output_filename (str): Name of the output merged CSV file
+        report (RunReport): Records stage timings and row/byte counts
+    
+    Returns:
+        list: Files that could not be read and were left out
     """
+    report = report or RunReport("merge")
     # Get list of all matching CSV files
     search_pattern = os.path.join(data_dir, file_pattern)
     all_files = glob.glob(search_pattern)
@@ -24,44 +40,299 @@ def merge_csv_files(data_dir, file_pattern, output_filename):
     
     # Create empty list to store individual dataframes
     dfs = []
+    failed_files = []
     
     # Read each CSV file
     for filename in all_files:
         try:
-            # Extract date from filename (assuming format YYYYMMDD)
-            date_str = os.path.basename(filename).split('_')[0][-8:]
-            df = pd.read_csv(filename)
-            
-            # Add source filename and date columns
-            df['source_file'] = os.path.basename(filename)
-            df['date'] = datetime.strptime(date_str, '%Y%m%d').strftime('%Y-%m-%d')
+            with report.stage("read"):
+                df = read_daily_csv(filename)
             
             dfs.append(df)
+            report.count("files", stage="read")
+            report.count("rows", len(df), stage="read")
+            report.count("bytes_read", os.path.getsize(filename), stage="read")
             print(f"Successfully processed: {filename}")
             
         except Exception as e:
+            report.count("failed_files", stage="read")
+            failed_files.append(filename)
             print(f"Error processing {filename}: {str(e)}")
     
     # Concatenate all dataframes
     if dfs:
-        merged_df = pd.concat(dfs, ignore_index=True)
+        with report.stage("concat"):
+            merged_df = normalise_types(pd.concat(dfs, ignore_index=True))
         
-        # Sort by date and any existing timestamp column if present
-        sort_columns = ['date']
-        time_columns = [col for col in merged_df.columns if 'time' in col.lower()]
-        if time_columns:
-            sort_columns.extend(time_columns)
+        with report.stage("dedupe"):
+            # A re-fetched day can show up under more than one file; rows are still in file
+            # order here, so keep='last' keeps the copy from the latest file
+            key_columns = flight_key_columns(merged_df.columns)
+            if key_columns:
+                duplicated = merged_df.duplicated(subset=key_columns, keep='last') & merged_df[key_columns[-1]].notna()
+                merged_df = merged_df[~duplicated]
         
-        merged_df.sort_values(by=sort_columns, inplace=True)
+        with report.stage("sort"):
+            merged_df = merged_df.sort_values(by=merge_sort_columns(merged_df.columns), kind='stable')
         
         # Save to CSV
-        merged_df.to_csv(output_filename, index=False)
+        with report.stage("write"):
+            merged_df.to_csv(output_filename, index=False)
+        report.count("rows", len(merged_df), stage="write")
+        report.count("bytes_written", os.path.getsize(output_filename), stage="write")
         print(f"\nSuccessfully created: {output_filename}")
         print(f"Total rows: {len(merged_df)}")
     else:
         print("No data to merge!")
+    return failed_files
+
+def merge_sort_columns(columns):
+    """Merged rows are ordered by date, then any timestamp column, then the file they came from."""
+    return ['date'] + [col for col in columns if 'time' in col.lower()] + ['source_file']
+
+def normalise_types(df):
+    """
+    Give every column a type whose CSV text depends only on the value itself.
+    
+    pandas reads an integer column with any missing cell as float, which
+    would write 12 as "12.0" in one merge and "12" in another depending on
+    which files took part. Whole-number float columns become nullable
+    integers instead, so a value is always written the same way.
+    """
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_float_dtype(values.dtype):
+            present = values.dropna()
+            if (present == present.round()).all():
+                df[col] = values.astype('Int64')
+    return df
+
+def flight_key_columns(columns):
+    """Natural flight key: operator, flight number and scheduled time (flight numbers repeat across carriers)."""
+    scheduled = [col for col in SCHEDULED_COLUMNS if col in columns]
+    if not scheduled or 'flight_number' not in columns:
+        return []
+    return ['operator', 'flight_number', scheduled[0]] if 'operator' in columns else ['flight_number', scheduled[0]]
+
+def file_fingerprint(path, previous=None):
+    """
+    Size, mtime and SHA-256 of a file. The hash is reused from `previous` when
+    size and mtime are unchanged, so unchanged files are never re-read.
+    """
+    stat = os.stat(path)
+    if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+        return dict(previous)
+    
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha256.hexdigest()}
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def read_daily_csv(filename):
+    """Read one daily CSV with inferred types, tagged with its source file and file-name date."""
+    # Extract date from filename (assuming format YYYYMMDD)
+    date_str = os.path.basename(filename).split('_')[0][-8:]
+    df = pd.read_csv(filename)
+    
+    # Add source filename and date columns
+    df['source_file'] = os.path.basename(filename)
+    df['date'] = datetime.strptime(date_str, '%Y%m%d').strftime('%Y-%m-%d')
+    return df
+
+def as_merged_text(df):
+    """Rows exactly as a full merge writes them, read back as text like the streamed output."""
+    return pd.read_csv(io.StringIO(normalise_types(df).to_csv(index=False)), dtype=str, keep_default_na=False)
+
+def sort_text_rows(df, sort_columns):
+    """Sort text rows the way a full merge sorts typed ones: stable, empty cells last."""
+    return df.sort_values(by=sort_columns, kind='stable', key=lambda values: values.where(values != ''))
+
+def flight_keys(df, key_columns):
+    """Natural-key strings for rows with a known scheduled time (NaN elsewhere)."""
+    # Daily files spell missing values "N/A", a full merge writes them back empty
+    parts = [df[col].astype(str).replace('N/A', '') for col in key_columns]
+    keys = parts[0]
+    for part in parts[1:]:
+        keys = keys + '\x1f' + part
+    scheduled = df[key_columns[-1]]
+    return keys.where((scheduled != '') & (scheduled != 'N/A'))
+
+def merge_csv_files_incremental(data_dir, file_pattern, output_filename, manifest_path=None, chunksize=100000,
+                                report=None):
+    """
+    Merge only new or changed CSV files into an existing merged CSV.
+    
+    A manifest next to the output records each ingested file's path, size,
+    mtime and content hash. Unchanged files are skipped without being read.
+    Rows from changed files replace the rows previously ingested from them,
+    and any existing row with the same natural flight key (operator, flight
+    number, scheduled time) is replaced too, so re-fetching a day never
+    double-counts flights. The existing output is streamed in chunks and the
+    new rows are spliced in by date, so memory stays bounded by the chunk
+    size plus the changed files.
+    
+    Existing rows are copied as text, so they are written back byte for
+    byte, and new rows go through the same type round trip and ordering as
+    merge_csv_files, so the result matches a full rebuild. Falls back to a
+    full merge_csv_files rebuild when there is no output yet, it was written
+    by an older version, a previously ingested file was deleted or the
+    column layout changed.
+    
+    Args:
+        data_dir (str): Directory containing the CSV files
+        file_pattern (str): Pattern to match CSV files (e.g., '*_arrivals.csv')
+        output_filename (str): Name of the output merged CSV file
+        manifest_path (str): Manifest location (defaults to <output>.manifest.json)
+        chunksize (int): Rows per chunk when streaming the existing output
+        report (RunReport): Records stage timings and row/byte counts
+    """
+    report = report or RunReport("merge")
+    manifest_path = manifest_path or output_filename + '.manifest.json'
+    manifest = load_manifest(manifest_path)
+    
+    all_files = sorted(glob.glob(os.path.join(data_dir, file_pattern)))
+    if not all_files:
+        raise ValueError(f"No CSV files found matching pattern: {os.path.join(data_dir, file_pattern)}")
+    
+    fingerprints = {}
+    changed_files = []
+    with report.stage("fingerprint"):
+        for filename in all_files:
+            name = os.path.basename(filename)
+            previous = manifest.get(name)
+            fingerprints[name] = file_fingerprint(filename, previous)
+            if not previous or previous['sha256'] != fingerprints[name]['sha256']:
+                changed_files.append(filename)
+    report.count("files", len(all_files), stage="fingerprint")
+    report.count("changed_files", len(changed_files), stage="fingerprint")
+    
+    def rebuild():
+        failed_files = merge_csv_files(data_dir, file_pattern, output_filename, report)
+        # Files that failed to read stay out of the manifest so the next run retries them
+        for filename in failed_files:
+            fingerprints.pop(os.path.basename(filename), None)
+        save_manifest({MANIFEST_FORMAT_KEY: MANIFEST_FORMAT, **fingerprints}, manifest_path)
+    
+    if not os.path.exists(output_filename):
+        rebuild()
+        return
+    if manifest.get(MANIFEST_FORMAT_KEY) != MANIFEST_FORMAT:
+        print("Merged output was written by an older version, rebuilding from scratch")
+        rebuild()
+        return
+    removed = sorted(set(manifest) - {MANIFEST_FORMAT_KEY} - set(fingerprints))
+    if removed:
+        # Their rows are still in the output; only a rebuild drops them (and their manifest entries)
+        print(f"{len(removed)} ingested file(s) no longer exist ({', '.join(removed)}), rebuilding from scratch")
+        report.count("removed_files", len(removed), stage="fingerprint")
+        rebuild()
+        return
+    
+    if not changed_files:
+        save_manifest({**manifest, **fingerprints}, manifest_path)
+        print(f"{output_filename} is up to date")
+        return
+    
+    new_dfs = []
+    for filename in list(changed_files):
+        try:
+            with report.stage("read"):
+                new_dfs.append(read_daily_csv(filename))
+            report.count("rows", len(new_dfs[-1]), stage="read")
+            report.count("bytes_read", os.path.getsize(filename), stage="read")
+            print(f"Successfully processed: {filename}")
+        except Exception as e:
+            # Leave it out of the manifest so the next run retries it
+            report.count("failed_files", stage="read")
+            print(f"Error processing {filename}: {str(e)}")
+            changed_files.remove(filename)
+            del fingerprints[os.path.basename(filename)]
+    if not new_dfs:
+        print("No data to merge!")
+        return
+    # Same type round trip as a full merge, so spliced rows are formatted like the rest
+    new_df = as_merged_text(pd.concat(new_dfs, ignore_index=True))
+    header = list(pd.read_csv(output_filename, nrows=0).columns)
+    if set(new_df.columns) != set(header):
+        print("Column layout changed, rebuilding from scratch")
+        rebuild()
+        return
+    new_df = new_df[header]
+    
+    sort_columns = merge_sort_columns(header)
+    key_columns = flight_key_columns(header)
+    if key_columns:
+        duplicated = new_df.duplicated(subset=key_columns, keep='last') & (new_df[key_columns[-1]] != '')
+        new_df = new_df[~duplicated]
+        new_keys = set(flight_keys(new_df, key_columns).dropna())
+    else:
+        new_keys = set()
+    replaced_sources = {os.path.basename(filename) for filename in changed_files}
+    pending = sort_text_rows(new_df, sort_columns)
+    
+    tmp_path = output_filename + '.tmp'
+    total_rows = 0
+    write_header = True
+    # Rows of the last date in a chunk wait for the next chunk, which may hold more of that date
+    carry = pending.iloc[:0]
+    report.count("bytes_read", os.path.getsize(output_filename), stage="splice")
+    with report.stage("splice"), open(tmp_path, 'w', newline='') as out:
+        for chunk in pd.read_csv(output_filename, dtype=str, keep_default_na=False, chunksize=chunksize):
+            keep = ~chunk['source_file'].isin(replaced_sources)
+            if key_columns and new_keys:
+                keep &= ~flight_keys(chunk, key_columns).isin(new_keys)
+            chunk = pd.concat([carry, chunk[keep]])
+            if chunk.empty:
+                continue
+            
+            # Splice in new rows dated before the last date seen so far
+            chunk_end = chunk['date'].max()
+            carry = chunk[chunk['date'] == chunk_end]
+            chunk = chunk[chunk['date'] < chunk_end]
+            ready = pending[pending['date'] < chunk_end]
+            pending = pending[pending['date'] >= chunk_end]
+            chunk = sort_text_rows(pd.concat([chunk, ready]), sort_columns)
+            if chunk.empty:
+                continue
+            
+            chunk.to_csv(out, index=False, header=write_header)
+            write_header = False
+            total_rows += len(chunk)
+        
+        rest = sort_text_rows(pd.concat([carry, pending]), sort_columns)
+        if not rest.empty or write_header:
+            rest.to_csv(out, index=False, header=write_header)
+            total_rows += len(rest)
+    
+    os.replace(tmp_path, output_filename)
+    save_manifest({**manifest, **fingerprints}, manifest_path)
+    report.count("rows", total_rows, stage="splice")
+    report.count("bytes_written", os.path.getsize(output_filename), stage="splice")
+    print(f"\nSuccessfully updated: {output_filename} ({len(changed_files)} new or changed files)")
+    print(f"Total rows: {total_rows}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Merge daily flight CSVs")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only ingest new or changed daily files, tracked in a manifest")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    merge = merge_csv_files_incremental if args.incremental else merge_csv_files
+    report = RunReport.from_args("merge", args).start()
+    
     # Define directory paths
     data_dir = "Flight-Data-Daily"  # Directory containing the CSV files
     output_dir = 'merged_data'      # Directory for output files
@@ -75,21 +346,26 @@ def main():
             raise ValueError(f"Data directory not found: {data_dir}")
         
         # Merge arrivals
-        merge_csv_files(
+        merge(
             data_dir,
             '*_arrivals.csv', 
-            os.path.join(output_dir, 'merged_arrivals.csv')
+            os.path.join(output_dir, 'merged_arrivals.csv'),
+            report=report
         )
         
         # Merge departures
-        merge_csv_files(
+        merge(
             data_dir,
             '*_departures.csv', 
-            os.path.join(output_dir, 'merged_departures.csv')
+            os.path.join(output_dir, 'merged_departures.csv'),
+            report=report
         )
         
     except Exception as e:
+        report.count("errors")
         print(f"Error: {str(e)}")
+    
+    print(f"Run report saved to {report.save(output_dir)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
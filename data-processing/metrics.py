@@ -1,149 +1,462 @@
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import json
+import os
 
-def analyze_flight_data(arrivals_df, departures_df):
+DELAY_BUCKETS = ['onTime', 'minor', 'medium', 'major']
+TIME_PERIODS = ['Early', 'Morning', 'Afternoon', 'Evening']
+PARTIAL_KEYS = ['date', 'time_of_day', 'schengen']
+PARTIAL_COUNTS = ['rows', 'valid', 'delay_sum'] + DELAY_BUCKETS
+SKETCH_COLUMNS = PARTIAL_KEYS + ['delay', 'count']
+PERCENTILES = [50, 90, 99]
+# Trailing windows ending on the latest day with data (None covers everything)
+PERCENTILE_WINDOWS = {'last7Days': 7, 'last30Days': 30, 'last90Days': 90, 'allTime': None}
+DEFAULT_AIRPORT = 'LIS'
+DEFAULT_TIMEZONE = 'Europe/Lisbon'
+
+def round_breakdown(counts):
+    """
+    Turn delay-bucket counts into whole percentages that add up to 100.
+    
+    Parameters:
+    counts (sequence): Flight counts for onTime, minor, medium and major delays
+    
+    Returns:
+    dict: Percentages keyed by bucket name
+    """
+    total_valid = sum(counts)
+    if total_valid == 0:
+        return {"onTime": 0, "minor": 0, "medium": 0, "major": 0}
+    
+    # Use numpy.round and ensure sum equals 100
+    percentages = np.array([count / total_valid * 100 for count in counts])
+    rounded = np.round(percentages)
+    
+    # Adjust to ensure sum is 100
+    diff = 100 - rounded.sum()
+    if diff != 0:
+        # Add the difference to the largest category to maintain proportions
+        max_idx = np.argmax(percentages)
+        rounded[max_idx] += diff
+    
+    return {bucket: int(value) for bucket, value in zip(DELAY_BUCKETS, rounded)}
+
+def round_breakdowns(counts):
+    """
+    round_breakdown for many rows of delay-bucket counts at once.
+    
+    Parameters:
+    counts (array-like): One row of onTime, minor, medium and major counts per item
+    
+    Returns:
+    np.ndarray: Whole percentages per row (all zero for rows without flights)
+    """
+    counts = np.asarray(counts, dtype=float).reshape(-1, len(DELAY_BUCKETS))
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentages = np.where(totals > 0, counts / totals * 100, 0.0)
+    rounded = np.round(percentages)
+    diff = np.where(totals[:, 0] > 0, 100 - rounded.sum(axis=1), 0)
+    rounded[np.arange(len(rounded)), np.argmax(percentages, axis=1)] += diff
+    return rounded.astype(np.int64)
+
+def bucket_delays(delay):
+    """Bucket index (0-3, in DELAY_BUCKETS order) for each delay; -1 where delay is missing."""
+    delay = np.asarray(delay, dtype=float)
+    # <5 on time, 5-30 minor, 30-60 medium (upper bounds inclusive), >60 major
+    buckets = (delay >= 5).astype(np.int64) + (delay > 30) + (delay > 60)
+    return np.where(np.isnan(delay), -1, buckets)
+
+def compute_cells(df, keys, scheduled_col, actual_col):
+    """
+    Collapse flight rows into mergeable aggregate cells, one per combination of `keys`.
+    
+    Each row of the result holds the number of rows, the number of valid
+    flights (scheduled and actual present), the sum of their delays and
+    their delay-bucket counts. Cells can be concatenated and summed without
+    touching the raw rows again.
+    
+    The rows are scanned once: each is given a cell index and every count
+    comes out of a single np.bincount over those indices. Only combinations
+    that occur get a cell, so wide keys stay cheap.
+    
+    Parameters:
+    df (pd.DataFrame): Flight rows for one direction
+    keys (list): Columns to group by
+    scheduled_col (str): Scheduled timestamp column
+    actual_col (str): Actual timestamp column
+    
+    Returns:
+    pd.DataFrame: Columns keys + PARTIAL_COUNTS, sorted by keys
+    """
+    valid = (df[scheduled_col].notna() & df[actual_col].notna()).to_numpy()
+    buckets = bucket_delays(df['delay'])
+    delay = np.where(valid, np.asarray(df['delay'], dtype=float), 0.0)
+    
+    # Sorted codes per key (missing values get their own code, sorted last)
+    codes, uniques = [], []
+    for key in keys:
+        key_codes, key_uniques = pd.factorize(df[key], sort=True, use_na_sentinel=False)
+        codes.append(key_codes)
+        uniques.append(np.asarray(key_uniques, dtype=object))
+    shape = tuple(len(values) for values in uniques)
+    flat = np.ravel_multi_index(codes, shape) if len(df) else np.zeros(0, dtype=np.int64)
+    n_combinations = int(np.prod(shape))
+    if n_combinations <= max(len(df), 1 << 16):
+        # Few enough combinations to count them all directly, which beats sorting
+        present = np.flatnonzero(np.bincount(flat, minlength=n_combinations))
+        lookup = np.zeros(n_combinations, dtype=np.int64)
+        lookup[present] = np.arange(len(present))
+        cell = lookup[flat]
+    else:
+        present, cell = np.unique(flat, return_inverse=True)
+    n_cells = len(present)
+    
+    counted = valid & (buckets >= 0)
+    bucket_counts = np.bincount(cell[counted] * len(DELAY_BUCKETS) + buckets[counted],
+                                minlength=n_cells * len(DELAY_BUCKETS)).reshape(n_cells, len(DELAY_BUCKETS))
+    
+    key_index = np.unravel_index(present, shape)
+    cells = pd.DataFrame({key: values[idx] for key, values, idx in zip(keys, uniques, key_index)})
+    cells['rows'] = np.bincount(cell, minlength=n_cells)
+    cells['valid'] = np.bincount(cell, weights=valid, minlength=n_cells).astype(np.int64)
+    cells['delay_sum'] = np.bincount(cell, weights=delay, minlength=n_cells)
+    for idx, bucket in enumerate(DELAY_BUCKETS):
+        cells[bucket] = bucket_counts[:, idx]
+    return cells
+
+def compute_partials(df, scheduled_col, actual_col):
+    """
+    Collapse flight rows into mergeable per-day partial aggregates: one
+    compute_cells row per (date, time_of_day, schengen) cell, so cells from
+    different days can be concatenated and summed.
+    
+    Parameters:
+    df (pd.DataFrame): Flight rows for one direction
+    scheduled_col (str): Scheduled timestamp column
+    actual_col (str): Actual timestamp column
+    
+    Returns:
+    pd.DataFrame: Columns PARTIAL_KEYS + PARTIAL_COUNTS, sorted by PARTIAL_KEYS
+    """
+    return compute_cells(df, PARTIAL_KEYS, scheduled_col, actual_col)
+
+def compute_delay_sketches(df, scheduled_col, actual_col):
+    """
+    Collapse flight rows into mergeable per-day delay sketches.
+    
+    Delays are whole minutes, so each (date, time_of_day, schengen) cell
+    keeps a sparse histogram of its delays: one row per distinct delay with
+    the number of valid flights that had it. Sketches of any set of days
+    merge by summing counts, and the percentiles read back from them are
+    exact, while a cell stays smaller than the ~40 flights it summarizes.
+    
+    Parameters:
+    df (pd.DataFrame): Flight rows for one direction
+    scheduled_col (str): Scheduled timestamp column
+    actual_col (str): Actual timestamp column
+    
+    Returns:
+    pd.DataFrame: Columns SKETCH_COLUMNS, sorted by PARTIAL_KEYS and delay
+    """
+    valid = (df[scheduled_col].notna() & df[actual_col].notna() & df['delay'].notna()).to_numpy()
+    if not valid.any():
+        return pd.DataFrame(columns=SKETCH_COLUMNS)
+    
+    # Same single pass as compute_partials, with the delay as one more key
+    columns = [df[key][valid] for key in PARTIAL_KEYS]
+    columns.append(np.asarray(df['delay'], dtype=float)[valid].astype(np.int64))
+    codes, uniques = [], []
+    for column in columns:
+        column_codes, column_uniques = pd.factorize(column, sort=True, use_na_sentinel=False)
+        codes.append(column_codes)
+        uniques.append(np.asarray(column_uniques))
+    shape = tuple(len(values) for values in uniques)
+    cell, counts = np.unique(np.ravel_multi_index(codes, shape), return_counts=True)
+    key_index = np.unravel_index(cell, shape)
+    sketches = pd.DataFrame({key: values[idx] for key, values, idx in zip(PARTIAL_KEYS + ['delay'], uniques, key_index)})
+    sketches['count'] = counts
+    return sketches
+
+def sketch_percentiles(sketches, percentiles=PERCENTILES):
+    """
+    Delay percentiles of the flights in merged sketches.
+    
+    Matches numpy.percentile over the underlying delays (linear
+    interpolation between closest ranks) without expanding the histogram.
+    
+    Parameters:
+    sketches (pd.DataFrame): compute_delay_sketches rows for any number of cells
+    percentiles (sequence): Percentiles to compute, 0-100
+    
+    Returns:
+    np.ndarray: One value per percentile, NaN when there are no flights
+    """
+    histogram = sketches.groupby('delay', sort=True)['count'].sum()
+    histogram = histogram[histogram > 0]
+    if histogram.empty:
+        return np.full(len(percentiles), np.nan)
+    values = histogram.index.to_numpy(dtype=float)
+    cumulative = histogram.to_numpy().cumsum()
+    position = (cumulative[-1] - 1) * np.asarray(percentiles, dtype=float) / 100
+    lower, upper = np.floor(position), np.ceil(position)
+    lower_value = values[np.searchsorted(cumulative, lower, side='right')]
+    upper_value = values[np.searchsorted(cumulative, upper, side='right')]
+    return lower_value + (upper_value - lower_value) * (position - lower)
+
+def percentile_summary(sketches):
+    """Rounded p50/p90/p99 delays, 0 when there are no flights (like averageDelay)."""
+    values = sketch_percentiles(sketches)
+    return {f"p{percentile}": 0 if np.isnan(value) else round(float(value))
+            for percentile, value in zip(PERCENTILES, values)}
+
+def analyze_percentiles(sketches):
+    """
+    Delay percentiles per trailing window, overall and by time of day and
+    Schengen zone, plus per week over all time.
+    
+    Windows are merged from the daily sketches, so no flight rows are read.
+    
+    Parameters:
+    sketches (pd.DataFrame): compute_delay_sketches output, for any number of days
+    
+    Returns:
+    dict: Percentiles keyed by window name (PERCENTILE_WINDOWS)
+    """
+    dates = pd.to_datetime(sketches['date'])
+    latest = dates.max()
+    result = {}
+    for window, days in PERCENTILE_WINDOWS.items():
+        in_window = sketches if days is None else sketches[dates > latest - pd.Timedelta(days=days)]
+        # Days are merged first, so each slice below scans one small histogram
+        cells = in_window.groupby(['time_of_day', 'schengen', 'delay'], sort=False)['count'].sum().reset_index()
+        result[window] = {
+            "overall": percentile_summary(cells),
+            "timeOfDay": {
+                period.lower(): percentile_summary(cells[cells['time_of_day'] == period])
+                for period in TIME_PERIODS
+            },
+            "schengen": {
+                ("schengen" if is_schengen else "nonSchengen"): percentile_summary(cells[cells['schengen'] == is_schengen])
+                for is_schengen in [True, False]
+            }
+        }
+
+    # Same ISO week numbering as weeklyData
+    weeks = dates.dt.isocalendar().week.to_numpy()
+    result['allTime']["weekly"] = [
+        {"week": f"Week {week}", **percentile_summary(cells)}
+        for week, cells in sketches.groupby(weeks, sort=True)
+    ]
+    return result
+
+def analyze_partials(partials, sketches=None):
+    """
+    Build one direction's analysis from per-day partial aggregates.
+    
+    Produces the same structure and numbers as analyze_direction in
+    analyze_flight_data, without rescanning the flight rows. Delay
+    percentiles are added when the day's delay sketches are given.
+    
+    Parameters:
+    partials (pd.DataFrame): Output of compute_partials, for any number of days
+    sketches (pd.DataFrame): Output of compute_delay_sketches for the same days
+    
+    Returns:
+    dict: Analysis for one direction
+    """
+    def breakdown(cells):
+        return round_breakdown([int(cells[bucket].sum()) for bucket in DELAY_BUCKETS])
+
+    def average(cells):
+        valid = cells['valid'].sum()
+        return round(float(cells['delay_sum'].sum()) / valid) if valid > 0 else 0
+
+    valid_total = int(partials['valid'].sum())
+    days_tracked = int(partials.loc[partials['valid'] > 0, 'date'].nunique())
+    flights_per_day = round(valid_total / days_tracked) if days_tracked > 0 else 0
+
+    time_of_day = {
+        period.lower(): breakdown(partials[partials['time_of_day'] == period])
+        for period in TIME_PERIODS
+    }
+
+    heatmap = {"schengen": {}, "nonSchengen": {}}
+    schengen = {}
+    for is_schengen in [True, False]:
+        key = "schengen" if is_schengen else "nonSchengen"
+        zone = partials[partials['schengen'] == is_schengen]
+        schengen[key] = breakdown(zone)
+        for period in TIME_PERIODS:
+            heatmap[key][period.lower()] = average(zone[zone['time_of_day'] == period])
+
+    weeks = pd.to_datetime(partials['date']).dt.isocalendar().week
+    weekly_counts = partials[DELAY_BUCKETS].groupby(weeks.to_numpy(), sort=True).sum()
+    weekly_data = [
+        {"week": f"Week {week}", **round_breakdown([int(count) for count in counts])}
+        for week, counts in zip(weekly_counts.index, weekly_counts.to_numpy())
+    ]
+
+    analysis = {
+        "flightsPerDay": flights_per_day,
+        "daysTracked": days_tracked,
+        "averageDelay": average(partials),
+        "delays": breakdown(partials),
+        "timeOfDay": time_of_day,
+        "heatmap": heatmap,
+        "weeklyData": weekly_data,
+        "schengen": schengen
+    }
+    if sketches is not None:
+        analysis["delayPercentiles"] = analyze_percentiles(sketches)
+    analysis["lastUpdated"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    return analysis
+
+def analyze_flight_data(arrivals_df, departures_df, airport=DEFAULT_AIRPORT, timezone=DEFAULT_TIMEZONE):
     """
     Analyze flight data and generate statistics for both arrivals and departures.
     
     Parameters:
     arrivals_df (pd.DataFrame): DataFrame containing arrival flight data
     departures_df (pd.DataFrame): DataFrame containing departure flight data
+    airport (str): IATA code reported in the metadata
+    timezone (str): IANA time zone reported in the metadata
     
     Returns:
     dict: Structured analysis results in JSON format
     """
-    def calculate_delay_breakdown(df, scheduled_col, actual_col):
-        """Calculate delay breakdown percentages for valid flights."""
-        valid_flights = df[df[scheduled_col].notna() & df[actual_col].notna()]
-        total_valid = len(valid_flights)
-        if total_valid == 0:
-            return {"onTime": 0, "minor": 0, "medium": 0, "major": 0}
-        
-        # Calculate raw percentages
-        on_time = (valid_flights['delay'] < 5).sum() / total_valid * 100
-        minor_delay = ((valid_flights['delay'] >= 5) & (valid_flights['delay'] <= 30)).sum() / total_valid * 100
-        medium_delay = ((valid_flights['delay'] > 30) & (valid_flights['delay'] <= 60)).sum() / total_valid * 100
-        major_delay = (valid_flights['delay'] > 60).sum() / total_valid * 100
-        
-        # Use numpy.round and ensure sum equals 100
-        percentages = np.array([on_time, minor_delay, medium_delay, major_delay])
-        rounded = np.round(percentages)
-        
-        # Adjust to ensure sum is 100
-        diff = 100 - rounded.sum()
-        if diff != 0:
-            # Add the difference to the largest category to maintain proportions
-            max_idx = np.argmax(percentages)
-            rounded[max_idx] += diff
-        
-        return {
-            "onTime": int(rounded[0]),
-            "minor": int(rounded[1]),
-            "medium": int(rounded[2]),
-            "major": int(rounded[3])
-        }
-
-    def analyze_by_time_of_day(df, scheduled_col, actual_col):
-        """Calculate delay breakdown by time of day."""
-        result = {}
-        for time_period in ['Early', 'Morning', 'Afternoon', 'Evening']:
-            period_data = df[df['time_of_day'] == time_period]
-            result[time_period.lower()] = calculate_delay_breakdown(period_data, scheduled_col, actual_col)
-        return result
-
-    def analyze_weekly_trends(df, scheduled_col, actual_col):
-        """Calculate delay breakdown by ISO week."""
-        df['week'] = pd.to_datetime(df['date']).dt.isocalendar().week
-        weekly_trends = []
-        
-        for week in sorted(df['week'].unique()):
-            week_data = df[df['week'] == week]
-            delays = calculate_delay_breakdown(week_data, scheduled_col, actual_col)
-            weekly_trends.append({
-                "week": f"Week {week}",
-                **delays
-            })
-        
-        return weekly_trends
-
-    def analyze_schengen(df, scheduled_col, actual_col):
-        """Calculate delay breakdown by Schengen zone status."""
-        result = {}
-        for is_schengen in [True, False]:
-            schengen_data = df[df['schengen'] == is_schengen]
-            key = "schengen" if is_schengen else "nonSchengen"
-            result[key] = calculate_delay_breakdown(schengen_data, scheduled_col, actual_col)
-        return result
-
-    def calculate_heatmap_metrics(df, scheduled_col, actual_col):
-        """Calculate average delays by time of day for Schengen and non-Schengen flights."""
-        result = {
-            "schengen": {},
-            "nonSchengen": {}
-        }
-        
-        # Filter for valid flights
-        valid_flights = df[df[scheduled_col].notna() & df[actual_col].notna()]
-        
-        for is_schengen in [True, False]:
-            key = "schengen" if is_schengen else "nonSchengen"
-            schengen_data = valid_flights[valid_flights['schengen'] == is_schengen]
-            
-            for time_period in ['Early', 'Morning', 'Afternoon', 'Evening']:
-                period_data = schengen_data[schengen_data['time_of_day'] == time_period]
-                avg_delay = round(period_data['delay'].mean()) if len(period_data) > 0 else 0
-                result[key][time_period.lower()] = avg_delay
-                
-        return result
-
-    def analyze_direction(df, scheduled_col, actual_col):
-        """Analyze flight data for one direction (arrivals or departures)."""
-        valid_flights = df[df[scheduled_col].notna() & df[actual_col].notna()]
-        
-        days_tracked = len(valid_flights['date'].unique())
-        flights_per_day = round(len(valid_flights) / days_tracked) if days_tracked > 0 else 0
-        avg_delay = round(valid_flights['delay'].mean()) if len(valid_flights) > 0 else 0
-        
-        return {
-            "flightsPerDay": flights_per_day,
-            "daysTracked": days_tracked,
-            "averageDelay": avg_delay,
-            "delays": calculate_delay_breakdown(df, scheduled_col, actual_col),
-            "timeOfDay": analyze_by_time_of_day(df, scheduled_col, actual_col),
-            "heatmap": calculate_heatmap_metrics(df, scheduled_col, actual_col),
-            "weeklyData": analyze_weekly_trends(df, scheduled_col, actual_col),
-            "schengen": analyze_schengen(df, scheduled_col, actual_col),
-            "lastUpdated": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-        }
+    # Every slice (overall, time of day, Schengen, heatmap, weekly) is derived
+    # from per-day cells built in a single pass over each direction's rows
+    return analyze_flight_data_from_partials(
+        compute_partials(arrivals_df, 'scheduled_in', 'actual_in'),
+        compute_partials(departures_df, 'scheduled_off', 'actual_off'),
+        airport, timezone,
+        compute_delay_sketches(arrivals_df, 'scheduled_in', 'actual_in'),
+        compute_delay_sketches(departures_df, 'scheduled_off', 'actual_off')
+    )
 
-    # Generate complete analysis
-    result = {
-        "arrivals": analyze_direction(arrivals_df, 'scheduled_in', 'actual_in'),
-        "departures": analyze_direction(departures_df, 'scheduled_off', 'actual_off'),
-        "metadata": {
-            "airport": "LIS",
-            "timeZone": "Europe/Lisbon",
-            "updateFrequency": "daily"
-        }
+def analysis_metadata(airport=DEFAULT_AIRPORT, timezone=DEFAULT_TIMEZONE):
+    """Metadata block shared by every analysis output."""
+    return {
+        "airport": airport,
+        "timeZone": timezone,
+        "updateFrequency": "daily"
     }
+
+def analyze_flight_data_from_partials(arrivals_partials, departures_partials,
+                                      airport=DEFAULT_AIRPORT, timezone=DEFAULT_TIMEZONE,
+                                      arrivals_sketches=None, departures_sketches=None):
+    """
+    Generate the same analysis as analyze_flight_data from stored partial aggregates.
     
-    return result
+    Parameters:
+    arrivals_partials (pd.DataFrame): compute_partials output for arrivals
+    departures_partials (pd.DataFrame): compute_partials output for departures
+    airport (str): IATA code reported in the metadata
+    timezone (str): IANA time zone reported in the metadata
+    arrivals_sketches (pd.DataFrame): compute_delay_sketches output for arrivals
+    departures_sketches (pd.DataFrame): compute_delay_sketches output for departures
+    
+    Returns:
+    dict: Structured analysis results in JSON format
+    """
+    return {
+        "arrivals": analyze_partials(arrivals_partials, arrivals_sketches),
+        "departures": analyze_partials(departures_partials, departures_sketches),
+        "metadata": analysis_metadata(airport, timezone)
+    }
 
 def save_analysis(analysis_results, output_file):
-    """Save analysis results to a JSON file."""
+    """Save analysis results to a minified JSON file (publish.py shards it for KV)."""
     with open(output_file, 'w') as f:
-        json.dump(analysis_results, f, indent=2)
+        json.dump(analysis_results, f, separators=(',', ':'))
 
-# Example usage:
-if __name__ == "__main__":
-    # Read CSV files
-    arrivals_df = pd.read_csv('merged_arrivals.csv')
-    departures_df = pd.read_csv('merged_departures.csv')
+def main():
+    from archive import METRIC_COLUMNS, FlightArchive
+    from instrumentation import RunReport, add_report_arguments
+    from partials import DEFAULT_PARTIALS_DIR, PartialStore, summarize_archive, update_partials, update_partials_from_archive
+    from schema import read_flights_csv
+
+    parser = argparse.ArgumentParser(description="Generate flight-data.json from processed flight data")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Fold new daily CSVs into stored partial aggregates instead of re-reading merged CSVs")
+    parser.add_argument('--daily-dir', default='Flight-Data-Daily',
+                        help="Directory containing the daily CSV files (incremental mode)")
+    parser.add_argument('--partials-dir', default=DEFAULT_PARTIALS_DIR,
+                        help="Directory holding the per-day partial aggregates (incremental mode)")
+    parser.add_argument('--refresh', nargs='*', default=[], metavar='YYYY-MM-DD',
+                        help="Dates to recompute even if already folded in (incremental mode)")
+    parser.add_argument('--archive',
+                        help="Read flights from this Parquet archive instead of CSV files")
+    parser.add_argument('--parallel', action='store_true',
+                        help="With --archive, summarize each month in a worker process and merge the results")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for --parallel (defaults to the CPU count)")
+    parser.add_argument('--output', default='flight-data.json')
+    parser.add_argument('--airport', default=DEFAULT_AIRPORT,
+                        help="IATA code reported in the output metadata")
+    parser.add_argument('--timezone', default=DEFAULT_TIMEZONE,
+                        help="IANA time zone reported in the output metadata")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+
+    archive = FlightArchive(args.archive) if args.archive else None
+    report = RunReport.from_args('metrics', args).start()
     
-    # Run analysis
-    analysis_results = analyze_flight_data(arrivals_df, departures_df)
+    if args.parallel and not archive:
+        parser.error("--parallel needs --archive")
+    
+    if args.incremental:
+        store = PartialStore(args.partials_dir)
+        with report.stage('update_partials'):
+            if archive:
+                update_partials_from_archive(store, archive, 'arrivals', 'scheduled_in', 'actual_in', args.refresh)
+                update_partials_from_archive(store, archive, 'departures', 'scheduled_off', 'actual_off', args.refresh)
+            else:
+                update_partials(store, args.daily_dir, 'arrivals', 'scheduled_in', 'actual_in', args.refresh)
+                update_partials(store, args.daily_dir, 'departures', 'scheduled_off', 'actual_off', args.refresh)
+        with report.stage('load'):
+            arrivals_partials = store.load('arrivals')
+            departures_partials = store.load('departures')
+            arrivals_sketches = store.load_sketches('arrivals')
+            departures_sketches = store.load_sketches('departures')
+        report.count('partial_rows', len(arrivals_partials) + len(departures_partials), stage='load')
+        report.count('sketch_rows', len(arrivals_sketches) + len(departures_sketches), stage='load')
+        with report.stage('analyze'):
+            analysis_results = analyze_flight_data_from_partials(arrivals_partials, departures_partials,
+                                                                 args.airport, args.timezone,
+                                                                 arrivals_sketches, departures_sketches)
+    elif args.parallel:
+        # Months are read and summarized in worker processes; only their partials come back
+        with report.stage('map_reduce'):
+            summaries = summarize_archive(archive, args.workers, report)
+        with report.stage('analyze'):
+            analysis_results = analyze_flight_data_from_partials(
+                summaries['arrivals'][0], summaries['departures'][0], args.airport, args.timezone,
+                summaries['arrivals'][1], summaries['departures'][1])
+    else:
+        with report.stage('load'):
+            if archive:
+                # Only the columns the analysis needs are read from the archive
+                arrivals_df = archive.load('arrivals', METRIC_COLUMNS['arrivals'])
+                departures_df = archive.load('departures', METRIC_COLUMNS['departures'])
+            else:
+                # Read CSV files into the compact typed schema
+                arrivals_df = read_flights_csv('merged_arrivals.csv')
+                departures_df = read_flights_csv('merged_departures.csv')
+        report.count('rows', len(arrivals_df) + len(departures_df), stage='load')
+        
+        # Run analysis
+        with report.stage('analyze'):
+            analysis_results = analyze_flight_data(arrivals_df, departures_df, args.airport, args.timezone)
     
     # Save results
-    save_analysis(analysis_results, 'flight-data.json')
\ No newline at end of file
+    with report.stage('save'):
+        save_analysis(analysis_results, args.output)
+    report.count('bytes_written', os.path.getsize(args.output), stage='save')
+    print(f"Run report saved to {report.save(os.path.dirname(os.path.abspath(args.output)))}")
+
+if __name__ == "__main__":
+    main()
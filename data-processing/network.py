@@ -0,0 +1,212 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+from aeroapi import AeroAPIClient, RateLimiter
+from airports import load_airports
+from archive import METRIC_COLUMNS, FlightArchive
+from flight_data_processor import FlightDataProcessor, validate_date
+from instrumentation import RunReport
+from metrics import analyze_flight_data_from_partials, save_analysis
+from partials import DEFAULT_PARTIALS_DIR, PartialStore, update_partials_from_archive
+from raw_cache import RawPageCache
+from transform import DIRECTION_FIELDS
+
+# ICAO codes; each airport's IATA code and local time zone come from the airport table
+IBERIAN_NETWORK = ['LPPT', 'LPPR', 'LPFR', 'LPMA', 'LPPD', 'LEMD', 'LEBL', 'LEPA', 'LEMG', 'LEAL',
+                   'LEZL', 'LEVC', 'LEBB', 'GCLP', 'GCTS']
+DEFAULT_REQUESTS_PER_MINUTE = 60
+KV_KEY_PREFIX = "airport_data"
+
+
+def output_key(airport_code):
+    """Workers KV key an airport's flight-data.json is published under."""
+    return f"{KV_KEY_PREFIX}:{airport_code}"
+
+
+def airport_dir(output_root, airport_code):
+    """Daily CSVs and flight-data.json of one airport."""
+    return os.path.join(output_root, airport_code)
+
+
+def airport_archive_path(output_root, airport_code):
+    """Each airport is its own Hive-style partition of the shared archive."""
+    return os.path.join(output_root, "flight-archive", f"airport={airport_code}")
+
+
+def fetch_airport_day(api_key, client, cache, output_root, airport_code, date_str):
+    """Fetch one airport's arrivals and departures for a day over the shared client (runs in a thread)."""
+    processor = FlightDataProcessor(api_key, airport_code, date_str, client=client, cache=cache,
+                                    output_path=airport_dir(output_root, airport_code))
+    return processor.fetch_all_directions()
+
+
+def process_airport_day(api_key, output_root, airport_code, date_str, raw_by_type):
+    """Transform and write one fetched airport day (runs in a worker process)."""
+    start = time.perf_counter()
+    os.makedirs(airport_dir(output_root, airport_code), exist_ok=True)
+    processor = FlightDataProcessor(api_key, airport_code, date_str,
+                                    output_path=airport_dir(output_root, airport_code))
+    processor.archive_path = airport_archive_path(output_root, airport_code)
+    rows = processor.process_fetched(raw_by_type)
+    return {"rows": sum(rows.values()), "seconds": time.perf_counter() - start}
+
+
+def airport_metrics(output_root, airport_code, refresh_dates):
+    """
+    Fold the airport's new and rewritten archive days into its partials and
+    rebuild its flight-data.json from them (runs in a worker process).
+
+    Days already folded in an earlier run are not read again; `refresh_dates`
+    are the days this run rewrote.
+    """
+    start = time.perf_counter()
+    airport = load_airports().get(airport_code)
+    iata, tz = (airport['iata'], airport['timezone']) if airport else (airport_code, 'UTC')
+    archive = FlightArchive(airport_archive_path(output_root, airport_code))
+    store = PartialStore(os.path.join(airport_dir(output_root, airport_code), DEFAULT_PARTIALS_DIR))
+    folded = 0
+    for direction in DIRECTION_FIELDS:
+        folded += len(update_partials_from_archive(store, archive, direction, *DIRECTION_FIELDS[direction][:2],
+                                                   refresh_dates=refresh_dates))
+    analysis = analyze_flight_data_from_partials(store.load('arrivals'), store.load('departures'), iata, tz,
+                                                 store.load_sketches('arrivals'), store.load_sketches('departures'))
+    output_file = os.path.join(airport_dir(output_root, airport_code), 'flight-data.json')
+    save_analysis(analysis, output_file)
+    return {"folded_days": folded, "seconds": time.perf_counter() - start, "output": output_file}
+
+
+def run_network(api_key, airports, dates, output_root, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                max_concurrency=8, workers=None, client=None, report=None):
+    """
+    Fetch, process and analyze every (airport, date) in parallel.
+
+    Fetching is I/O bound and runs on threads sharing one pooled client and
+    one rate-limit budget. Each fetched day is handed to a worker process
+    for transforming and writing as soon as it arrives, and an airport's
+    metrics are rebuilt in a worker once all of its days are written, so
+    the three stages overlap across airports. Metrics only read the days
+    this run wrote, or days not folded into the airport's partials yet.
+
+    Args:
+        api_key (str): AeroAPI key
+        airports (list): ICAO codes
+        dates (list): Days in YYYY-MM-DD format
+        output_root (str): Directory holding every airport's outputs and the shared archive and cache
+        requests_per_minute (float): Global AeroAPI budget shared by all airports
+        max_concurrency (int): Requests in flight at once
+        workers (int): Worker processes (defaults to the number of CPUs)
+        client (AeroAPIClient): Client shared by the fetch threads (defaults to one held to requests_per_minute)
+        report (RunReport): Records stage timings and counts
+
+    Returns:
+        dict: {airport: {"output": path or None, "failed_dates": [...]}}
+    """
+    report = report or RunReport("network")
+    own_client = client is None
+    if own_client:
+        client = AeroAPIClient(api_key, max_concurrency=max_concurrency,
+                               rate_limiter=RateLimiter(requests_per_minute))
+    cache = RawPageCache(os.path.join(output_root, "raw-cache"))
+    results = {code: {"output": None, "failed_dates": []} for code in airports}
+    pending_days = {code: len(dates) for code in airports}
+    written_dates = {code: [] for code in airports}
+    api_before = client.stats()
+
+    def fetch(code, date_str):
+        with report.stage("fetch"):
+            return fetch_airport_day(api_key, client, cache, output_root, code, date_str)
+
+    # Every airport-day fetch runs both directions, so two connections each
+    fetch_threads = max(1, max_concurrency // 2)
+    mp_context = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers=fetch_threads) as fetchers, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        jobs = {fetchers.submit(fetch, code, date_str): ("fetch", code, date_str)
+                for date_str in dates for code in airports}
+
+        def day_done(code):
+            pending_days[code] -= 1
+            if pending_days[code] == 0 and written_dates[code]:
+                jobs[pool.submit(airport_metrics, output_root, code, written_dates[code])] = ("metrics", code, None)
+
+        while jobs:
+            done, _ = wait(jobs, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, code, date_str = jobs.pop(future)
+                label = f"{code} {date_str}" if date_str else code
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"{label}: {stage} failed: {e}")
+                    report.count("failures", stage=stage)
+                    if stage != "metrics":
+                        results[code]["failed_dates"].append(date_str)
+                        day_done(code)
+                    continue
+
+                if stage == "fetch":
+                    print(f"{label}: fetched")
+                    jobs[pool.submit(process_airport_day, api_key, output_root, code, date_str, result)] = \
+                        ("process", code, date_str)
+                    continue
+                report.record(stage, result["seconds"])
+                if stage == "process":
+                    report.count("rows", result["rows"], stage=stage)
+                    print(f"{label}: processed {result['rows']} flights")
+                    written_dates[code].append(date_str)
+                    day_done(code)
+                else:
+                    report.count("folded_days", result["folded_days"], stage=stage)
+                    results[code]["output"] = result["output"]
+                    print(f"{label}: wrote {result['output']} (KV key {output_key(code)})")
+
+    report.count_api(api_before, client.stats())
+    if own_client:
+        client.close()
+    return results
+
+
+def default_date():
+    """Yesterday in UTC, the most recent complete day."""
+    return (datetime.now(timezone.utc) - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def main():
+    API_KEY = "123"
+
+    parser = argparse.ArgumentParser(description="Fetch, process and analyze several airports in parallel")
+    parser.add_argument('airports', nargs='*', default=IBERIAN_NETWORK, metavar='ICAO',
+                        help="ICAO codes to run (defaults to the Iberian network)")
+    parser.add_argument('--dates', nargs='+', default=None, metavar='YYYY-MM-DD',
+                        help="Days to fetch (defaults to yesterday, UTC)")
+    parser.add_argument('--output-dir', default=os.path.join(os.path.expanduser("~/Documents"), "network"),
+                        help="Directory for every airport's outputs, the shared archive and the raw cache")
+    parser.add_argument('--requests-per-minute', type=float, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help="AeroAPI request budget shared by all airports")
+    parser.add_argument('--max-concurrency', type=int, default=8,
+                        help="AeroAPI requests in flight at once")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for processing and metrics (defaults to the CPU count)")
+    args = parser.parse_args()
+
+    airports = [code.upper() for code in args.airports]
+    dates = args.dates or [default_date()]
+    for date_str in dates:
+        if not validate_date(date_str):
+            parser.error(f"Invalid date {date_str}. Please use YYYY-MM-DD format.")
+
+    report = RunReport("network").start()
+    results = run_network(API_KEY, airports, dates, args.output_dir, args.requests_per_minute,
+                          args.max_concurrency, args.workers, report=report)
+    for code, result in results.items():
+        if result["failed_dates"]:
+            print(f"{code}: failed for {', '.join(sorted(result['failed_dates']))}")
+    print(f"Run report saved to {report.save(args.output_dir)}")
+
+
+if __name__ == "__main__":
+    main()
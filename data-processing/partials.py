@@ -0,0 +1,285 @@
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from archive import METRIC_COLUMNS, FlightArchive
+from metrics import (PARTIAL_COUNTS, PARTIAL_KEYS, PERCENTILE_WINDOWS, SKETCH_COLUMNS, compute_delay_sketches,
+                     compute_partials)
+from schema import read_flights_csv
+from transform import DIRECTION_FIELDS
+
+# Where metrics.py --incremental keeps its store, and so where repairs refresh it
+DEFAULT_PARTIALS_DIR = "partials"
+# Days older than the longest trailing percentile window only count towards all-time and weekly percentiles
+DAILY_SKETCH_DAYS = max(days for days in PERCENTILE_WINDOWS.values() if days)
+
+class PartialStore:
+    """
+    On-disk store of per-day partial aggregates and delay sketches, one CSV
+    of each per direction.
+
+    The partials file holds compute_partials rows and the sketches file
+    compute_delay_sketches rows for every day folded in so far. Folding a
+    day replaces that day's cells in both, so re-ingesting a day never
+    double-counts it.
+
+    Sketches of months that ended more than DAILY_SKETCH_DAYS before the
+    latest day are compacted into a monthly file with one histogram per
+    ISO week of the month, time of day and Schengen flag. Each row is dated
+    on the first day of its week and month, so the trailing windows and
+    weekly percentiles come out exactly as from the daily rows, while the
+    history adds a few hundred rows per month instead of one histogram per
+    day. A compacted month can only be folded again as a whole (see
+    refold_dates).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, direction):
+        return os.path.join(self.root, f"{direction}_partials.csv")
+
+    def sketch_path(self, direction):
+        return os.path.join(self.root, f"{direction}_sketches.csv")
+
+    def monthly_sketch_path(self, direction):
+        return os.path.join(self.root, f"{direction}_sketches_monthly.csv")
+
+    def load(self, direction):
+        """All stored cells for a direction (empty frame when nothing is stored yet)."""
+        return self._read(self.path(direction), PARTIAL_KEYS + PARTIAL_COUNTS)
+
+    def load_sketches(self, direction):
+        """All stored delay sketches for a direction, daily and compacted (empty frame when nothing is stored yet)."""
+        monthly = self._read(self.monthly_sketch_path(direction), SKETCH_COLUMNS)
+        daily = self._read(self.sketch_path(direction), SKETCH_COLUMNS)
+        # Monthly rows win over daily rows a crash mid-compaction may have left behind
+        daily = daily[~daily['date'].str[:7].isin(set(monthly['date'].str[:7]))]
+        frames = [frame for frame in (monthly, daily) if not frame.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SKETCH_COLUMNS)
+
+    def compacted_months(self, direction):
+        """YYYY-MM months whose sketches are compacted."""
+        return set(self._read(self.monthly_sketch_path(direction), SKETCH_COLUMNS)['date'].str[:7])
+
+    def refold_dates(self, direction, dates):
+        """`dates` plus every stored day of the compacted months they fall in, which are only folded whole."""
+        dates = set(dates)
+        months = {date[:7] for date in dates} & self.compacted_months(direction)
+        if months:
+            dates |= {date for date in self.dates(direction) if date[:7] in months}
+        return dates
+
+    def dates(self, direction):
+        """Dates already folded into the store for a direction."""
+        # Stores written before sketches existed are folded again from scratch, once
+        if not os.path.exists(self.sketch_path(direction)):
+            return set()
+        return set(self.load(direction)['date'])
+
+    def fold(self, direction, partials, sketches):
+        """Upsert the days present in `partials`, replacing any cells and sketches stored for them."""
+        if partials.empty:
+            return
+        dates = set(partials['date'])
+        months = {date[:7] for date in dates} & self.compacted_months(direction)
+        missing = {date for date in self.dates(direction) if date[:7] in months} - dates
+        if missing:
+            raise Exception(f"{direction} sketches of {', '.join(sorted(months))} are compacted, so the whole month "
+                            f"must be folded again (missing {', '.join(sorted(missing))})")
+        self._upsert(self.path(direction), self.load(direction), partials, dates)
+        self._upsert(self.sketch_path(direction), self._read(self.sketch_path(direction), SKETCH_COLUMNS),
+                     sketches, dates)
+        # Refolded months are back in the daily file and get compacted again
+        monthly = self._read(self.monthly_sketch_path(direction), SKETCH_COLUMNS)
+        monthly = monthly[~monthly['date'].str[:7].isin(months)]
+        if not self._compact(direction, monthly, self.load(direction)['date'].max()) and months:
+            self._write(self.monthly_sketch_path(direction), monthly)
+
+    def _compact(self, direction, monthly, latest):
+        """
+        Move the daily sketches of months that ended DAILY_SKETCH_DAYS before
+        `latest` into the monthly file. Returns whether anything was moved.
+        """
+        daily = self._read(self.sketch_path(direction), SKETCH_COLUMNS)
+        cutoff = (pd.Timestamp(latest) - pd.Timedelta(days=DAILY_SKETCH_DAYS)).strftime('%Y-%m')
+        stale = daily['date'].str[:7].isin(set(monthly['date'].str[:7])).to_numpy()
+        old = (daily['date'].str[:7] < cutoff).to_numpy() & ~stale
+        if not old.any() and not stale.any():
+            return False
+        cells = daily[old].assign(month=daily['date'].str[:7],
+                                  week=pd.to_datetime(daily['date']).dt.isocalendar().week)
+        compacted = cells.groupby(['month', 'week', 'time_of_day', 'schengen', 'delay'], sort=True).agg(
+            date=('date', 'min'), count=('count', 'sum')).reset_index()
+        monthly = pd.concat([frame for frame in (monthly, compacted[SKETCH_COLUMNS]) if not frame.empty],
+                            ignore_index=True)
+        # Monthly rows are written first; until the daily rows are gone, load_sketches ignores them
+        self._write(self.monthly_sketch_path(direction), monthly)
+        self._write(self.sketch_path(direction), daily[~old & ~stale])
+        return True
+
+    @staticmethod
+    def _read(path, columns):
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=columns)
+        return pd.read_csv(path)
+
+    @staticmethod
+    def _upsert(path, existing, new, dates):
+        existing = existing[~existing['date'].isin(dates)]
+        frames = [frame for frame in (existing, new) if not frame.empty]
+        PartialStore._write(path, pd.concat(frames, ignore_index=True) if frames else new)
+
+    @staticmethod
+    def _write(path, frame):
+        frame = frame.sort_values(by=['date'], kind='stable')
+        # Write then rename so a crash never leaves a half-written store
+        tmp_path = path + ".tmp"
+        frame.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+def daily_file_date(filename):
+    """YYYY-MM-DD date encoded in a daily CSV name such as 20241001_arrivals.csv."""
+    date_str = os.path.basename(filename).split('_')[0][-8:]
+    return datetime.strptime(date_str, '%Y%m%d').strftime('%Y-%m-%d')
+
+def summarize(df, scheduled_col, actual_col):
+    """Partial aggregates and delay sketches of some flight rows, as (partials, sketches)."""
+    return compute_partials(df, scheduled_col, actual_col), compute_delay_sketches(df, scheduled_col, actual_col)
+
+def fold_summaries(store, direction, summaries):
+    """Fold a list of summarize() results into the store in one write."""
+    if summaries:
+        partials, sketches = zip(*summaries)
+        store.fold(direction, pd.concat(partials, ignore_index=True), pd.concat(sketches, ignore_index=True))
+
+def update_partials(store, data_dir, direction, scheduled_col, actual_col, refresh_dates=()):
+    """
+    Fold daily CSVs that are not in the store yet (or listed in refresh_dates).
+
+    Args:
+        store (PartialStore): Store to update
+        data_dir (str): Directory containing the daily CSV files
+        direction (str): 'arrivals' or 'departures'
+        scheduled_col (str): Scheduled timestamp column for the direction
+        actual_col (str): Actual timestamp column for the direction
+        refresh_dates (iterable): YYYY-MM-DD dates to recompute even if already stored
+
+    Returns:
+        list: Dates that were folded in
+    """
+    files = {daily_file_date(filename): filename
+             for filename in sorted(glob.glob(os.path.join(data_dir, f"*_{direction}.csv")))}
+    pending = store.refold_dates(direction, (set(files) - store.dates(direction)) | set(refresh_dates))
+    summaries = []
+    folded = []
+
+    for date, filename in sorted(files.items()):
+        if date not in pending:
+            continue
+        df = read_flights_csv(filename)
+        # Same convention as merge-csv.py: the file name is the source of truth for the date
+        df['date'] = date
+        summaries.append(summarize(df, scheduled_col, actual_col))
+        folded.append(date)
+        print(f"Folded {direction} for {date} from {filename}")
+
+    fold_summaries(store, direction, summaries)
+    return folded
+
+def update_partials_from_archive(store, archive, direction, scheduled_col, actual_col, refresh_dates=()):
+    """
+    Fold archive partitions that are not in the store yet (or listed in refresh_dates).
+
+    Only the pending day partitions are opened, and only the columns the
+    metrics need are read from them.
+
+    Returns:
+        list: Dates that were folded in
+    """
+    available = archive.dates(direction)
+    pending = store.refold_dates(direction, (set(available) - store.dates(direction)) | set(refresh_dates))
+    pending = [date for date in available if date in pending]
+    summaries = [
+        summarize(archive.load(direction, METRIC_COLUMNS[direction], start=date, end=date),
+                  scheduled_col, actual_col)
+        for date in pending
+    ]
+    for date in pending:
+        print(f"Folded {direction} for {date} from archive")
+
+    fold_summaries(store, direction, summaries)
+    return pending
+
+def month_partitions(dates):
+    """Group YYYY-MM-DD dates into {YYYY-MM: (first date, last date)}, oldest month first."""
+    months = {}
+    for date in sorted(dates):
+        first, _ = months.get(date[:7], (date, date))
+        months[date[:7]] = (first, date)
+    return months
+
+def summarize_archive_partition(archive_root, direction, start, end):
+    """
+    Partials and delay sketches of the archived days from start to end
+    (runs in a worker process). Only this slice of the archive is read.
+
+    Returns:
+        tuple: (partials, sketches, rows read, seconds)
+    """
+    started = time.perf_counter()
+    scheduled_col, actual_col = DIRECTION_FIELDS[direction][:2]
+    df = FlightArchive(archive_root).load(direction, METRIC_COLUMNS[direction], start=start, end=end)
+    partials, sketches = summarize(df, scheduled_col, actual_col)
+    return partials, sketches, len(df), time.perf_counter() - started
+
+def summarize_archive(archive, workers=None, report=None):
+    """
+    Map-reduce the whole archive into partials and delay sketches.
+
+    Each direction is split into month partitions that worker processes
+    read and summarize independently, so memory is bounded by one month per
+    worker and a multi-year recompute scales with the number of cores. The
+    per-month results are mergeable, and concatenating them in month order
+    gives exactly what summarize() returns for the whole history.
+
+    Args:
+        archive (FlightArchive): Archive to read
+        workers (int): Worker processes (defaults to the number of CPUs)
+        report (RunReport): Records the time spent in the workers and the rows they read
+
+    Returns:
+        dict: {direction: (partials, sketches)}
+    """
+    tasks = [(direction, month, start, end)
+             for direction in ['arrivals', 'departures']
+             for month, (start, end) in month_partitions(archive.dates(direction)).items()]
+    results = {}
+    mp_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        futures = {pool.submit(summarize_archive_partition, archive.root, direction, start, end): (direction, month)
+                   for direction, month, start, end in tasks}
+        for future in as_completed(futures):
+            partials, sketches, rows, seconds = future.result()
+            results[futures[future]] = (partials, sketches)
+            if report:
+                report.record('map', seconds)
+                report.count('rows', rows, stage='map')
+
+    summaries = {}
+    for direction in ['arrivals', 'departures']:
+        months = [results[key] for key in sorted(results) if key[0] == direction]
+        if not months:
+            scheduled_col, actual_col = DIRECTION_FIELDS[direction][:2]
+            summaries[direction] = summarize(archive.load(direction, METRIC_COLUMNS[direction]),
+                                             scheduled_col, actual_col)
+            continue
+        partials, sketches = zip(*months)
+        summaries[direction] = (pd.concat(partials, ignore_index=True), pd.concat(sketches, ignore_index=True))
+    return summaries
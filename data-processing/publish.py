@@ -0,0 +1,248 @@
+import argparse
+import copy
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+from cube import INDEX_FILE, OPERATOR_DIR
+
+DIRECTIONS = ['arrivals', 'departures']
+# Sections of a direction stored as shards of their own (besides weeklyData)
+SECTIONS = ['heatmap', 'delayPercentiles']
+# weeklyData is split into runs of this many weeks; a run with no new flights in any of its weeks keeps its key.
+# Weeks are week-of-year buckets covering every year, so new data can land in any run, not only the last one
+WEEKS_PER_SHARD = 13
+# Fields that change on every run live in the manifest, so they don't invalidate the shards
+VOLATILE_FIELDS = ['lastUpdated']
+MANIFEST_VERSION = 1
+
+
+def minify(value):
+    """Compact JSON text, as stored in KV."""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def manifest_key(base_key):
+    """KV key of the manifest for a flight-data key such as airport_data or airport_data:LEMD."""
+    return f"{base_key}:manifest"
+
+
+def content_key(prefix, text):
+    """KV key of a shard: its prefix plus a hash of its minified value."""
+    return f"{prefix}:{hashlib.sha256(text.encode()).hexdigest()[:16]}"
+
+
+def shard_sections(analysis):
+    """
+    Split an analysis into (path, value) sections plus the small base object they merge into.
+
+    Each direction becomes a summary section (everything but its SECTIONS,
+    weekly data and volatile fields), one section per entry of SECTIONS and
+    one per WEEKS_PER_SHARD weeks of weeklyData. Volatile fields and the top-level
+    metadata stay in the base.
+
+    Returns:
+        tuple: (base dict, list of (path list, value))
+    """
+    base = {key: value for key, value in analysis.items() if key not in DIRECTIONS}
+    sections = []
+    for direction in DIRECTIONS:
+        if direction not in analysis:
+            continue
+        data = analysis[direction]
+        base[direction] = {field: data[field] for field in VOLATILE_FIELDS if field in data}
+        summary = {key: value for key, value in data.items()
+                   if key not in VOLATILE_FIELDS and key not in SECTIONS + ['weeklyData']}
+        sections.append(([direction], summary))
+        for section in SECTIONS:
+            if section in data:
+                sections.append(([direction, section], data[section]))
+        weekly = data.get('weeklyData', [])
+        # Always at least one weekly shard, so an empty list still round-trips
+        for start in range(0, max(len(weekly), 1), WEEKS_PER_SHARD):
+            sections.append(([direction, 'weeklyData'], weekly[start:start + WEEKS_PER_SHARD]))
+    return base, sections
+
+
+def build_shards(analysis, base_key, published=None):
+    """
+    Turn an analysis into content-addressed KV shards and the manifest that lists them.
+
+    Shard keys end in a hash of their minified value, so a key never
+    changes meaning once written: unchanged shards keep their key across
+    runs and can be cached at the edge indefinitely, and readers never see
+    a manifest pointing at a half-updated value.
+
+    Args:
+        analysis (dict): flight-data.json content
+        base_key (str): KV key the analysis used to be published under
+        published (str): Timestamp recorded in the manifest
+
+    Returns:
+        tuple: (manifest dict, {shard key: minified value})
+    """
+    base, sections = shard_sections(analysis)
+    values = {}
+    entries = []
+    for path, value in sections:
+        text = minify(value)
+        key = content_key(f"{base_key}:{':'.join(path)}", text)
+        values[key] = text
+        entries.append({"key": key, "path": path, "bytes": len(text.encode())})
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "published": published or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "base": base,
+        "shards": entries
+    }
+    return manifest, values
+
+
+def assemble(manifest, values):
+    """
+    Rebuild the analysis from a manifest and its shard values, as route.js does.
+
+    Shards are applied in manifest order: a list is appended to the list at
+    its path, an object is merged into the object at its path.
+    """
+    result = copy.deepcopy(manifest["base"])
+    for entry in manifest["shards"]:
+        value = json.loads(values[entry["key"]])
+        *parents, leaf = entry["path"]
+        target = result
+        for part in parents:
+            target = target.setdefault(part, {})
+        if isinstance(value, list):
+            target.setdefault(leaf, []).extend(value)
+        else:
+            target.setdefault(leaf, {}).update(value)
+    return result
+
+
+def load_cube(directory):
+    """The drill-down cube written by cube.py: {'index': dict, 'operators': {shard name: dict}}."""
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        index = json.load(f)
+    operators = {}
+    for entry in index["operators"]:
+        with open(os.path.join(directory, OPERATOR_DIR, f"{entry['shard']}.json")) as f:
+            operators[entry["shard"]] = json.load(f)
+    return {"index": index, "operators": operators}
+
+
+def build_cube_shards(cube, base_key):
+    """
+    Content-addressed shards of the drill-down cube: one for the index and
+    one per operator, so a carrier whose flights did not change keeps its key.
+    The manifest maps each operator code, as the API is asked for it, to its
+    shard key.
+
+    Returns:
+        tuple: (manifest 'cube' entry, {shard key: minified value})
+    """
+    values = {}
+    operators = {}
+    for entry in cube["index"]["operators"]:
+        name = entry["shard"]
+        text = minify(cube["operators"][name])
+        operators[entry["operator"]] = content_key(f"{base_key}:cube:operator:{name}", text)
+        values[operators[entry["operator"]]] = text
+    index_text = minify(cube["index"])
+    index_key = content_key(f"{base_key}:cube:index", index_text)
+    values[index_key] = index_text
+    return {"index": index_key, "operators": operators}, values
+
+
+def manifest_shard_keys(manifest):
+    """Every shard key a manifest points at."""
+    keys = {entry["key"] for entry in manifest.get("shards", [])}
+    if manifest.get("cube"):
+        keys.add(manifest["cube"]["index"])
+        keys.update(manifest["cube"]["operators"].values())
+    return keys
+
+
+def plan_upload(analysis, base_key, previous_manifest=None, published=None, cube=None):
+    """
+    Work out what has to change in KV to publish an analysis (and optionally the drill-down cube).
+
+    Shards already listed in `previous_manifest` (the manifest currently in
+    KV) are skipped; the manifest itself is always written.
+
+    Deletes lag one publish behind: readers can hold the previous manifest
+    for up to its edge cache TTL, so the shards it lists must outlive it.
+    Shards the new manifest drops are recorded in its `retired` list, and
+    only the previous manifest's retired shards that neither manifest uses
+    any more are returned for deletion.
+
+    Returns:
+        dict: {'manifest': dict, 'put': [{'key', 'value'}], 'delete': [key], 'values': {key: value}}
+    """
+    manifest, values = build_shards(analysis, base_key, published)
+    if cube is not None:
+        manifest["cube"], cube_values = build_cube_shards(cube, base_key)
+        values.update(cube_values)
+    previous_manifest = previous_manifest or {}
+    previous_keys = manifest_shard_keys(previous_manifest)
+    manifest["retired"] = sorted(previous_keys - set(values))
+    put = [{"key": key, "value": values[key]} for key in values if key not in previous_keys]
+    put.append({"key": manifest_key(base_key), "value": minify(manifest)})
+    delete = sorted(set(previous_manifest.get("retired", [])) - previous_keys - set(values))
+    return {"manifest": manifest, "put": put, "delete": delete, "values": values}
+
+
+def load_previous_manifest(path):
+    """The manifest saved from KV before publishing, or None when there is none (first publish)."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        text = f.read()
+    try:
+        manifest = json.loads(text)
+    except json.JSONDecodeError:
+        # `wrangler kv:key get` prints a message instead of JSON when the key does not exist
+        return None
+    return manifest if isinstance(manifest, dict) and manifest.get("version") == MANIFEST_VERSION else None
+
+
+def write_json(value, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(minify(value))
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split flight-data.json into hashed KV shards and write a bulk upload of the changed ones")
+    parser.add_argument('input', help="flight-data.json written by metrics.py")
+    parser.add_argument('--key', default='airport_data',
+                        help="KV key the data is published under (airport_data:<ICAO> for network airports)")
+    parser.add_argument('--cube', metavar='DIR',
+                        help="Also publish the operator drill-down cube written by cube.py")
+    parser.add_argument('--previous', help="Manifest currently in KV (from `wrangler kv:key get`)")
+    parser.add_argument('--bulk-file', default='kv-bulk.json',
+                        help="Where to write the `wrangler kv:bulk put` file")
+    parser.add_argument('--delete-file', default='kv-delete.json',
+                        help="Where to write the `wrangler kv:bulk delete` file of shards no longer used")
+    args = parser.parse_args()
+
+    with open(args.input) as f:
+        analysis = json.load(f)
+    cube = load_cube(args.cube) if args.cube else None
+    plan = plan_upload(analysis, args.key, load_previous_manifest(args.previous), cube=cube)
+    if assemble(plan["manifest"], plan["values"]) != analysis:
+        raise Exception(f"Shards of {args.input} do not reassemble to the original data")
+
+    write_json(plan["put"], args.bulk_file)
+    write_json(plan["delete"], args.delete_file)
+    changed = len(plan["put"]) - 1
+    upload_bytes = sum(len(item["value"].encode()) for item in plan["put"])
+    print(f"{args.key}: {changed} of {len(plan['values'])} shard(s) changed, uploading {upload_bytes} bytes "
+          f"(full payload {len(minify(analysis).encode())} bytes), {len(plan['delete'])} to delete")
+    print(f"Bulk upload written to {args.bulk_file}")
+
+
+if __name__ == "__main__":
+    main()
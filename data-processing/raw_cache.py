@@ -0,0 +1,205 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from streaming import iter_array_items
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+def page_cursor(url):
+    """Cursor carried by an AeroAPI page URL ('' for the first page)."""
+    return parse_qs(urlparse(url).query).get('cursor', [''])[0]
+
+class RawPageCache:
+    """
+    Content-addressed, gzip-compressed cache of raw AeroAPI response pages.
+
+    Page bodies are stored once per SHA-256 digest under objects/, and an
+    index maps (airport, direction, date, cursor) to a digest, its compressed
+    size and when it was last used. Once the compressed total passes
+    max_bytes the least recently used days are evicted, a whole (airport,
+    direction, date) at a time, so a cached day is always complete enough
+    to replay.
+
+    The index is kept in memory: reads and writes only mark it dirty, and
+    it is written back by flush(), which runs once per fetched or replayed
+    day and on close().
+
+    Layout:
+        {root}/index.json
+        {root}/objects/{digest[:2]}/{digest}.json.gz
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self._dirty = False
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+        # Index entries per object and the compressed bytes of all objects, counting shared ones once
+        self._refs = {}
+        self._total = 0
+        for entry in self.index.values():
+            self._add_ref(entry)
+
+    @staticmethod
+    def key(airport, direction, date, cursor):
+        return f"{airport}/{direction}/{date}/{cursor or ''}"
+
+    @staticmethod
+    def day_key(key):
+        """The (airport, direction, date) part of a page key, the unit of eviction."""
+        return key.rsplit('/', 1)[0]
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.json.gz")
+
+    def _add_ref(self, entry):
+        digest = entry["digest"]
+        if digest not in self._refs:
+            self._refs[digest] = 0
+            self._total += entry["size"]
+        self._refs[digest] += 1
+
+    def _drop_ref(self, entry):
+        """Forget one index entry's use of its object, deleting the object once nothing uses it."""
+        digest = entry["digest"]
+        self._refs[digest] -= 1
+        if self._refs[digest] == 0:
+            del self._refs[digest]
+            self._total -= entry["size"]
+            try:
+                os.remove(self.object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def flush(self):
+        """Write the index back if anything changed since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps(self.index))
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+    def close(self):
+        self.flush()
+
+    def put(self, airport, direction, date, cursor, body):
+        """Store one raw page body (bytes) and return its digest."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest)
+        key = self.key(airport, direction, date, cursor)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(gzip.compress(body))
+                os.replace(tmp_path, path)
+            entry = {"digest": digest, "size": os.path.getsize(path), "last_access": time.time()}
+            # Take the new reference first, so re-storing an identical page never deletes its object
+            self._add_ref(entry)
+            previous = self.index.get(key)
+            if previous is not None:
+                self._drop_ref(previous)
+            self.index[key] = entry
+            self._dirty = True
+            self._evict(keep=self.day_key(key))
+        return digest
+
+    def _touch(self, airport, direction, date, cursor):
+        """Index entry of a cached page, marked as used now, or None when it is not cached."""
+        with self._lock:
+            entry = self.index.get(self.key(airport, direction, date, cursor))
+            if entry is None or not os.path.exists(self.object_path(entry["digest"])):
+                return None
+            entry["last_access"] = time.time()
+            self._dirty = True
+            return entry
+
+    def get(self, airport, direction, date, cursor):
+        """Raw page body (bytes) for the key, or None when it is not cached."""
+        entry = self._touch(airport, direction, date, cursor)
+        if entry is None:
+            return None
+        with open(self.object_path(entry["digest"]), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def total_bytes(self):
+        """Compressed bytes on disk, counting each shared object once."""
+        return self._total
+
+    def _evict(self, keep=None):
+        """Drop least recently used days (never `keep`, the day being written) until under max_bytes."""
+        if self._total <= self.max_bytes:
+            return
+        days = {}
+        for key, entry in self.index.items():
+            day = self.day_key(key)
+            days.setdefault(day, [0, []])
+            days[day][0] = max(days[day][0], entry["last_access"])
+            days[day][1].append(key)
+        for day, (_, keys) in sorted(days.items(), key=lambda item: item[1][0]):
+            if self._total <= self.max_bytes:
+                break
+            if day == keep:
+                continue
+            for key in keys:
+                self._drop_ref(self.index.pop(key))
+
+    def dates(self, airport, direction):
+        """Dates with a cached first page for an airport and direction."""
+        prefix = f"{airport}/{direction}/"
+        return sorted({key[len(prefix):].split('/')[0] for key in self.index
+                       if key.startswith(prefix) and key.endswith('/')})
+
+    def iter_day_flights(self, airport, direction, date):
+        """Stream a cached day's flights one at a time, page by page."""
+        cursor = ''
+        while True:
+            entry = self._touch(airport, direction, date, cursor)
+            if entry is None:
+                raise Exception(f"Page {cursor or '(first)'} for {airport} {direction} {date} is not in the raw cache")
+            meta = {}
+            with gzip.open(self.object_path(entry["digest"]), 'rb') as f:
+                yield from iter_array_items(iter(lambda: f.read(64 * 1024), b''), direction, meta)
+            next_link = (meta.get("links") or {}).get("next")
+            if not next_link:
+                break
+            cursor = page_cursor(next_link)
+        self.flush()
+
+    def load_day(self, airport, direction, date):
+        """
+        Rebuild a full day's response from cached pages, following links.next
+        exactly as a live fetch would. Raises when any page is missing.
+        """
+        flights = []
+        num_pages = 0
+        cursor = ''
+        while True:
+            body = self.get(airport, direction, date, cursor)
+            if body is None:
+                raise Exception(f"Page {cursor or '(first)'} for {airport} {direction} {date} is not in the raw cache")
+            page = json.loads(body)
+            flights.extend(page.get(direction, []))
+            num_pages += page.get("num_pages", 1)
+            next_link = (page.get("links") or {}).get("next")
+            if not next_link:
+                break
+            cursor = page_cursor(next_link)
+        self.flush()
+        return {direction: flights, "links": None, "num_pages": num_pages}
@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from aeroapi import AVAILABLE_DAYS, AeroAPIClient, RateLimiter
+from archive import METRIC_COLUMNS, FlightArchive, key_index
+from instrumentation import RunReport
+from partials import DEFAULT_PARTIALS_DIR, PartialStore, fold_summaries, summarize
+from transform import DIRECTION_FIELDS, transform_flights
+
+INDEX_DIR = "incomplete-flights"
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_REQUESTS_PER_MINUTE = 60
+
+
+def incomplete_flights(flights, processed_df, flight_type):
+    """
+    Flights of a processed batch that still have no actual time, keyed by FlightAware flight id.
+
+    Cancelled flights and flights without a scheduled time or an
+    `fa_flight_id` are left out, since a later fetch cannot complete them.
+    `processed_df` is transform_flights(flights, ...), so rows line up with
+    `flights`.
+
+    Returns:
+        dict: {fa_flight_id: {'operator', 'flight_number', 'scheduled'}}
+    """
+    scheduled_key, actual_key = DIRECTION_FIELDS[flight_type][:2]
+    missing = ((processed_df[actual_key] == "N/A") & (processed_df[scheduled_key] != "N/A")
+               & ~processed_df['cancelled'].astype(bool)).to_numpy()
+    return {
+        flights[i]['fa_flight_id']: {
+            'operator': processed_df['operator'].iat[i],
+            'flight_number': processed_df['flight_number'].iat[i],
+            'scheduled': processed_df[scheduled_key].iat[i]
+        }
+        for i in np.flatnonzero(missing) if flights[i].get('fa_flight_id')
+    }
+
+
+class IncompleteFlightIndex:
+    """
+    Flights that were archived without an actual time, keyed by FlightAware flight id.
+
+    One small JSON file per direction and day:
+        {root}/{direction}/YYYY-MM-DD.json -> {fa_flight_id: {operator, flight_number, scheduled}}
+
+    A day is only ever written by the run that processes it, so days
+    processed in parallel (threads or worker processes) never contend for a
+    file. Re-processing a day replaces its entries, and a day with nothing
+    missing has no file.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, direction, date):
+        return os.path.join(self.root, direction, f"{date}.json")
+
+    def days(self):
+        """(direction, date) pairs that have incomplete flights, oldest first."""
+        days = []
+        for direction in ['arrivals', 'departures']:
+            path = os.path.join(self.root, direction)
+            if os.path.isdir(path):
+                days.extend((direction, name[:-len('.json')]) for name in os.listdir(path)
+                            if name.endswith('.json'))
+        return sorted(days, key=lambda day: (day[1], day[0]))
+
+    def load_day(self, direction, date):
+        path = self.path(direction, date)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def replace_day(self, direction, date, entries):
+        """Store the incomplete flights of a freshly processed day, dropping whatever was stored for it."""
+        path = self.path(direction, date)
+        if not entries:
+            self.drop_day(direction, date)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a crash never leaves a half-written day
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def remove(self, direction, date, flight_ids):
+        """Forget flights that have been repaired."""
+        entries = self.load_day(direction, date)
+        for flight_id in flight_ids:
+            entries.pop(flight_id, None)
+        self.replace_day(direction, date, entries)
+
+    def drop_day(self, direction, date):
+        path = self.path(direction, date)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def fetch_flight(client, fa_flight_id):
+    """The current AeroAPI record of one flight, or None when AeroAPI no longer has it."""
+    page = next(client.iter_pages(f"/flights/{quote(fa_flight_id, safe='')}"), {})
+    for flight in page.get('flights', []):
+        if flight.get('fa_flight_id') == fa_flight_id:
+            return flight
+    return None
+
+
+def patch_daily_csv(path, flight_type, updates):
+    """
+    Apply repaired rows to a daily CSV, matched on operator, flight number and scheduled time.
+
+    Returns:
+        int: Number of rows that were changed
+    """
+    if not os.path.exists(path):
+        return 0
+    scheduled_key, actual_key = DIRECTION_FIELDS[flight_type][:2]
+    keys = ['operator', 'flight_number', scheduled_key]
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    # A flight repaired twice in one batch keeps its latest values
+    updates = updates.drop_duplicates(keys, keep='last')
+    positions = key_index(updates, keys).get_indexer(key_index(df, keys))
+    matched = positions >= 0
+    if not matched.any():
+        return 0
+    for col in [actual_key, 'delay', 'cancelled']:
+        df.loc[matched, col] = updates[col].astype(str).to_numpy()[positions[matched]]
+    tmp_path = path + ".tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return int(matched.sum())
+
+
+def repair_incomplete(api_key, output_path=None, archive_path=None, partials_path=None,
+                      batch_size=DEFAULT_BATCH_SIZE, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                      today=None, client=None, report=None):
+    """
+    Re-fetch only the flights that were archived without an actual time and patch them in.
+
+    Flights listed in the incomplete-flight index are requested one by one
+    from AeroAPI's `/flights/{id}` endpoint, `batch_size` at a time. Every
+    flight that now has an actual time (or turned out cancelled) is written
+    into its archive partition and daily CSV and dropped from the index,
+    and the patched days are re-folded into the partials store when one is
+    given. Days older than AeroAPI's window can no longer be repaired and
+    are dropped from the index.
+
+    Args:
+        api_key (str): AeroAPI key
+        output_path (str): Where the daily CSVs and the index live (~/Documents)
+        archive_path (str): Archive to patch (defaults to flight-archive in output_path)
+        partials_path (str): Partials store of `metrics.py --incremental` to refresh (skipped when it does not exist)
+        batch_size (int): Flights requested at once
+        requests_per_minute (float): AeroAPI request budget
+        today (date): Day the AeroAPI window ends on (defaults to today, UTC)
+        client (AeroAPIClient): Client to look flights up with; a new one is made and closed when omitted
+        report (RunReport): Records stage timings and counts
+
+    Returns:
+        dict: Counts of 'checked', 'repaired', 'still_missing', 'expired' and 'failed' flights
+    """
+    output_path = output_path or os.path.expanduser("~/Documents")
+    report = report or RunReport("repair")
+    own_client = client is None
+    if own_client:
+        client = AeroAPIClient(api_key, max_concurrency=batch_size,
+                               rate_limiter=RateLimiter(requests_per_minute))
+    index = IncompleteFlightIndex(os.path.join(output_path, INDEX_DIR))
+    archive = FlightArchive(archive_path or os.path.join(output_path, "flight-archive"))
+    today = today or datetime.now(timezone.utc).date()
+    oldest = (today - timedelta(days=AVAILABLE_DAYS)).strftime('%Y-%m-%d')
+    result = {"checked": 0, "repaired": 0, "still_missing": 0, "expired": 0, "failed": 0}
+
+    pending = []
+    for direction, date in index.days():
+        entries = index.load_day(direction, date)
+        if date < oldest:
+            index.drop_day(direction, date)
+            result["expired"] += len(entries)
+            continue
+        pending.extend((direction, date, flight_id, key) for flight_id, key in entries.items())
+    print(f"{len(pending)} incomplete flight(s) to check")
+
+    def fetch(flight_id):
+        try:
+            return fetch_flight(client, flight_id)
+        except Exception as e:
+            print(f"{flight_id}: fetch failed: {e}")
+            return e
+
+    api_before = client.stats()
+    patched_dates = {'arrivals': set(), 'departures': set()}
+    with ThreadPoolExecutor(max_workers=batch_size) as executor:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            with report.stage("fetch"):
+                fetched = list(executor.map(fetch, [flight_id for _, _, flight_id, _ in batch]))
+            result["checked"] += len(batch)
+
+            updates = {}
+            for (direction, date, flight_id, key), flight in zip(batch, fetched):
+                if isinstance(flight, Exception) or flight is None:
+                    result["failed"] += 1
+                    continue
+                updates.setdefault((direction, date), []).append((flight_id, key, flight))
+
+            for (direction, date), day_updates in updates.items():
+                scheduled_key, actual_key = DIRECTION_FIELDS[direction][:2]
+                with report.stage("transform"):
+                    processed = transform_flights([flight for _, _, flight in day_updates], direction)
+                    # Match on the values the row was archived with
+                    processed['operator'] = [key['operator'] for _, key, _ in day_updates]
+                    processed['flight_number'] = [key['flight_number'] for _, key, _ in day_updates]
+                    processed[scheduled_key] = [key['scheduled'] for _, key, _ in day_updates]
+                    complete = ((processed[actual_key] != "N/A") | processed['cancelled'].astype(bool)).to_numpy()
+                result["still_missing"] += int((~complete).sum())
+                if not complete.any():
+                    continue
+                repaired = processed[complete]
+                with report.stage("patch"):
+                    archived = archive.patch_day(direction, date, repaired)
+                    csv_path = os.path.join(output_path, f"{date.replace('-', '')}_{direction}.csv")
+                    patch_daily_csv(csv_path, direction, repaired)
+                    index.remove(direction, date,
+                                 [flight_id for (flight_id, _, _), done in zip(day_updates, complete) if done])
+                result["repaired"] += int(complete.sum())
+                report.count("archived_rows_patched", archived)
+                if archived:
+                    patched_dates[direction].add(date)
+                print(f"{date} {direction}: repaired {int(complete.sum())} flight(s)")
+
+    if partials_path and os.path.isdir(partials_path):
+        store = PartialStore(partials_path)
+        for direction, dates in patched_dates.items():
+            if not dates or not os.path.exists(store.path(direction)):
+                continue
+            scheduled_key, actual_key = DIRECTION_FIELDS[direction][:2]
+            # Days of compacted months are refolded with the rest of their month
+            dates = sorted(store.refold_dates(direction, dates))
+            with report.stage("refold"):
+                fold_summaries(store, direction, [
+                    summarize(archive.load(direction, METRIC_COLUMNS[direction], start=date, end=date),
+                              scheduled_key, actual_key)
+                    for date in dates
+                ])
+            print(f"Refreshed {direction} partials for {', '.join(dates)}")
+
+    report.count_api(api_before, client.stats())
+    for key, value in result.items():
+        report.count(key, value)
+    if own_client:
+        client.close()
+    return result
+
+
+def main():
+    API_KEY = "123"
+
+    parser = argparse.ArgumentParser(
+        description="Re-fetch flights that were archived without an actual time and patch them in")
+    parser.add_argument('--output-dir', default=os.path.expanduser("~/Documents"),
+                        help="Directory holding the daily CSVs, the archive and the incomplete-flight index")
+    parser.add_argument('--partials-dir', default=DEFAULT_PARTIALS_DIR,
+                        help="Partials store of metrics.py --incremental to refresh for patched days")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Flights requested at once")
+    parser.add_argument('--requests-per-minute', type=float, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help="AeroAPI request budget")
+    args = parser.parse_args()
+
+    report = RunReport("repair").start()
+    result = repair_incomplete(API_KEY, args.output_dir, partials_path=args.partials_dir,
+                               batch_size=args.batch_size, requests_per_minute=args.requests_per_minute,
+                               report=report)
+    print(f"\nChecked {result['checked']} flight(s): {result['repaired']} repaired, "
+          f"{result['still_missing']} still without an actual time, {result['failed']} failed, "
+          f"{result['expired']} expired")
+    print(f"Run report saved to {report.save(args.output_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+from airports import UNKNOWN_AIRPORT, load_airports
+from transform import DIRECTION_FIELDS, TIME_OF_DAY_LABELS, WEEKDAY_LABELS, airport_column, processed_columns
+
+TIME_OF_DAYS = list(TIME_OF_DAY_LABELS)
+WEEKDAYS = list(WEEKDAY_LABELS)
+EPOCH = pd.Timestamp('1970-01-01')
+NA_VALUES = ['N/A', '']
+
+# Compact in-memory dtypes shared by the processor's archive writes and metrics.py
+FLIGHT_DTYPES = {
+    'operator': 'category',
+    'flight_number': 'string',
+    'cancelled': 'bool',
+    'origin_city': 'category',
+    'destination_city': 'category',
+    'scheduled_in': 'Int32',
+    'actual_in': 'Int32',
+    'scheduled_off': 'Int32',
+    'actual_off': 'Int32',
+    'delay': 'Int32',
+    'date': 'category',
+    'day_of_week': pd.CategoricalDtype(WEEKDAYS),
+    'time_of_day': pd.CategoricalDtype(TIME_OF_DAYS),
+    'schengen': 'bool',
+    'origin_airport': 'int16',
+    'destination_airport': 'int16',
+    'source_file': 'category'
+}
+
+
+def to_epoch_minutes(values):
+    """'YYYY-MM-DD HH:MM' strings (or datetimes) to nullable minutes since 1970-01-01 UTC."""
+    values = pd.Series(values).replace("N/A", None)
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.astype('Int32')
+    timestamps = pd.to_datetime(values, format='%Y-%m-%d %H:%M', errors='coerce')
+    return ((timestamps - EPOCH) // pd.Timedelta(minutes=1)).astype('Int32')
+
+
+def typed_frame(df, flight_type):
+    """
+    Typed, compact copy of a processed (or CSV-loaded) flight table.
+
+    "N/A" sentinels and empty cells become nulls, timestamps become epoch
+    minutes, delay a nullable integer, flags booleans, the other airport an
+    airport table id and the repeated text columns categoricals with codes.
+
+    The Schengen flag is recomputed from the airport id and the scheduled
+    day, so rows stored under an older airport table get today's answer.
+    The city is only kept for airports missing from the table; the others
+    are labelled from the table (see city_labels).
+    """
+    columns = processed_columns(flight_type)
+    extra = [col for col in df.columns if col not in columns]
+    df = df.replace("N/A", None)
+    typed = {}
+    for col in columns + extra:
+        dtype = FLIGHT_DTYPES.get(col, 'category')
+        if col == airport_column(flight_type):
+            if col in df or DIRECTION_FIELDS[flight_type][3] in df:
+                typed[col] = airport_ids(df, flight_type)
+            continue
+        if col not in df:
+            continue
+        if col in DIRECTION_FIELDS[flight_type][:2]:
+            typed[col] = to_epoch_minutes(df[col])
+        elif dtype == 'bool':
+            # Booleans arrive as bools from the processor and as "True"/"False" text from CSVs
+            typed[col] = df[col].isin([True, 'True'])
+        elif dtype == 'Int32':
+            typed[col] = pd.to_numeric(df[col]).astype('Int32')
+        else:
+            typed[col] = df[col].astype(dtype)
+    ids = typed.get(airport_column(flight_type))
+    if ids is not None:
+        city_col = DIRECTION_FIELDS[flight_type][3]
+        if city_col in typed:
+            typed[city_col] = df[city_col].where(ids == UNKNOWN_AIRPORT).astype('category')
+        typed['schengen'] = pd.Series(schengen_flags(ids, typed.get(DIRECTION_FIELDS[flight_type][0])),
+                                      index=df.index)
+    return pd.DataFrame(typed, index=df.index)
+
+
+def schengen_flags(ids, scheduled=None):
+    """
+    Whether each flight's other airport was inside the Schengen area on its
+    scheduled day, as transform_flights decides it. Flights without a
+    scheduled time (or when `scheduled` is None) use today's membership.
+
+    Args:
+        ids (array): Airport ids
+        scheduled (array): Scheduled times in epoch minutes, nullable
+
+    Returns:
+        np.ndarray: bool per flight
+    """
+    if scheduled is None:
+        return load_airports().is_schengen(ids)
+    minutes = pd.Series(scheduled).astype('Int64')
+    days = (minutes // (24 * 60)).fillna(np.iinfo(np.int64).max).to_numpy(dtype=np.int64)
+    return load_airports().is_schengen(ids, days)
+
+
+def city_labels(df, flight_type):
+    """
+    City of each flight's other airport for output labels: the airport
+    table's city, or the stored city for airports missing from the table
+    (None when neither is known).
+    """
+    ids = airport_ids(df, flight_type)
+    city_col = DIRECTION_FIELDS[flight_type][3]
+    labels = load_airports().city[ids.to_numpy(dtype=np.int64)]
+    if city_col in df:
+        unknown = (ids == UNKNOWN_AIRPORT).to_numpy()
+        labels[unknown] = df[city_col].astype(object).to_numpy()[unknown]
+    return labels
+
+
+def airport_ids(df, flight_type):
+    """
+    Airport ids of a flight table's other airport. Rows written before the
+    airport table existed have no id; those are resolved from their city.
+    """
+    col = airport_column(flight_type)
+    city_col = DIRECTION_FIELDS[flight_type][3]
+    ids = pd.to_numeric(df[col]) if col in df else pd.Series(np.nan, index=df.index)
+    missing = ids.isna().to_numpy()
+    ids = np.array(ids.fillna(UNKNOWN_AIRPORT), dtype=np.int16)
+    if missing.any() and city_col in df:
+        ids[missing] = load_airports().resolve_cities(df[city_col].to_numpy(dtype=object)[missing])
+    return pd.Series(ids, index=df.index)
+
+
+def direction_of(columns):
+    """'arrivals' or 'departures' depending on which timestamp columns a table has."""
+    return 'arrivals' if 'scheduled_in' in columns else 'departures'
+
+
+def read_flights_csv(path):
+    """
+    Read a daily or merged flight CSV straight into the compact typed schema.
+
+    Both "N/A" and empty cells are treated as missing, so flights without an
+    actual time never count as valid.
+    """
+    df = pd.read_csv(path, dtype=str, na_values=NA_VALUES, keep_default_na=False)
+    return typed_frame(df, direction_of(df.columns))
+
@@ -0,0 +1,105 @@
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class _NeedMore(Exception):
+    pass
+
+
+def iter_array_items(chunks, key, meta=None):
+    """
+    Yield the elements of a top-level JSON array one at a time from a byte stream.
+
+    Parses a document shaped like an AeroAPI page, {"links": ..., "arrivals": [...]},
+    incrementally: only the current element and the unparsed tail of the last
+    chunk are held in memory, so a page of any size is parsed in bounded memory.
+    Every other top-level member (links, num_pages, ...) is decoded whole and
+    stored in `meta`.
+
+    Args:
+        chunks (iterable): Byte (or str) chunks, e.g. response.iter_content()
+        key (str): Name of the top-level array to stream, e.g. 'arrivals'
+        meta (dict): Receives the other top-level members once they are parsed
+
+    Yields:
+        Each element of the array, decoded
+    """
+    meta = {} if meta is None else meta
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    eof = False
+    state = 'start'
+
+    def skip(buf, pos, chars=_WHITESPACE):
+        while pos < len(buf) and buf[pos] in chars:
+            pos += 1
+        return pos
+
+    def decode(buf, pos):
+        # A value that ends exactly at the buffer edge may be a truncated number
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            raise _NeedMore()
+        if end >= len(buf) and not eof:
+            raise _NeedMore()
+        return value, end
+
+    while True:
+        try:
+            if state == 'start':
+                pos = skip(buf, pos)
+                if pos >= len(buf):
+                    raise _NeedMore()
+                if buf[pos] != '{':
+                    raise ValueError(f"Expected a JSON object, found {buf[pos]!r}")
+                pos += 1
+                state = 'member'
+            elif state == 'member':
+                pos = skip(buf, pos, _WHITESPACE + ',')
+                if pos >= len(buf):
+                    raise _NeedMore()
+                if buf[pos] == '}':
+                    return
+                name, end = decode(buf, pos)
+                colon = skip(buf, end)
+                if colon >= len(buf):
+                    raise _NeedMore()
+                if buf[colon] != ':':
+                    raise ValueError(f"Expected ':' after {name!r}")
+                value_start = skip(buf, colon + 1)
+                if value_start >= len(buf):
+                    raise _NeedMore()
+                if name == key and buf[value_start] == '[':
+                    pos = value_start + 1
+                    state = 'items'
+                else:
+                    meta[name], pos = decode(buf, value_start)
+            else:  # items
+                pos = skip(buf, pos, _WHITESPACE + ',')
+                if pos >= len(buf):
+                    raise _NeedMore()
+                if buf[pos] == ']':
+                    pos += 1
+                    state = 'member'
+                    continue
+                item, pos = decode(buf, pos)
+                yield item
+        except _NeedMore:
+            if eof:
+                raise ValueError(f"Truncated JSON while reading {key!r}")
+            buf = buf[pos:]
+            pos = 0
+            try:
+                chunk = next(chunks)
+                buf += utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+            except StopIteration:
+                buf += utf8.decode(b'', final=True)
+                eof = True
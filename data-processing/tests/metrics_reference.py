@@ -0,0 +1,105 @@
+"""
+analyze_flight_data as it was before the single-pass engine in metrics.py,
+kept as the reference for tests/test_metrics.py and the metrics_legacy
+benchmark stage. Each slice filters the whole frame again with boolean
+masks; only the module layout changed (the helpers used to be nested).
+"""
+from datetime import datetime
+
+import pandas as pd
+
+from metrics import DELAY_BUCKETS, analysis_metadata, bucket_delays, round_breakdown
+
+
+def calculate_delay_breakdown(df, scheduled_col, actual_col):
+    """Calculate delay breakdown percentages for valid flights."""
+    valid_flights = df[df[scheduled_col].notna() & df[actual_col].notna()]
+    buckets = bucket_delays(valid_flights['delay'])
+    return round_breakdown([int((buckets == idx).sum()) for idx in range(len(DELAY_BUCKETS))])
+
+
+def analyze_by_time_of_day(df, scheduled_col, actual_col):
+    """Calculate delay breakdown by time of day."""
+    result = {}
+    for time_period in ['Early', 'Morning', 'Afternoon', 'Evening']:
+        period_data = df[df['time_of_day'] == time_period]
+        result[time_period.lower()] = calculate_delay_breakdown(period_data, scheduled_col, actual_col)
+    return result
+
+
+def analyze_weekly_trends(df, scheduled_col, actual_col):
+    """Calculate delay breakdown by ISO week."""
+    df['week'] = pd.to_datetime(df['date']).dt.isocalendar().week
+    weekly_trends = []
+
+    for week in sorted(df['week'].unique()):
+        week_data = df[df['week'] == week]
+        delays = calculate_delay_breakdown(week_data, scheduled_col, actual_col)
+        weekly_trends.append({
+            "week": f"Week {week}",
+            **delays
+        })
+
+    return weekly_trends
+
+
+def analyze_schengen(df, scheduled_col, actual_col):
+    """Calculate delay breakdown by Schengen zone status."""
+    result = {}
+    for is_schengen in [True, False]:
+        schengen_data = df[df['schengen'] == is_schengen]
+        key = "schengen" if is_schengen else "nonSchengen"
+        result[key] = calculate_delay_breakdown(schengen_data, scheduled_col, actual_col)
+    return result
+
+
+def calculate_heatmap_metrics(df, scheduled_col, actual_col):
+    """Calculate average delays by time of day for Schengen and non-Schengen flights."""
+    result = {
+        "schengen": {},
+        "nonSchengen": {}
+    }
+
+    # Filter for valid flights
+    valid_flights = df[df[scheduled_col].notna() & df[actual_col].notna()]
+
+    for is_schengen in [True, False]:
+        key = "schengen" if is_schengen else "nonSchengen"
+        schengen_data = valid_flights[valid_flights['schengen'] == is_schengen]
+
+        for time_period in ['Early', 'Morning', 'Afternoon', 'Evening']:
+            period_data = schengen_data[schengen_data['time_of_day'] == time_period]
+            avg_delay = round(period_data['delay'].mean()) if len(period_data) > 0 else 0
+            result[key][time_period.lower()] = avg_delay
+
+    return result
+
+
+def analyze_direction(df, scheduled_col, actual_col):
+    """Analyze flight data for one direction (arrivals or departures)."""
+    valid_flights = df[df[scheduled_col].notna() & df[actual_col].notna()]
+
+    days_tracked = len(valid_flights['date'].unique())
+    flights_per_day = round(len(valid_flights) / days_tracked) if days_tracked > 0 else 0
+    avg_delay = round(valid_flights['delay'].mean()) if len(valid_flights) > 0 else 0
+
+    return {
+        "flightsPerDay": flights_per_day,
+        "daysTracked": days_tracked,
+        "averageDelay": avg_delay,
+        "delays": calculate_delay_breakdown(df, scheduled_col, actual_col),
+        "timeOfDay": analyze_by_time_of_day(df, scheduled_col, actual_col),
+        "heatmap": calculate_heatmap_metrics(df, scheduled_col, actual_col),
+        "weeklyData": analyze_weekly_trends(df, scheduled_col, actual_col),
+        "schengen": analyze_schengen(df, scheduled_col, actual_col),
+        "lastUpdated": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
+
+
+def analyze_flight_data(arrivals_df, departures_df):
+    """Analyze flight data and generate statistics for both arrivals and departures."""
+    return {
+        "arrivals": analyze_direction(arrivals_df, 'scheduled_in', 'actual_in'),
+        "departures": analyze_direction(departures_df, 'scheduled_off', 'actual_off'),
+        "metadata": analysis_metadata()
+    }
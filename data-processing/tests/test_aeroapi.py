@@ -0,0 +1,77 @@
+import socket
+import time
+
+import pytest
+
+from aeroapi import AeroAPIClient, RateLimiter
+from aeroapi_stub import AeroAPIStub
+from benchmark import generate_day
+
+PATH = "/airports/LPPT/flights/arrivals"
+
+
+def day():
+    return generate_day('2024-05-01', 100)
+
+
+def test_cursors_are_followed_across_requests():
+    payload = day()
+    with AeroAPIStub(payload, page_size=15) as stub:
+        client = AeroAPIClient('key', base_url=stub.base_url, pages_per_request=2)
+        pages = []
+        result = client.fetch_all(PATH, 'arrivals', {'start': 'a', 'end': 'b'},
+                                  on_page=lambda url, body: pages.append(url))
+        streamed = list(client.iter_flights(PATH, 'arrivals', {'start': 'a', 'end': 'b'}))
+        client.close()
+    # 100 flights in pages of 15 are 7 pages, two per request
+    assert result['arrivals'] == payload['arrivals']
+    assert result['num_pages'] == 7
+    assert streamed == payload['arrivals']
+    assert len(pages) == 4 and 'cursor=' not in pages[0] and all('cursor=' in url for url in pages[1:])
+    # The original query is carried along by every next link
+    assert all('start=a' in url for url in pages)
+    assert stub.request_count == 8
+    assert stub.connection_count == 1
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_rate_limited_requests_wait_for_retry_after(stream):
+    payload = day()
+    with AeroAPIStub(payload, rate_limit_hits=2, retry_after="0.2") as stub:
+        limiter = RateLimiter(requests_per_minute=6000, burst=10)
+        client = AeroAPIClient('key', base_url=stub.base_url, max_concurrency=1, pages_per_request=100,
+                               rate_limiter=limiter)
+        start = time.monotonic()
+        if stream:
+            flights = list(client.iter_flights(PATH, 'arrivals'))
+        else:
+            flights = client.fetch_all(PATH, 'arrivals')['arrivals']
+        elapsed = time.monotonic() - start
+        client.close()
+    assert flights == payload['arrivals']
+    # The 429 responses were closed, so their pooled connection was reused
+    assert stub.connection_count == 1
+    assert elapsed >= 0.4
+    assert client.stats()['retries'] == 2
+
+
+def test_gives_up_after_max_retries():
+    with AeroAPIStub(day(), rate_limit_hits=10) as stub:
+        client = AeroAPIClient('key', base_url=stub.base_url, max_retries=2)
+        with pytest.raises(Exception, match="status 429"):
+            client.fetch_all(PATH, 'arrivals')
+        client.close()
+    assert stub.request_count == 3
+
+
+def test_dropped_connections_are_retried():
+    # A port nothing listens on refuses every connection
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    client = AeroAPIClient('key', base_url=f"http://127.0.0.1:{port}/aeroapi", max_retries=2, backoff_base=0.01)
+    with pytest.raises(Exception, match="after 3 attempts"):
+        client.fetch_all(PATH, 'arrivals')
+    client.close()
+    assert client.stats()['requests'] == 3
+    assert client.stats()['retries'] == 2
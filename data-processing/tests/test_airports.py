@@ -0,0 +1,70 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from archive import METRIC_COLUMNS, FlightArchive, archive_schema
+from cube import build_cube, cube_columns
+from schema import read_flights_csv
+
+
+def legacy_rows():
+    """Arrivals as written before airports had ids, with the Schengen flags of the old city dict."""
+    return pd.DataFrame({
+        'operator': ['TAP', 'TAP', 'FZB', 'FZB', 'XYZ'],
+        'flight_number': ['1', '2', '3', '4', '5'],
+        'cancelled': [False] * 5,
+        'origin_city': ['Santa Catarina', 'Santa Catarina', 'Sofia', 'Sofia', 'Nowhere Intl'],
+        'scheduled_in': ['2024-01-10 08:00', '2024-05-10 08:00', '2024-01-10 09:00', '2024-05-10 09:00',
+                         '2024-05-10 10:00'],
+        'actual_in': ['2024-01-10 08:05', '2024-05-10 08:05', '2024-01-10 09:05', '2024-05-10 09:05',
+                      '2024-05-10 10:05'],
+        'delay': ['5'] * 5,
+        'date': ['2024-01-10', '2024-05-10', '2024-01-10', '2024-05-10', '2024-05-10'],
+        'day_of_week': ['Wednesday', 'Friday', 'Wednesday', 'Friday', 'Friday'],
+        'time_of_day': ['Morning'] * 5,
+        'schengen': ['False'] * 5,
+    })
+
+
+def typed_rows(rows, tmp_path):
+    path = tmp_path / "rows.csv"
+    rows.to_csv(path, index=False)
+    return read_flights_csv(str(path))
+
+
+# Madeira is Portugal, Bulgaria joined on 2024-03-31 and unknown airports never count
+EXPECTED = [True, True, False, True, False]
+
+
+def test_old_csv_rows_get_schengen_for_their_day(tmp_path):
+    path = tmp_path / "merged_arrivals.csv"
+    legacy_rows().to_csv(path, index=False)
+    df = read_flights_csv(str(path))
+    assert df['schengen'].tolist() == EXPECTED
+    # Only the airport that is not in the table keeps its city
+    assert df['origin_city'].astype(object).isna().tolist() == [True, True, True, True, False]
+
+
+def test_old_archive_rows_get_ids_and_schengen_at_load(tmp_path):
+    archive = FlightArchive(str(tmp_path / "archive"))
+    legacy = legacy_rows()
+    for date, rows in legacy.groupby('date'):
+        # A partition written before the airport column existed
+        schema = archive_schema('arrivals')
+        schema = schema.remove(schema.get_field_index('origin_airport'))
+        typed = typed_rows(rows, tmp_path).drop(columns=['date', 'origin_airport'])
+        typed['origin_city'] = rows['origin_city'].astype('category').to_numpy()
+        typed['schengen'] = False
+        os.makedirs(archive.partition_path('arrivals', date))
+        pq.write_table(pa.Table.from_pandas(typed, schema=schema, preserve_index=False),
+                       os.path.join(archive.partition_path('arrivals', date), "part-0.parquet"))
+
+    df = archive.load('arrivals', METRIC_COLUMNS['arrivals'] + ['flight_number']).sort_values('flight_number')
+    assert df['schengen'].tolist() == EXPECTED
+    assert (df['origin_airport'] > 0).tolist() == [True, True, True, True, False]
+
+    cube = build_cube(archive.load('arrivals', cube_columns('arrivals')),
+                      archive.load('departures', cube_columns('departures')))
+    assert sorted(cube['city'].unique()) == ['Nowhere Intl', 'Santa Catarina', 'Sofia']
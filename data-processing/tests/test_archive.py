@@ -0,0 +1,99 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from archive import METRIC_COLUMNS, FlightArchive, archive_schema
+from benchmark import generate_day
+from schema import typed_frame
+from transform import transform_flights
+
+DATES = ['2024-05-01', '2024-05-02', '2024-05-03']
+
+
+def processed(date, seed=0, flights_per_day=50):
+    return transform_flights(generate_day(date, flights_per_day, seed)['arrivals'], 'arrivals')
+
+
+def values(df, columns):
+    """Cells as plain Python values, with every kind of missing value as None."""
+    return df[columns].astype(object).where(df[columns].notna(), None).values.tolist()
+
+
+def test_round_trip(tmp_path):
+    archive = FlightArchive(str(tmp_path))
+    days = {date: processed(date) for date in DATES}
+    for date, df in days.items():
+        archive.write_day('arrivals', date, df)
+    assert archive.dates('arrivals') == DATES
+    assert archive.dates('departures') == []
+
+    loaded = archive.load('arrivals')
+    expected = pd.concat([typed_frame(df, 'arrivals') for df in days.values()], ignore_index=True)
+    columns = [col for col in expected.columns if col != 'date']
+    assert list(loaded.columns) == columns + ['date']
+    assert values(loaded, columns) == values(expected, columns)
+    assert loaded['date'].tolist() == expected['date'].astype(str).tolist()
+
+    # Only the requested columns (and the date) come back
+    metrics = archive.load('arrivals', METRIC_COLUMNS['arrivals'])
+    assert list(metrics.columns) == METRIC_COLUMNS['arrivals'] + ['schengen', 'date']
+
+
+def test_load_only_opens_the_selected_days(tmp_path):
+    archive = FlightArchive(str(tmp_path))
+    for date in DATES:
+        archive.write_day('arrivals', date, processed(date))
+    # Days outside the range are never read, so a broken file there does not matter
+    with open(os.path.join(archive.partition_path('arrivals', DATES[0]), "part-0.parquet"), 'wb') as f:
+        f.write(b"not parquet")
+
+    df = archive.load('arrivals', METRIC_COLUMNS['arrivals'], start=DATES[1], end=DATES[1])
+    assert set(df['date']) == {DATES[1]} and len(df) == 50
+    assert set(archive.load('arrivals', ['delay'], start=DATES[1])['date']) == set(DATES[1:])
+    assert archive.load('arrivals', ['delay'], start='2024-06-01').empty
+    with pytest.raises(Exception):
+        archive.load('arrivals', ['delay'])
+
+
+def test_day_writer_replaces_a_day_only_when_it_succeeds(tmp_path):
+    archive = FlightArchive(str(tmp_path))
+    archive.write_day('arrivals', DATES[0], processed(DATES[0]))
+
+    # A failed rewrite leaves the previous partition and no temporary files
+    with pytest.raises(RuntimeError):
+        with archive.day_writer('arrivals', DATES[0]) as writer:
+            writer.write(processed(DATES[0], seed=1, flights_per_day=10))
+            raise RuntimeError("fetch failed")
+    assert os.listdir(archive.direction_path('arrivals')) == [f"date={DATES[0]}"]
+    assert len(archive.load('arrivals')) == 50
+
+    # A writer that got no rows leaves the day untouched
+    with archive.day_writer('arrivals', DATES[0]):
+        pass
+    assert len(archive.load('arrivals')) == 50
+
+    # Batches of a rewrite replace the day instead of adding to it
+    with archive.day_writer('arrivals', DATES[0]) as writer:
+        writer.write(processed(DATES[0], seed=1, flights_per_day=10))
+        writer.write(processed(DATES[0], seed=2, flights_per_day=10))
+    assert len(archive.load('arrivals')) == 20
+
+
+def test_columns_missing_from_older_days_load_as_nulls(tmp_path):
+    archive = FlightArchive(str(tmp_path))
+    archive.write_day('arrivals', DATES[1], processed(DATES[1]))
+    # A day written before day_of_week was archived
+    old = typed_frame(processed(DATES[0]), 'arrivals').drop(columns=['date', 'day_of_week'])
+    schema = archive_schema('arrivals')
+    schema = schema.remove(schema.get_field_index('day_of_week'))
+    os.makedirs(archive.partition_path('arrivals', DATES[0]))
+    pq.write_table(pa.Table.from_pandas(old, schema=schema, preserve_index=False),
+                   os.path.join(archive.partition_path('arrivals', DATES[0]), "part-0.parquet"))
+
+    df = archive.load('arrivals', ['day_of_week', 'delay'])
+    assert df.loc[df['date'] == DATES[0], 'day_of_week'].isna().all()
+    assert df.loc[df['date'] == DATES[1], 'day_of_week'].notna().all()
+    assert df['delay'].notna().sum() > 90
@@ -0,0 +1,94 @@
+import copy
+import os
+
+from aeroapi import AeroAPIClient
+from aeroapi_stub import AeroAPIStub
+from archive import FlightArchive
+from backfill import CHECKPOINT_FILE, BackfillCheckpoint, find_gaps, run_backfill
+from benchmark import generate_day
+from flight_data_processor import FlightDataProcessor
+from transform import DIRECTION_FIELDS
+
+DATES = ['2024-05-01', '2024-05-02', '2024-05-03', '2024-05-04', '2024-05-05']
+
+
+def test_queue_drops_filled_and_expired_dates(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = BackfillCheckpoint(path)
+    checkpoint.queue({'2024-05-01': 'no arrivals', '2024-05-02': 'no arrivals', '2024-05-03': 'no arrivals'},
+                     ['2024-05-01', '2024-05-02', '2024-05-03'])
+    checkpoint.mark('2024-05-01', 'failed', attempts=4, error='timeout')
+    checkpoint.mark('2024-05-03', 'retrying', attempts=1, error='timeout')
+
+    # A day later 05-01 is outside the window and 05-02 was filled by a regular run
+    resumed = BackfillCheckpoint(path)
+    todo = resumed.queue({'2024-05-03': 'no arrivals', '2024-05-04': 'no arrivals'},
+                         ['2024-05-02', '2024-05-03', '2024-05-04'])
+    assert todo == ['2024-05-03', '2024-05-04']
+    assert resumed.state['queued'] == ['2024-05-03', '2024-05-04']
+    assert list(resumed.state['dates']) == ['2024-05-03']
+
+
+def write_day(archive, date, payload):
+    processor = FlightDataProcessor('key', 'LPPT', date)
+    for direction in DIRECTION_FIELDS:
+        archive.write_day(direction, date, processor.process_flights_frame(payload, direction))
+
+
+def fetched_too_early(payload):
+    """The day as fetched before it was over: most flights have no actual time yet."""
+    early = copy.deepcopy(payload)
+    for direction in DIRECTION_FIELDS:
+        actual_key = DIRECTION_FIELDS[direction][1]
+        for flight in early[direction][len(early[direction]) // 3:]:
+            flight[actual_key] = None
+    return early
+
+
+def test_find_gaps(tmp_path):
+    archive = FlightArchive(str(tmp_path))
+    for date in DATES[:4]:
+        write_day(archive, date, generate_day(date, 100))
+    # Departures of one day were never written, another day is a quarter of a typical one
+    archive.write_day('arrivals', DATES[4], FlightDataProcessor('key', 'LPPT', DATES[4])
+                      .process_flights_frame(generate_day(DATES[4], 100), 'arrivals'))
+    write_day(archive, DATES[1], generate_day(DATES[1], 25))
+    write_day(archive, DATES[2], fetched_too_early(generate_day(DATES[2], 100)))
+
+    gaps = find_gaps(archive, DATES + ['2024-05-07'])
+    assert list(gaps) == [DATES[1], DATES[2], DATES[4], '2024-05-07']
+    assert gaps[DATES[1]] == "only 25 arrivals (typical day 100)"
+    assert "have no actual time" in gaps[DATES[2]]
+    assert gaps[DATES[4]] == "no departures"
+    assert gaps['2024-05-07'] == "no arrivals"
+    assert find_gaps(archive, DATES[:1]) == {}
+
+
+def test_run_backfill_fetches_gaps_and_only_trusts_the_archive(tmp_path):
+    archive = FlightArchive(str(tmp_path / "flight-archive"))
+    days = {date: generate_day(date, 100) for date in DATES}
+    for date in DATES[:3]:
+        write_day(archive, date, days[date])
+    # An earlier run claimed 05-04 was done, but it never reached the archive
+    checkpoint = BackfillCheckpoint(str(tmp_path / CHECKPOINT_FILE))
+    checkpoint.queue({DATES[3]: 'no arrivals'}, DATES)
+    checkpoint.mark(DATES[3], 'done', attempts=1)
+    # AeroAPI still has 05-05 in progress
+    served = dict(days, **{DATES[4]: fetched_too_early(days[DATES[4]])})
+
+    with AeroAPIStub({}, days=served) as stub:
+        client = AeroAPIClient('key', base_url=stub.base_url, backoff_base=0)
+        result = run_backfill('key', 'LPPT', str(tmp_path), dates=DATES, backoff_base=0, client=client)
+        assert list(result['gaps']) == DATES[3:]
+        assert result['done'] == [DATES[3]]
+        assert list(result['incomplete']) == [DATES[4]]
+        assert result['failed'] == {}
+        assert BackfillCheckpoint(checkpoint.path).state['dates'][DATES[4]]['status'] == 'incomplete'
+
+        # Once AeroAPI has the whole day, the next run finishes it and clears the checkpoint
+        stub.days = days
+        result = run_backfill('key', 'LPPT', str(tmp_path), dates=DATES, backoff_base=0, client=client)
+        client.close()
+    assert result['done'] == [DATES[4]]
+    assert find_gaps(archive, DATES) == {}
+    assert not os.path.exists(checkpoint.path)
@@ -0,0 +1,54 @@
+import json
+import os
+
+import pandas as pd
+
+from cube import build_cube, operator_shard_name, shard_names, write_cube
+
+
+def flights(dates, operators):
+    return pd.DataFrame({
+        'operator': operators,
+        'origin_city': 'Madrid',
+        'scheduled_in': pd.array(range(len(dates)), dtype='Int32'),
+        'actual_in': pd.array(range(10, len(dates) + 10), dtype='Int32'),
+        'delay': pd.array([10] * len(dates), dtype='Int32'),
+        'time_of_day': 'Morning',
+        'date': dates
+    })
+
+
+def no_departures():
+    return flights([], []).rename(columns={'origin_city': 'destination_city', 'scheduled_in': 'scheduled_off',
+                                           'actual_in': 'actual_off'})
+
+
+def test_weeks_of_different_years_stay_apart():
+    # ISO week 1 of 2024 starts on 2024-01-01, and 2024-12-30 is already week 1 of 2025
+    arrivals = flights(['2024-01-02', '2024-12-31', None], ['TAP', 'TAP', 'TAP'])
+    # Flights without a date have no scheduled time either
+    arrivals.loc[2, 'scheduled_in'] = pd.NA
+    cube = build_cube(arrivals, no_departures())
+    weeks = cube.set_index('week')['valid'].to_dict()
+    assert weeks == {'2024-W01': 1, '2025-W01': 1, 'Unknown': 0}
+
+
+def test_escaped_operator_codes_get_their_own_shard(tmp_path):
+    assert operator_shard_name('TAP') == 'TAP'
+    assert operator_shard_name('A/B') != operator_shard_name('A_B')
+    # Names that only differ in case both get a suffix; the others keep theirs
+    names = shard_names(['EZY', 'ezy', 'TAP', 'A/B'])
+    assert names['TAP'] == 'TAP' and names['A/B'] == operator_shard_name('A/B')
+    assert names['EZY'].startswith('EZY-') and names['ezy'].startswith('ezy-')
+    assert names['EZY'].lower() != names['ezy'].lower()
+    # The suffix comes from the code alone, so it does not depend on which operators are seen first
+    assert shard_names(['ezy', 'EZY']) == {'EZY': names['EZY'], 'ezy': names['ezy']}
+
+    arrivals = flights(['2024-05-01'] * 5, ['A/B', 'A_B', 'TAP', 'EZY', 'ezy'])
+    index_path = write_cube(build_cube(arrivals, no_departures()), str(tmp_path / "cube"))
+    with open(index_path) as f:
+        shards = {entry['operator']: entry['shard'] for entry in json.load(f)['operators']}
+    assert len({shard.lower() for shard in shards.values()}) == 5
+    for operator, shard in shards.items():
+        with open(os.path.join(tmp_path, "cube", "operators", f"{shard}.json")) as f:
+            assert json.load(f)['operator'] == operator
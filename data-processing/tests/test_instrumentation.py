@@ -0,0 +1,23 @@
+import sys
+
+import pytest
+
+from instrumentation import RunReport, process_peak_rss_mb
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="current RSS is read from /proc")
+def test_stages_record_their_own_rss_change():
+    report = RunReport('test')
+    kept = []
+    with report.stage('small'):
+        kept.append(bytearray(1024))
+    for _ in range(2):
+        with report.stage('large'):
+            # Touch every page so it is resident
+            kept.append(bytearray(b'x' * 64 * 1024 ** 2))
+    stages = report.to_dict()['stages']
+    assert stages['large']['calls'] == 2
+    assert stages['large']['rss_change_mb'] >= 120
+    assert 60 <= stages['large']['rss_max_growth_mb'] < 100
+    assert stages['small']['rss_change_mb'] < 5
+    assert stages['large']['process_peak_rss_mb_so_far'] <= process_peak_rss_mb()
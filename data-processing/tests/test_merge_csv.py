@@ -0,0 +1,90 @@
+import csv
+import json
+import os
+
+import pytest
+
+from benchmark import generate_day, load_merge_module
+from transform import csv_records, transform_flights
+
+merge_csv = load_merge_module()
+
+
+def write_day(directory, date, flights_per_day=40, seed=0, flight_type='arrivals'):
+    rows = csv_records(transform_flights(generate_day(date, flights_per_day, seed)[flight_type], flight_type), flight_type)
+    path = os.path.join(directory, f"{date.replace('-', '')}_{flight_type}.csv")
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=rows[0].keys())
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('chunksize', [7, 100000])
+def test_incremental_matches_full_merge(tmp_path, chunksize):
+    daily = tmp_path / "daily"
+    daily.mkdir()
+    for day in range(1, 5):
+        write_day(daily, f"2024-05-0{day}")
+    incremental = str(tmp_path / "incremental.csv")
+    merge_csv.merge_csv_files_incremental(str(daily), '*_arrivals.csv', incremental, chunksize=chunksize)
+
+    # A new day, and a re-fetched day whose rows changed
+    write_day(daily, "2024-05-05")
+    write_day(daily, "2024-05-02", seed=1)
+    merge_csv.merge_csv_files_incremental(str(daily), '*_arrivals.csv', incremental, chunksize=chunksize)
+
+    full = str(tmp_path / "full.csv")
+    merge_csv.merge_csv_files(str(daily), '*_arrivals.csv', full)
+    assert read(incremental) == read(full)
+    assert "N/A" not in read(full)
+
+
+def test_latest_file_wins_duplicates(tmp_path):
+    first = write_day(tmp_path, "2024-05-01", flights_per_day=5)
+    second = write_day(tmp_path, "2024-05-02", flights_per_day=5)
+    lines = read(first).splitlines()
+    # The first flight of day 1 shows up again in day 2 with another actual time
+    header, row = lines[0], lines[1].split(',')
+    row[5] = row[4]
+    with open(second, 'a') as f:
+        f.write(','.join(row) + '\n')
+    output = str(tmp_path / "merged.csv")
+    merge_csv.merge_csv_files(str(tmp_path), '*_arrivals.csv', output)
+    merged = merge_csv.pd.read_csv(output)
+    copies = merged[(merged['flight_number'].astype(str) == row[1]) & (merged['scheduled_in'] == row[4])]
+    assert list(copies['source_file']) == [os.path.basename(second)]
+
+
+def test_unreadable_files_are_retried(tmp_path):
+    write_day(tmp_path, "2024-05-01")
+    broken = tmp_path / "20240502_arrivals.csv"
+    broken.write_text("")
+    output = str(tmp_path / "merged.csv")
+    merge_csv.merge_csv_files_incremental(str(tmp_path), '*_arrivals.csv', output)
+    with open(output + '.manifest.json') as f:
+        manifest = json.load(f)
+    assert "20240501_arrivals.csv" in manifest
+    assert broken.name not in manifest
+
+
+def test_deleted_files_are_dropped(tmp_path):
+    daily = tmp_path / "daily"
+    daily.mkdir()
+    for day in range(1, 4):
+        write_day(daily, f"2024-05-0{day}")
+    incremental = str(tmp_path / "incremental.csv")
+    merge_csv.merge_csv_files_incremental(str(daily), '*_arrivals.csv', incremental)
+
+    os.remove(daily / "20240502_arrivals.csv")
+    merge_csv.merge_csv_files_incremental(str(daily), '*_arrivals.csv', incremental)
+    full = str(tmp_path / "full.csv")
+    merge_csv.merge_csv_files(str(daily), '*_arrivals.csv', full)
+    assert read(incremental) == read(full)
+    with open(incremental + '.manifest.json') as f:
+        assert "20240502_arrivals.csv" not in json.load(f)
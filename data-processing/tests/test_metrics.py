@@ -0,0 +1,33 @@
+import json
+
+import metrics_reference
+from benchmark import benchmark_dates, generate_day
+from metrics import analyze_flight_data
+from schema import typed_frame
+from transform import DIRECTION_FIELDS, transform_flights
+
+
+def history(days, flights_per_day, start):
+    """Typed flights of both directions over `days` synthetic days, as metrics.py loads them."""
+    flights = {direction: [] for direction in DIRECTION_FIELDS}
+    for date in benchmark_dates(days, start):
+        payload = generate_day(date, flights_per_day)
+        for direction in DIRECTION_FIELDS:
+            flights[direction].extend(payload[direction])
+    return [typed_frame(transform_flights(flights[direction], direction), direction) for direction in DIRECTION_FIELDS]
+
+
+def as_json(analysis):
+    """The saved JSON without what only one side has: the run time and the delay percentiles."""
+    for direction in DIRECTION_FIELDS:
+        del analysis[direction]['lastUpdated']
+        analysis[direction].pop('delayPercentiles', None)
+    return json.dumps(analysis, separators=(',', ':'))
+
+
+def test_single_pass_json_matches_the_groupby_reference():
+    # Two and a half years, so ISO week numbers repeat across years
+    arrivals, departures = history(900, 25, '2022-07-01')
+    expected = metrics_reference.analyze_flight_data(arrivals.copy(), departures.copy())
+    assert expected['arrivals']['daysTracked'] == 900
+    assert as_json(analyze_flight_data(arrivals, departures)) == as_json(expected)
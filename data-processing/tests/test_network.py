@@ -0,0 +1,64 @@
+import json
+
+from aeroapi import AeroAPIClient
+from aeroapi_stub import AeroAPIStub
+from archive import METRIC_COLUMNS, FlightArchive
+from benchmark import generate_day
+from instrumentation import RunReport
+from metrics import analyze_flight_data
+from network import airport_archive_path, airport_dir, run_network
+from partials import DEFAULT_PARTIALS_DIR, PartialStore
+
+AIRPORTS = {'LPPT': 'LIS', 'LPPR': 'OPO'}
+DATES = ['2024-05-01', '2024-05-02']
+
+
+def run(days, dates, output_root):
+    with AeroAPIStub({}, days=days) as stub:
+        client = AeroAPIClient('key', base_url=stub.base_url, backoff_base=0)
+        report = RunReport('network')
+        results = run_network('key', list(AIRPORTS), dates, str(output_root), client=client, workers=2,
+                              report=report)
+        client.close()
+    return results, report
+
+
+def full_analysis(output_root, code):
+    """What the metrics step used to do: analyze the airport's whole archive partition."""
+    archive = FlightArchive(airport_archive_path(str(output_root), code))
+    result = analyze_flight_data(archive.load('arrivals', METRIC_COLUMNS['arrivals']),
+                                 archive.load('departures', METRIC_COLUMNS['departures']),
+                                 AIRPORTS[code], 'Europe/Lisbon')
+    return without_run_time(result)
+
+
+def without_run_time(analysis):
+    for direction in ['arrivals', 'departures']:
+        del analysis[direction]['lastUpdated']
+    return analysis
+
+
+def test_two_airports_match_a_full_archive_analysis(tmp_path):
+    days = {date: generate_day(date, 80) for date in DATES}
+    results, _ = run(days, DATES, tmp_path)
+    for code in AIRPORTS:
+        assert results[code]['failed_dates'] == []
+        with open(results[code]['output']) as f:
+            analysis = without_run_time(json.load(f))
+        assert analysis['metadata']['airport'] == AIRPORTS[code]
+        assert analysis['arrivals']['daysTracked'] == 2
+        assert analysis == full_analysis(tmp_path, code)
+
+    # A re-fetched day is refolded, and the day before it is not read again
+    days[DATES[1]] = generate_day(DATES[1], 120, seed=1)
+    results, report = run(days, DATES[1:], tmp_path)
+    # One day per direction and airport
+    assert report.to_dict()['stages']['metrics']['folded_days'] == 4
+    for code in AIRPORTS:
+        with open(results[code]['output']) as f:
+            analysis = without_run_time(json.load(f))
+        assert analysis == full_analysis(tmp_path, code)
+        store = PartialStore(f"{airport_dir(str(tmp_path), code)}/{DEFAULT_PARTIALS_DIR}")
+        assert store.dates('arrivals') == set(DATES)
+        partials = store.load('arrivals')
+        assert partials.loc[partials['date'] == DATES[1], 'rows'].sum() == 120
@@ -0,0 +1,85 @@
+import json
+
+import pandas as pd
+
+from archive import METRIC_COLUMNS, FlightArchive
+from benchmark import benchmark_dates, generate_day, load_merge_module
+from flight_data_processor import FlightDataProcessor
+from instrumentation import RunReport
+from metrics import analyze_flight_data, analyze_flight_data_from_partials
+from partials import PartialStore, month_partitions, summarize, summarize_archive, update_partials
+from schema import read_flights_csv
+from transform import DIRECTION_FIELDS
+
+merge_csv = load_merge_module()
+
+
+def write_day(directory, date, seed=0):
+    processor = FlightDataProcessor('key', 'LPPT', date, output_path=str(directory))
+    payload = generate_day(date, 60, seed)
+    for direction in DIRECTION_FIELDS:
+        processor.save_csv(processor.process_flights(payload, direction), f"{direction}.csv")
+
+
+def as_json(analysis):
+    for direction in DIRECTION_FIELDS:
+        del analysis[direction]['lastUpdated']
+    return json.dumps(analysis, separators=(',', ':'))
+
+
+def test_incremental_json_matches_full_run(tmp_path):
+    daily = tmp_path / "daily"
+    daily.mkdir()
+    store = PartialStore(str(tmp_path / "partials"))
+    dates = benchmark_dates(45, start='2024-04-10')
+
+    def fold(refresh_dates=()):
+        return {direction: update_partials(store, str(daily), direction, *DIRECTION_FIELDS[direction][:2],
+                                           refresh_dates=refresh_dates)
+                for direction in DIRECTION_FIELDS}
+
+    # Nightly runs fold whatever days are new since the last one
+    for batch in [dates[:10], dates[10:11], dates[11:]]:
+        for date in batch:
+            write_day(daily, date)
+        assert fold()['arrivals'] == batch
+    # A folded day is re-fetched with other flights and refreshed
+    write_day(daily, dates[3], seed=1)
+    assert fold()['arrivals'] == []
+    assert fold(refresh_dates=[dates[3]])['arrivals'] == [dates[3]]
+
+    incremental = analyze_flight_data_from_partials(
+        store.load('arrivals'), store.load('departures'),
+        arrivals_sketches=store.load_sketches('arrivals'), departures_sketches=store.load_sketches('departures'))
+
+    merged = {}
+    for direction in DIRECTION_FIELDS:
+        merged[direction] = str(tmp_path / f"merged_{direction}.csv")
+        merge_csv.merge_csv_files(str(daily), f"*_{direction}.csv", merged[direction])
+    full = analyze_flight_data(read_flights_csv(merged['arrivals']), read_flights_csv(merged['departures']))
+
+    assert full['arrivals']['daysTracked'] == 45
+    assert as_json(incremental) == as_json(full)
+
+
+def test_parallel_archive_summary_matches_a_single_pass(tmp_path):
+    archive = FlightArchive(str(tmp_path / "flight-archive"))
+    # Every third day from late January to mid April, so months differ in length and some are partial
+    dates = benchmark_dates(80, start='2024-01-25')[::3]
+    for date in dates:
+        processor = FlightDataProcessor('key', 'LPPT', date)
+        payload = generate_day(date, 40)
+        for direction in DIRECTION_FIELDS:
+            archive.write_day(direction, date, processor.process_flights_frame(payload, direction))
+    assert len(month_partitions(dates)) == 4
+
+    report = RunReport('test')
+    summaries = summarize_archive(archive, workers=2, report=report)
+    assert report.to_dict()['stages']['map']['calls'] == 8
+    for direction in DIRECTION_FIELDS:
+        scheduled_col, actual_col = DIRECTION_FIELDS[direction][:2]
+        expected = summarize(archive.load(direction, METRIC_COLUMNS[direction]), scheduled_col, actual_col)
+        for merged, single in zip(summaries[direction], expected):
+            assert len(merged) > 0
+            pd.testing.assert_frame_equal(merged.reset_index(drop=True), single.reset_index(drop=True),
+                                          check_categorical=False)
@@ -0,0 +1,33 @@
+import copy
+
+from publish import assemble, manifest_shard_keys, plan_upload
+
+
+def analysis(on_time):
+    direction = {"averageDelay": 12, "heatmap": {"schengen": {"morning": 10}},
+                 "weeklyData": [{"week": "Week 1", "onTime": on_time}], "lastUpdated": "2024-05-01T00:00:00Z"}
+    return {"metadata": {"airport": "LIS"}, "arrivals": direction, "departures": copy.deepcopy(direction)}
+
+
+def test_shards_are_deleted_one_publish_late():
+    kv = {}
+
+    def publish(data, previous):
+        plan = plan_upload(data, 'airport_data', previous)
+        kv.update({item["key"]: item["value"] for item in plan["put"]})
+        for key in plan["delete"]:
+            del kv[key]
+        assert assemble(plan["manifest"], kv) == data
+        return plan
+
+    first = publish(analysis(50), None)
+    second = publish(analysis(60), first["manifest"])
+    dropped = manifest_shard_keys(first["manifest"]) - manifest_shard_keys(second["manifest"])
+    assert dropped and second["delete"] == []
+    # A reader that cached the first manifest can still assemble it
+    assert assemble(first["manifest"], kv) == analysis(50)
+
+    third = publish(analysis(70), second["manifest"])
+    assert set(third["delete"]) == dropped
+    assert set(kv) - {'airport_data:manifest'} == (manifest_shard_keys(second["manifest"])
+                                                   | manifest_shard_keys(third["manifest"]))
@@ -0,0 +1,47 @@
+import json
+import os
+import random
+
+from raw_cache import RawPageCache
+
+
+def page(seed, size=4000):
+    # Random bytes do not compress, so every page takes about `size` bytes on disk
+    return random.Random(seed).randbytes(size)
+
+
+def test_index_is_written_on_flush(tmp_path):
+    cache = RawPageCache(str(tmp_path))
+    cache.put('LPPT', 'arrivals', '2024-05-01', '', b'{"arrivals": []}')
+    assert not os.path.exists(cache.index_path)
+    cache.flush()
+    assert RawPageCache(str(tmp_path)).get('LPPT', 'arrivals', '2024-05-01', '') == b'{"arrivals": []}'
+
+
+def test_evicts_whole_days_least_recently_used_first(tmp_path):
+    cache = RawPageCache(str(tmp_path), max_bytes=26000)
+    for day in range(1, 4):
+        if day == 3:
+            # Day 1 was read after day 2 was stored, so day 2 is the oldest
+            cache.get('LPPT', 'arrivals', '2024-05-01', '')
+        for cursor in ('', 'a', 'b'):
+            cache.put('LPPT', 'arrivals', f'2024-05-0{day}', cursor, page(f'{day}{cursor}'))
+    assert cache.dates('LPPT', 'arrivals') == ['2024-05-01', '2024-05-03']
+    assert cache.total_bytes() <= cache.max_bytes
+    cache.close()
+    with open(cache.index_path) as f:
+        assert {key.rsplit('/', 1)[0] for key in json.load(f)} == {'LPPT/arrivals/2024-05-01',
+                                                                  'LPPT/arrivals/2024-05-03'}
+
+
+def test_shared_pages_are_kept_until_unused(tmp_path):
+    cache = RawPageCache(str(tmp_path), max_bytes=10000)
+    shared = page('shared')
+    cache.put('LPPT', 'arrivals', '2024-05-01', '', shared)
+    cache.put('LPPT', 'departures', '2024-05-01', '', shared)
+    assert cache.total_bytes() < 5000
+    # A new day pushes the cache over budget; the shared page goes only once both days using it are evicted
+    cache.put('LPPT', 'arrivals', '2024-05-02', '', page('new', 8000))
+    assert cache.get('LPPT', 'departures', '2024-05-01', '') is None
+    objects = [name for _, _, names in os.walk(os.path.join(str(tmp_path), 'objects')) for name in names]
+    assert len(objects) == 1
@@ -0,0 +1,88 @@
+import copy
+from datetime import date
+
+import pandas as pd
+
+from aeroapi import AeroAPIClient
+from aeroapi_stub import AeroAPIStub
+from archive import METRIC_COLUMNS, FlightArchive
+from benchmark import generate_day
+from flight_data_processor import FlightDataProcessor
+from metrics import compute_partials
+from partials import PartialStore, update_partials_from_archive
+from repair import IncompleteFlightIndex, repair_incomplete
+from transform import DIRECTION_FIELDS
+
+DATE = '2024-05-01'
+
+
+def late_day():
+    """A day where some flights have no actual time yet, one of them with no operator and one listed twice."""
+    payload = generate_day(DATE, 300)
+    arrivals = payload['arrivals']
+    late = [flight for flight in arrivals if flight['actual_in'] is None and not flight['cancelled']]
+    late[0]['operator'] = None
+    # Same operator, number and scheduled time under another FlightAware id
+    duplicate = copy.deepcopy(late[1])
+    duplicate['fa_flight_id'] += '-dup'
+    arrivals.append(duplicate)
+    return payload
+
+
+def landed(payload, keep_missing=()):
+    fixed = copy.deepcopy(payload)
+    for direction in ['arrivals', 'departures']:
+        scheduled_key, actual_key = DIRECTION_FIELDS[direction][:2]
+        for flight in fixed[direction]:
+            if flight[actual_key] is None and not flight['cancelled'] and flight['fa_flight_id'] not in keep_missing:
+                flight[actual_key] = flight[scheduled_key]
+    return fixed
+
+
+def process(payload, output_path):
+    output_path.mkdir()
+    processor = FlightDataProcessor('key', 'LPPT', DATE, output_path=str(output_path))
+    processor.process_fetched({direction: {direction: payload[direction]} for direction in ['arrivals', 'departures']})
+    return processor
+
+
+def test_repair_patches_csv_archive_and_partials(tmp_path):
+    payload = late_day()
+    processor = process(payload, tmp_path / "run")
+    archive = FlightArchive(processor.archive_path)
+    store = PartialStore(str(tmp_path / "partials"))
+    for direction in ['arrivals', 'departures']:
+        update_partials_from_archive(store, archive, direction, *DIRECTION_FIELDS[direction][:2])
+    index = IncompleteFlightIndex(processor.incomplete_path)
+    pending = [flight_id for day in index.days() for flight_id in index.load_day(*day)]
+    assert len(pending) > 3
+
+    # Every late flight has landed since, except one departure that is still in the air
+    still_missing = next(flight_id for flight_id in pending if flight_id in
+                         {flight['fa_flight_id'] for flight in payload['departures']})
+    fixed = landed(payload, keep_missing={still_missing})
+    with AeroAPIStub({direction: fixed[direction] for direction in ['arrivals', 'departures']}) as stub:
+        client = AeroAPIClient('key', base_url=stub.base_url, backoff_base=0.01)
+        result = repair_incomplete('key', processor.output_path, partials_path=store.root, batch_size=4,
+                                   client=client, today=date(2024, 5, 5))
+        client.close()
+    assert result['checked'] == len(pending)
+    assert result['repaired'] == len(pending) - 1
+    assert result['still_missing'] == 1
+    assert [flight_id for day in index.days() for flight_id in index.load_day(*day)] == [still_missing]
+
+    # The patched outputs match processing the day after the flights landed
+    expected = process(landed(payload, keep_missing={still_missing}), tmp_path / "expected")
+    expected_archive = FlightArchive(expected.archive_path)
+    for direction in ['arrivals', 'departures']:
+        scheduled_key, actual_key = DIRECTION_FIELDS[direction][:2]
+        csv_name = f"{DATE.replace('-', '')}_{direction}.csv"
+        patched_csv = pd.read_csv(f"{processor.output_path}/{csv_name}", dtype=str, keep_default_na=False)
+        expected_csv = pd.read_csv(f"{expected.output_path}/{csv_name}", dtype=str, keep_default_na=False)
+        pd.testing.assert_frame_equal(patched_csv, expected_csv)
+        pd.testing.assert_frame_equal(archive.load(direction), expected_archive.load(direction))
+        pd.testing.assert_frame_equal(
+            store.load(direction).reset_index(drop=True),
+            compute_partials(expected_archive.load(direction, METRIC_COLUMNS[direction]), scheduled_key, actual_key)
+            .reset_index(drop=True),
+            check_dtype=False, check_categorical=False)
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from benchmark import benchmark_dates, generate_day
+from flight_data_processor import FlightDataProcessor
+from schema import read_flights_csv
+from transform import DIRECTION_FIELDS
+
+
+def write_csv(tmp_path, flight_type, dates, flights_per_day=300):
+    """Daily CSVs of `dates` concatenated into one file, as merge-csv.py writes them."""
+    rows = []
+    for date in dates:
+        processor = FlightDataProcessor('key', 'LPPT', date, output_path=str(tmp_path))
+        rows += processor.process_flights(generate_day(date, flights_per_day), flight_type)
+    path = tmp_path / f"merged_{flight_type}.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path, rows
+
+
+@pytest.mark.parametrize('flight_type', ['arrivals', 'departures'])
+def test_missing_times_are_excluded_like_the_old_reader(tmp_path, flight_type):
+    scheduled_col, actual_col = DIRECTION_FIELDS[flight_type][:2]
+    _, rows = write_csv(tmp_path, flight_type, ['2024-05-01'])
+    # Older merged files have empty cells where the daily CSVs write N/A
+    for row in rows[::7]:
+        row[actual_col] = ''
+    for row in rows[3::11]:
+        row[scheduled_col] = 'N/A'
+    path = tmp_path / "mixed.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    assert any(row[actual_col] == 'N/A' for row in rows)
+
+    # metrics.py used to read the CSV with pandas' defaults and filter with notna()
+    old = pd.read_csv(path)
+    old_valid = old[old[scheduled_col].notna() & old[actual_col].notna()]
+    df = read_flights_csv(path)
+    valid = df[df[scheduled_col].notna() & df[actual_col].notna()]
+    assert 0 < len(valid) < len(df)
+    assert valid.index.tolist() == old_valid.index.tolist()
+    assert valid['delay'].astype(int).tolist() == old_valid['delay'].astype(int).tolist()
+
+
+def test_typed_frame_uses_a_third_of_the_memory_per_row(tmp_path):
+    path, _ = write_csv(tmp_path, 'arrivals', benchmark_dates(30))
+    old = pd.read_csv(path)
+    df = read_flights_csv(path)
+    assert len(df) == len(old) == 9000
+    old_bytes = old.memory_usage(deep=True).sum() / len(old)
+    typed_bytes = df.memory_usage(deep=True).sum() / len(df)
+    # About 36 against 142 bytes per row (and 708 with the object columns older pandas read into)
+    assert typed_bytes < old_bytes / 3
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics import PERCENTILES, TIME_PERIODS, analyze_percentiles, compute_delay_sketches, sketch_percentiles
+from partials import PartialStore, summarize
+
+
+def flights(dates, per_day=40, seed=0):
+    """Synthetic arrivals with a long-tailed delay distribution, a few early and a few without an actual time."""
+    rng = np.random.default_rng(seed)
+    n = len(dates) * per_day
+    delay = (rng.exponential(14, n) - rng.integers(0, 15, n)).astype(int)
+    scheduled = rng.integers(0, 10 ** 6, n)
+    landed = rng.random(n) >= 0.02
+    return pd.DataFrame({
+        'scheduled_in': pd.array(scheduled, dtype='Int32'),
+        'actual_in': pd.Series(scheduled + delay, dtype='Int32').where(landed),
+        'delay': pd.Series(delay, dtype='Int32').where(landed),
+        'date': np.repeat(dates, per_day),
+        'time_of_day': rng.choice(TIME_PERIODS, n),
+        'schengen': rng.random(n) < 0.6,
+    })
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sketch_percentiles_match_numpy(seed):
+    df = flights([f'2024-05-{day:02d}' for day in range(1, 31)], seed=seed)
+    sketches = compute_delay_sketches(df, 'scheduled_in', 'actual_in')
+    delays = df['delay'].dropna().to_numpy(dtype=float)
+    np.testing.assert_allclose(sketch_percentiles(sketches), np.percentile(delays, PERCENTILES))
+    # Any slice of the cells, merged, matches numpy on the same flights
+    evening = df[(df['time_of_day'] == 'Evening') & df['date'].between('2024-05-10', '2024-05-16')]
+    cells = sketches[(sketches['time_of_day'] == 'Evening') & sketches['date'].between('2024-05-10', '2024-05-16')]
+    np.testing.assert_allclose(sketch_percentiles(cells),
+                               np.percentile(evening['delay'].dropna().to_numpy(dtype=float), PERCENTILES))
+
+
+def test_compacted_store_matches_daily_sketches(tmp_path):
+    dates = [day.strftime('%Y-%m-%d') for day in pd.date_range('2023-11-20', '2024-06-30')]
+    df = flights(dates, per_day=100)
+    store = PartialStore(str(tmp_path))
+    # Folded a month at a time like nightly runs, then one old day is refreshed with other flights
+    for month, rows in df.groupby(df['date'].str[:7]):
+        partials, sketches = summarize(rows, 'scheduled_in', 'actual_in')
+        store.fold('arrivals', partials, sketches)
+    assert '2024-01' in store.compacted_months('arrivals')
+    refreshed = flights(['2024-01-10'], per_day=100, seed=1)
+    df = pd.concat([df[df['date'] != '2024-01-10'], refreshed], ignore_index=True)
+    with pytest.raises(Exception):
+        store.fold('arrivals', *summarize(refreshed, 'scheduled_in', 'actual_in'))
+    refold = sorted(store.refold_dates('arrivals', ['2024-01-10']))
+    assert len(refold) == 31
+    store.fold('arrivals', *summarize(df[df['date'].isin(refold)], 'scheduled_in', 'actual_in'))
+
+    stored = store.load_sketches('arrivals')
+    daily = compute_delay_sketches(df, 'scheduled_in', 'actual_in')
+    assert len(stored) < 0.8 * len(daily)
+    assert analyze_percentiles(stored) == analyze_percentiles(daily)
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from aeroapi import AeroAPIClient
+from aeroapi_stub import AeroAPIStub
+from archive import FlightArchive
+from benchmark import generate_day
+from flight_data_processor import FlightDataProcessor
+from repair import IncompleteFlightIndex
+from test_transform import edge_flights
+from transform import DIRECTION_FIELDS
+
+DATE = '2024-03-31'
+
+
+def test_streaming_writes_the_same_outputs_as_process_all(tmp_path):
+    payload = generate_day(DATE, 700)
+    for direction in DIRECTION_FIELDS:
+        payload[direction] += edge_flights(direction)
+
+    processors = {}
+    with AeroAPIStub(payload) as stub:
+        client = AeroAPIClient('key', base_url=stub.base_url, backoff_base=0)
+        for mode in ['batch', 'stream']:
+            processors[mode] = FlightDataProcessor('key', 'LPPT', DATE, client=client,
+                                                   output_path=str(tmp_path / mode))
+        processors['batch'].process_all()
+        processors['stream'].get_cache()
+        for direction in DIRECTION_FIELDS:
+            # Batches much smaller than the day, and not a multiple of the page size
+            processors['stream'].process_streaming(direction, batch_size=64)
+        client.close()
+
+    batch, stream = processors['batch'], processors['stream']
+    for direction in DIRECTION_FIELDS:
+        csv_name = f"{DATE.replace('-', '')}_{direction}.csv"
+        with open(f"{batch.output_path}/{csv_name}", 'rb') as expected, \
+                open(f"{stream.output_path}/{csv_name}", 'rb') as streamed:
+            assert streamed.read() == expected.read()
+        # Row groups of a streamed day each have their own dictionary, so only the values are compared
+        pd.testing.assert_frame_equal(FlightArchive(stream.archive_path).load(direction),
+                                      FlightArchive(batch.archive_path).load(direction), check_categorical=False)
+        assert (IncompleteFlightIndex(stream.incomplete_path).load_day(direction, DATE)
+                == IncompleteFlightIndex(batch.incomplete_path).load_day(direction, DATE))
+    assert stream.report.counters['arrivals_rows'] == len(payload['arrivals'])
@@ -0,0 +1,137 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from airports import load_airports
+from benchmark import generate_day
+from flight_data_processor import FlightDataProcessor
+from transform import DIRECTION_FIELDS, airport_column, output_columns, processed_columns, records, transform_flights
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+# Reference: the original per-flight processing transform_flights replaced
+def format_datetime(dt_str):
+    if not dt_str:
+        return "N/A"
+    dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
+    return dt.strftime('%Y-%m-%d %H:%M')
+
+
+def get_time_of_day(datetime_str):
+    if datetime_str == "N/A":
+        return "N/A"
+    hour = datetime.strptime(datetime_str, '%Y-%m-%d %H:%M').hour
+    if 0 <= hour < 6:
+        return "Early"
+    elif 6 <= hour < 12:
+        return "Morning"
+    elif 12 <= hour < 18:
+        return "Afternoon"
+    else:
+        return "Evening"
+
+
+def calculate_delay(scheduled_str, actual_str):
+    if scheduled_str == "N/A" or actual_str == "N/A":
+        return "N/A"
+    scheduled = datetime.strptime(scheduled_str, '%Y-%m-%d %H:%M')
+    actual = datetime.strptime(actual_str, '%Y-%m-%d %H:%M')
+    return round((actual - scheduled).total_seconds() / 60)
+
+
+def extract_date(datetime_str):
+    if datetime_str == "N/A":
+        return "N/A"
+    return datetime.strptime(datetime_str, '%Y-%m-%d %H:%M').strftime('%Y-%m-%d')
+
+
+def get_day_of_week(datetime_str):
+    if datetime_str == "N/A":
+        return "N/A"
+    return datetime.strptime(datetime_str, '%Y-%m-%d %H:%M').strftime('%A')
+
+
+def reference_row(flight, flight_type):
+    scheduled_key, actual_key, place_key, city_col = DIRECTION_FIELDS[flight_type]
+    airports = load_airports()
+    place = flight.get(place_key) or {}
+    city = place.get('city', 'N/A')
+    scheduled = format_datetime(flight.get(scheduled_key))
+    actual = format_datetime(flight.get(actual_key))
+    airport_id = int(airports.resolve([place.get('code_icao') or place.get('code') or place.get('code_iata')],
+                                      [city])[0])
+    day = None
+    if scheduled != "N/A":
+        day = (datetime.strptime(scheduled[:10], '%Y-%m-%d') - datetime(1970, 1, 1)).days
+    return {
+        'operator': flight.get('operator', 'N/A'),
+        'flight_number': flight.get('flight_number', 'N/A'),
+        'cancelled': flight.get('cancelled', False),
+        city_col: city,
+        scheduled_key: scheduled,
+        actual_key: actual,
+        'delay': calculate_delay(scheduled, actual),
+        'date': extract_date(scheduled),
+        'day_of_week': get_day_of_week(scheduled),
+        'time_of_day': get_time_of_day(scheduled),
+        'schengen': bool(airports.is_schengen([airport_id], None if day is None else [day])[0]),
+        airport_column(flight_type): airport_id
+    }
+
+
+def edge_flights(flight_type):
+    scheduled_key, actual_key, place_key, _ = DIRECTION_FIELDS[flight_type]
+    return [
+        # No actual time yet
+        {'operator': 'TAP', 'flight_number': '1', place_key: {'code': 'LPMA', 'city': 'Santa Catarina'},
+         scheduled_key: '2024-03-30T23:59:00Z', actual_key: None},
+        # No scheduled time, no place, no operator
+        {'flight_number': '2', scheduled_key: None, actual_key: '2024-04-01T10:00:00Z'},
+        # Schengen membership changes on the day of the flight
+        {'operator': 'BUL', 'flight_number': '3', place_key: {'code_icao': 'LBSF', 'city': 'Sofia'},
+         scheduled_key: '2024-03-30T23:59:00Z', actual_key: '2024-03-31T00:10:00Z'},
+        {'operator': 'BUL', 'flight_number': '4', place_key: {'code_icao': 'LBSF', 'city': 'Sofia'},
+         scheduled_key: '2024-03-31T00:00:00Z', actual_key: '2024-03-31T00:10:00Z'},
+        # Only a city, and an airport missing from the table
+        {'operator': 'RYR', 'flight_number': '5', place_key: {'city': 'Orly (near Paris)'},
+         scheduled_key: '2024-04-01T18:00:00Z', actual_key: '2024-04-01T17:31:00Z', 'cancelled': True},
+        {'operator': 'RYR', 'flight_number': '6', place_key: {'code': 'XXXX', 'city': 'Nowhere'},
+         scheduled_key: '2024-04-01T05:59:00Z', actual_key: '2024-04-01T06:00:30Z'},
+    ]
+
+
+@pytest.mark.parametrize('flight_type', ['arrivals', 'departures'])
+def test_transform_matches_per_flight_reference(flight_type):
+    flights = generate_day('2024-03-31', 5000)[flight_type] + edge_flights(flight_type)
+    df = transform_flights(flights, flight_type)
+    assert list(df.columns) == processed_columns(flight_type)
+    assert records(df) == [reference_row(flight, flight_type) for flight in flights]
+
+
+@pytest.mark.parametrize('flight_type', ['arrivals', 'departures'])
+def test_daily_csv_matches_frozen_legacy_output(tmp_path, flight_type):
+    """
+    tests/data/legacy_20240331_*.csv were written by the original processor
+    (before the batch transform) from generate_day('2024-03-31', 300). The
+    only intended difference is Madeira, which the old city dict had outside
+    the Schengen area.
+    """
+    with open(os.path.join(DATA_DIR, f"legacy_20240331_{flight_type}.csv"), newline='') as f:
+        legacy = f.read()
+    expected = ''.join(line.replace(',False\r\n', ',True\r\n') if ',Santa Catarina,' in line else line
+                       for line in legacy.splitlines(keepends=True))
+    assert expected != legacy
+
+    processor = FlightDataProcessor('key', 'LPPT', '2024-03-31', output_path=str(tmp_path))
+    path = processor.save_csv(processor.process_flights(generate_day('2024-03-31', 300), flight_type),
+                              f"{flight_type}.csv")
+    with open(path, newline='') as f:
+        assert f.read() == expected
+
+
+def test_transform_empty():
+    df = transform_flights([], 'arrivals')
+    assert df.empty
+    assert list(df.columns) == processed_columns('arrivals')
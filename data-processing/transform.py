@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from airports import load_airports
+
+TIME_OF_DAY_EDGES = [6, 12, 18]
+TIME_OF_DAY_LABELS = np.array(['Early', 'Morning', 'Afternoon', 'Evening'], dtype=object)
+WEEKDAY_LABELS = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+                           'Saturday', 'Sunday'], dtype=object)
+
+# Per-direction field mapping: (scheduled key, actual key, place key, city column)
+DIRECTION_FIELDS = {
+    'arrivals': ('scheduled_in', 'actual_in', 'origin', 'origin_city'),
+    'departures': ('scheduled_off', 'actual_off', 'destination', 'destination_city')
+}
+
+
+def airport_column(flight_type):
+    """Column holding the airports.py id of the other airport ('origin_airport' or 'destination_airport')."""
+    return f"{DIRECTION_FIELDS[flight_type][2]}_airport"
+
+
+def output_columns(flight_type):
+    """CSV column order produced for a direction, matching the daily CSV schema."""
+    scheduled_key, actual_key, _, city_col = DIRECTION_FIELDS[flight_type]
+    return ['operator', 'flight_number', 'cancelled', city_col, scheduled_key, actual_key,
+            'delay', 'date', 'day_of_week', 'time_of_day', 'schengen']
+
+
+def processed_columns(flight_type):
+    """Columns of a processed table: the daily CSV columns plus the airport id, which only the archive keeps."""
+    return output_columns(flight_type) + [airport_column(flight_type)]
+
+
+def _with_sentinel(values, mask):
+    """Object array of `values` where `mask` holds and "N/A" elsewhere."""
+    out = np.full(len(mask), "N/A", dtype=object)
+    out[mask] = values[mask]
+    return out
+
+
+def _parse_minutes(values):
+    """Parse ISO-8601 strings (None for missing) to naive UTC datetime64[m], NaT when absent."""
+    # AeroAPI sends "...Z" timestamps; NumPy parses those directly once the suffix is dropped
+    if all(value is None or value.endswith('Z') for value in values):
+        try:
+            stripped = [value[:-1] if value is not None else 'NaT' for value in values]
+            return np.array(stripped, dtype='datetime64[s]').astype('datetime64[m]')
+        except ValueError:
+            pass
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), utc=True, format='ISO8601', errors='coerce')
+    return parsed.dt.tz_localize(None).to_numpy().astype('datetime64[m]')
+
+
+def _format_minutes(values):
+    """Format datetime64[m] values as 'YYYY-MM-DD HH:MM' strings."""
+    return np.char.replace(np.datetime_as_string(values, unit='m'), 'T', ' ').astype(object)
+
+
+def records(df):
+    """Rows of `df` as plain dicts holding the original Python values."""
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in zip(*(df[col].tolist() for col in columns))]
+
+
+def csv_records(df, flight_type):
+    """Rows of a processed table as daily CSV dicts, without the archive's airport id."""
+    return records(df[output_columns(flight_type)])
+
+
+def transform_flights(flights, flight_type, airports=None):
+    """
+    Turn a list of AeroAPI flight dicts into the processed daily table in one batch.
+
+    The flight dicts are read once into columns; timestamps are parsed a single
+    time and delay, date, weekday, time-of-day bucket and Schengen flag are all
+    derived from the parsed arrays. Values and column order match the original
+    per-flight processing (kept as the reference in tests/test_transform.py),
+    including "N/A" sentinels for missing timestamps. AeroAPI timestamps are UTC ("Z"), so they are
+    normalised to UTC before formatting.
+
+    The other airport is resolved by its code to an airport table id
+    (by city name when the flight has no code), and the Schengen flag is
+    that airport's membership on the scheduled day. Airports missing from
+    the table get UNKNOWN_AIRPORT and count as outside the Schengen area.
+
+    Args:
+        flights (list): Flight dicts from the AeroAPI `arrivals` or `departures` list
+        flight_type (str): 'arrivals' or 'departures'
+        airports (AirportTable): Airport table (defaults to the packaged one)
+
+    Returns:
+        pd.DataFrame: One row per flight, columns as in processed_columns(flight_type)
+    """
+    scheduled_key, actual_key, place_key, city_col = DIRECTION_FIELDS[flight_type]
+    if not flights:
+        return pd.DataFrame(columns=processed_columns(flight_type))
+
+    operators = [flight.get('operator', 'N/A') for flight in flights]
+    flight_numbers = [flight.get('flight_number', 'N/A') for flight in flights]
+    cancelled = [flight.get('cancelled', False) for flight in flights]
+    places = [flight.get(place_key) or {} for flight in flights]
+    cities = [place.get('city', 'N/A') for place in places]
+    codes = [place.get('code_icao') or place.get('code') or place.get('code_iata') for place in places]
+    scheduled_raw = [flight.get(scheduled_key) or None for flight in flights]
+    actual_raw = [flight.get(actual_key) or None for flight in flights]
+
+    scheduled = _parse_minutes(scheduled_raw)
+    actual = _parse_minutes(actual_raw)
+    has_scheduled = ~np.isnat(scheduled)
+    has_actual = ~np.isnat(actual)
+    has_delay = has_scheduled & has_actual
+
+    delay_minutes = (actual - scheduled).astype(np.int64)
+    delay = np.full(len(flights), "N/A", dtype=object)
+    delay[has_delay] = delay_minutes[has_delay].tolist()
+
+    scheduled_text = _format_minutes(scheduled)
+    day_number = scheduled.astype('datetime64[D]').astype(np.int64)
+    hours = (scheduled - scheduled.astype('datetime64[D]')).astype(np.int64) // 60
+    time_of_day = TIME_OF_DAY_LABELS[np.digitize(hours, TIME_OF_DAY_EDGES)]
+    # 1970-01-01 was a Thursday
+    day_of_week = WEEKDAY_LABELS[(day_number + 3) % 7]
+
+    airports = airports or load_airports()
+    airport_ids = airports.resolve(codes, cities)
+    # Membership on the day of the flight; flights without a scheduled time use today's
+    schengen = airports.is_schengen(airport_ids, np.where(has_scheduled, day_number, np.iinfo(np.int64).max))
+
+    return pd.DataFrame({
+        'operator': pd.Series(operators, dtype=object),
+        'flight_number': pd.Series(flight_numbers, dtype=object),
+        'cancelled': pd.Series(cancelled, dtype=object),
+        city_col: pd.Series(cities, dtype=object),
+        scheduled_key: _with_sentinel(scheduled_text, has_scheduled),
+        actual_key: _with_sentinel(_format_minutes(actual), has_actual),
+        'delay': delay,
+        'date': _with_sentinel(np.datetime_as_string(scheduled, unit='D').astype(object), has_scheduled),
+        'day_of_week': _with_sentinel(day_of_week, has_scheduled),
+        'time_of_day': _with_sentinel(time_of_day, has_scheduled),
+        'schengen': pd.Series(schengen.tolist(), dtype=object),
+        airport_column(flight_type): airport_ids
+    }, columns=processed_columns(flight_type))
+
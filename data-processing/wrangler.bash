@@ -1,5 +1,34 @@
 
 
-wrangler kv:key put --namespace-id="123" "airport_data" "$(cat ~/Documents/Flight-App/merged_data/flight-data.json)"
+# flight-data.json is split into hashed shards by publish.py; only shards that changed since the
+# manifest currently in KV are uploaded. Shards are deleted one publish after the last manifest using
+# them, so readers still holding the previous (edge-cached) manifest never miss a shard
+script_dir=$(dirname "$0")
+work_dir=$(mktemp -d)
+trap 'rm -rf "$work_dir"' EXIT
 
-wrangler kv:key get --namespace-id="123" "airport_data"
+publish() {
+  local key=$1 data_file=$2 cube_dir=$3
+  wrangler kv:key get --namespace-id="123" "${key}:manifest" > "$work_dir/previous.json" 2>/dev/null || true
+  python3 "$script_dir/publish.py" "$data_file" --key "$key" --previous "$work_dir/previous.json" \
+    --bulk-file "$work_dir/bulk.json" --delete-file "$work_dir/delete.json" \
+    ${cube_dir:+--cube "$cube_dir"} || return 1
+  wrangler kv:bulk put --namespace-id="123" "$work_dir/bulk.json" || return 1
+  if [ "$(cat "$work_dir/delete.json")" != "[]" ]; then
+    wrangler kv:bulk delete --namespace-id="123" --force "$work_dir/delete.json"
+  fi
+}
+
+# cube/ is the operator drill-down written by `cube.py --output-dir cube` next to flight-data.json
+cube_dir=~/Documents/Flight-App/merged_data/cube
+[ -d "$cube_dir" ] || cube_dir=""
+publish "airport_data" ~/Documents/Flight-App/merged_data/flight-data.json "$cube_dir"
+
+wrangler kv:key get --namespace-id="123" "airport_data:manifest"
+
+# Airports processed by network.py, one key per airport
+for data_file in ~/Documents/network/*/flight-data.json; do
+  [ -e "$data_file" ] || continue
+  airport=$(basename "$(dirname "$data_file")")
+  publish "airport_data:${airport}" "$data_file"
+done
@@ -3,7 +3,102 @@ import { NextResponse } from 'next/server';
 
 export const runtime = 'edge';
 
-export async function GET() {
+// Errors answered with their own status (and headers) instead of a 500
+class RequestError extends Error {
+  constructor(status, message, headers = {}) {
+    super(message);
+    this.status = status;
+    this.headers = headers;
+  }
+}
+
+// Lisbon stays on the original key; other airports from network.py use airport_data:<ICAO>
+const DEFAULT_KEY = 'airport_data';
+
+function kvKey(request) {
+  const airport = new URL(request.url).searchParams.get('airport');
+  if (!airport) {
+    return DEFAULT_KEY;
+  }
+  if (!/^[A-Za-z]{4}$/.test(airport)) {
+    throw new RequestError(400, `Invalid airport code: ${airport}`);
+  }
+  return `${DEFAULT_KEY}:${airport.toUpperCase()}`;
+}
+
+// Shard keys end in a hash of their value, so they can be cached at the edge for as long as KV allows;
+// the manifest that points at them is re-read every minute
+const SHARD_CACHE_TTL = 86400;
+const MANIFEST_CACHE_TTL = 60;
+
+function readManifest(kv, key) {
+  return kv.get(`${key}:manifest`, { type: 'json', cacheTtl: MANIFEST_CACHE_TTL });
+}
+
+// Rebuild flight-data.json from the manifest written by data-processing/publish.py: each shard is
+// appended (lists) or merged (objects) at its path, in manifest order. Returns null when a shard is missing
+async function assembleShards(kv, manifest) {
+  const values = await Promise.all(
+    manifest.shards.map((shard) => kv.get(shard.key, { type: 'json', cacheTtl: SHARD_CACHE_TTL }))
+  );
+  if (values.includes(null)) {
+    return null;
+  }
+  const data = structuredClone(manifest.base);
+  manifest.shards.forEach((shard, i) => {
+    const parents = shard.path.slice(0, -1);
+    const leaf = shard.path[shard.path.length - 1];
+    let target = data;
+    for (const part of parents) {
+      target = target[part] ??= {};
+    }
+    if (Array.isArray(values[i])) {
+      target[leaf] = (target[leaf] ?? []).concat(values[i]);
+    } else {
+      target[leaf] = { ...target[leaf], ...values[i] };
+    }
+  });
+  return data;
+}
+
+// Shards outlive the manifest that drops them by one publish, so a missing shard means the cached
+// manifest is more than a publish behind: retry once with the manifest read again (when it changed).
+// If that fails too a publish is still settling, so the client is asked to come back once the
+// manifest cache has expired rather than being served an older document
+async function readSharded(kv, key, manifest) {
+  const data = await assembleShards(kv, manifest);
+  if (data) {
+    return data;
+  }
+  console.warn(`Missing KV shard for ${key}, re-reading the manifest`);
+  const fresh = await kv.get(`${key}:manifest`, 'json');
+  const retried = fresh && fresh.published !== manifest.published ? await assembleShards(kv, fresh) : null;
+  if (!retried) {
+    throw new RequestError(503, `Flight data for ${key} is being republished, try again shortly`,
+      { 'Retry-After': String(MANIFEST_CACHE_TTL) });
+  }
+  return retried;
+}
+
+// Operator drill-down cube from data-processing/cube.py: ?operators returns every carrier's totals and
+// the best/worst rankings, ?operator=<code> one carrier's routes and weekly cells
+async function readDrilldown(kv, manifest, searchParams) {
+  if (!manifest?.cube) {
+    return null;
+  }
+  const operator = searchParams.get('operator');
+  if (operator === null) {
+    return kv.get(manifest.cube.index, { type: 'json', cacheTtl: SHARD_CACHE_TTL });
+  }
+  // Keyed by the operator code itself; publish.py picks the KV-safe shard name
+  if (!Object.hasOwn(manifest.cube.operators, operator)) {
+    throw new RequestError(404, `Unknown operator: ${operator}`);
+  }
+  const shardKey = manifest.cube.operators[operator];
+  return kv.get(shardKey, { type: 'json', cacheTtl: SHARD_CACHE_TTL });
+}
+
+export async function GET(request) {
   try {
     // Log to see if we have the KV binding
     console.log('KV binding check:', !!process.env.FLIGHT_DATA);
@@ -16,7 +111,18 @@ export async function GET() {
 
     // Try to get the data and log the result
     console.log('Attempting to fetch from KV...');
-    const data = await kv.get('airport_data', 'json');
+    const key = kvKey(request);
+    const { searchParams } = new URL(request.url);
+    const manifest = await readManifest(kv, key);
+    let data;
+    if (searchParams.has('operator') || searchParams.has('operators')) {
+      data = await readDrilldown(kv, manifest, searchParams);
+    } else if (manifest) {
+      data = await readSharded(kv, key, manifest);
+    } else {
+      // Every key is published sharded; the whole documents stored before that are no longer read
+      throw new RequestError(404, `No flight data published for ${key}`);
+    }
     console.log('KV response:', data);
 
     if (!data) {
@@ -26,6 +132,9 @@ export async function GET() {
 
     return NextResponse.json(data);
   } catch (error) {
+    if (error instanceof RequestError) {
+      return NextResponse.json({ error: error.message }, { status: error.status, headers: error.headers });
+    }
     console.error('Error in API route:', error);
     return NextResponse.json(
       { 